@@ -0,0 +1,21 @@
+"""Scripts that time Workbench code against the code it replaced.
+
+These aren't unit tests. Run each one as a script, for instance:
+
+    python -m benchmarks.deltadeleter
+
+Each script logs its timings and raises AssertionError if new and old code
+disagree.
+"""
+import time
+from typing import Callable, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+def timed(fn: Callable[[], T]) -> Tuple[T, float]:
+    """Call `fn()`; return its result and the number of seconds it took."""
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
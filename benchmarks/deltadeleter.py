@@ -0,0 +1,168 @@
+"""Benchmark cron.deltadeleter on a synthetic delta table.
+
+    python -m benchmarks.deltadeleter
+
+It runs in one transaction that it always rolls back: it empties the
+database, adds synthetic data, deletes some and leaves no trace. (Other
+writers block on its row locks while it runs, so prefer the unit-test
+database. The dev and unit-test databases have the same name, so we can't
+tell them apart.)
+
+Set BENCHMARK_N_WORKFLOWS and BENCHMARK_N_DELTAS_PER_WORKFLOW to scale it.
+"""
+import datetime
+import logging
+import os
+from typing import List
+
+import django
+from django.db import connection, transaction
+
+from benchmarks import timed
+from cron.deltadeleter.__main__ import (
+    ScanBatchSize,
+    delete_stale_deltas,
+    find_scan_end,
+    find_workflows_with_stale_deltas,
+)
+
+
+logger = logging.getLogger(__name__)
+
+N_WORKFLOWS = int(os.environ.get("BENCHMARK_N_WORKFLOWS", "2000"))
+N_DELTAS_PER_WORKFLOW = int(os.environ.get("BENCHMARK_N_DELTAS_PER_WORKFLOW", "100"))
+STALE_EVERY_N_WORKFLOWS = 20  # 5% of workflows have stale deltas
+
+NOW = datetime.datetime(2021, 6, 1)
+
+# The query we used before we scanned incrementally: GROUP BY over all deltas
+LEGACY_SQL = """
+WITH
+user_limits AS (
+    SELECT
+        subscription.user_id,
+        MAX(product.max_delta_age_in_days) AS max_delta_age_in_days
+    FROM subscription
+    INNER JOIN price ON price.id = subscription.price_id
+    INNER JOIN product ON product.id = price.product_id
+    GROUP BY subscription.user_id
+),
+workflow_ids AS (
+    SELECT workflow_id, MIN(last_applied_at) AS min_last_applied_at
+    FROM delta
+    GROUP BY workflow_id
+)
+SELECT workflow_ids.workflow_id
+FROM workflow_ids
+INNER JOIN workflow ON workflow.id = workflow_ids.workflow_id
+LEFT JOIN user_limits ON user_limits.user_id = workflow.owner_id
+WHERE workflow_ids.min_last_applied_at < %(now)s - MAKE_INTERVAL(days => GREATEST(
+    user_limits.max_delta_age_in_days, %(default_max_delta_age_in_days)s
+))
+"""
+
+
+def _create_synthetic_deltas() -> None:
+    from cjwstate.models.workflow import Workflow  # after django.setup()
+
+    workflows = Workflow.objects.bulk_create(
+        [Workflow(name="benchmark") for _ in range(N_WORKFLOWS)]
+    )
+    stale_ids = [w.id for w in workflows[::STALE_EVERY_N_WORKFLOWS]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO delta (
+                datetime, last_applied_at, workflow_id, command_name,
+                step_delta_ids, values_for_backward, values_for_forward
+            )
+            SELECT
+                t, t, workflow.id, 'SetWorkflowTitle', '{}', '{}', '{}'
+            FROM workflow
+            CROSS JOIN LATERAL (
+                SELECT
+                    CASE
+                        WHEN workflow.id = ANY(%(stale_ids)s) AND i = 1
+                        THEN %(now)s - INTERVAL '1000 days'
+                        ELSE %(now)s - i * INTERVAL '1 minute'
+                    END AS t
+                FROM generate_series(1, %(n)s) AS i
+            ) deltas
+            WHERE workflow.name = 'benchmark'
+            """,
+            dict(stale_ids=stale_ids, now=NOW, n=N_DELTAS_PER_WORKFLOW),
+        )
+        cursor.execute(
+            """
+            UPDATE workflow
+            SET last_delta_id = (SELECT MAX(id) FROM delta WHERE workflow_id = workflow.id)
+            WHERE name = 'benchmark'
+            """
+        )
+        cursor.execute("ANALYZE delta")
+        cursor.execute("ANALYZE workflow")
+
+
+def _legacy_find() -> List[int]:
+    from cjworkbench.models.userlimits import UserLimits  # after django.setup()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            LEGACY_SQL,
+            dict(
+                now=NOW,
+                default_max_delta_age_in_days=UserLimits.free_user_limits().max_delta_age_in_days,
+            ),
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _incremental_find() -> List[int]:
+    found = []
+    after_workflow_id = 0
+    while True:
+        last_workflow_id = find_scan_end(after_workflow_id, ScanBatchSize)
+        if last_workflow_id is None:
+            return found
+        found.extend(
+            workflow_id
+            for workflow_id, _ in find_workflows_with_stale_deltas(
+                NOW,
+                after_workflow_id=after_workflow_id,
+                last_workflow_id=last_workflow_id,
+            )
+        )
+        after_workflow_id = last_workflow_id
+
+
+def main() -> None:
+    from cjworkbench.tests.utils import clear_db  # after django.setup()
+
+    with transaction.atomic():
+        try:
+            clear_db()  # so the legacy query sees only our deltas
+            _create_synthetic_deltas()
+            legacy_result, legacy_seconds = timed(_legacy_find)
+            incremental_result, incremental_seconds = timed(_incremental_find)
+            assert incremental_result == legacy_result
+            _, delete_seconds = timed(lambda: delete_stale_deltas(NOW))
+        finally:
+            # Never commit: we mustn't delete anybody's data
+            transaction.set_rollback(True)
+
+    logger.info(
+        "%d workflows, %d deltas, %d workflows with stale deltas: "
+        "legacy GROUP BY find %.3fs; incremental find (full sweep) %.3fs; "
+        "delete_stale_deltas() %.3fs",
+        N_WORKFLOWS,
+        N_WORKFLOWS * N_DELTAS_PER_WORKFLOW,
+        len(legacy_result),
+        legacy_seconds,
+        incremental_seconds,
+        delete_seconds,
+    )
+
+
+if __name__ == "__main__":
+    django.setup()
+    main()
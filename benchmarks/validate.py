@@ -0,0 +1,172 @@
+"""Benchmark cjwkernel.validate on big tables.
+
+    python -m benchmarks.validate
+
+Set BENCHMARK_N_ROWS and BENCHMARK_N_SMALL_FILES to scale it.
+"""
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute
+
+from benchmarks import timed
+from cjwkernel import settings
+from cjwkernel.tests.util import arrow_table_context
+from cjwkernel.validate import load_untrusted_arrow_file_with_columns, read_columns
+
+
+logger = logging.getLogger(__name__)
+
+N_ROWS = int(os.environ.get("BENCHMARK_N_ROWS", "1000000"))
+N_SMALL_FILES = int(os.environ.get("BENCHMARK_N_SMALL_FILES", "200"))
+ARROW_VALIDATE = Path("/usr/bin/arrow-validate")
+NULL_EVERY_N_ROWS = 100
+
+
+def _date_table(unit: str) -> pa.Table:
+    """Build a valid N_ROWS-row date32 column of `unit`, spanning 1700-2299."""
+    if unit == "year":
+        starts = np.arange(1700, 2300)[np.arange(N_ROWS) % 600] - 1970
+        days = starts.astype("datetime64[Y]").astype("datetime64[D]")
+    else:
+        step = 3 if unit == "quarter" else 1
+        months = np.arange(-270 * 12, 330 * 12, step)
+        starts = months[np.arange(N_ROWS) % len(months)]
+        days = starts.astype("datetime64[M]").astype("datetime64[D]")
+    mask = np.arange(N_ROWS) % NULL_EVERY_N_ROWS == 0
+    array = pa.array(days.astype(np.int32), mask=mask).view(pa.date32())
+    return pa.table(
+        [array],
+        pa.schema([pa.field("A", pa.date32(), metadata={b"unit": unit.encode()})]),
+    )
+
+
+def _legacy_has_wrong_unit(column: pa.ChunkedArray, unit: str) -> bool:
+    # What we did before NumPy: time.gmtime() on every value
+    is_valid = {
+        "month": lambda st: st.tm_mday == 1,
+        "quarter": lambda st: st.tm_mday == 1 and st.tm_mon % 3 == 1,
+        "year": lambda st: st.tm_mon == 1 and st.tm_mday == 1,
+    }[unit]
+    for chunk in column.chunks:
+        unix_timestamps = pa.compute.multiply(
+            chunk.view(pa.int32()).cast(pa.int64()), 86400
+        )
+        for unix_timestamp in unix_timestamps:
+            if unix_timestamp.is_valid:
+                if not is_valid(time.gmtime(unix_timestamp.as_py())):
+                    return True
+    return False
+
+
+def _benchmark_date_unit(unit: str) -> None:
+    table = _date_table(unit)
+    legacy_result, legacy_seconds = timed(
+        lambda: _legacy_has_wrong_unit(table["A"], unit)
+    )
+    assert not legacy_result
+    _, seconds = timed(lambda: read_columns(table))  # raises if invalid
+    logger.info(
+        "%d-row %s column: legacy gmtime() loop %.3fs; read_columns() %.3fs",
+        N_ROWS,
+        unit,
+        legacy_seconds,
+        seconds,
+    )
+
+
+def _legacy_load_untrusted(path: Path) -> None:
+    # What we did before validating in-process: spawn arrow-validate, then
+    # open the file and walk the table again in read_columns()
+    subprocess.run(
+        [
+            ARROW_VALIDATE.as_posix(),
+            "--check-column-name-control-characters",
+            f"--check-column-name-max-bytes={settings.MAX_BYTES_PER_COLUMN_NAME}",
+            "--check-dictionary-values-all-used",
+            "--check-dictionary-values-not-null",
+            "--check-dictionary-values-unique",
+            "--check-floats-all-finite",
+            "--check-safe",
+            path.as_posix(),
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    read_columns(pa.ipc.open_file(path).read_all(), full=True)
+
+
+def _mixed_table(n_rows: int) -> pa.Table:
+    """Build a table with text, dictionary, float, int and date columns."""
+    indices = np.arange(n_rows) % 10
+    return pa.table(
+        [
+            pa.array(["row %d" % (i % 1000) for i in range(n_rows)]),
+            pa.DictionaryArray.from_arrays(
+                pa.array(indices, pa.int32()),
+                pa.array(["value %d" % i for i in range(min(n_rows, 10))]),
+            ),
+            pa.array(np.arange(n_rows) / 3.0),
+            pa.array(np.arange(n_rows)),
+            pa.array(np.zeros(n_rows, np.int32)).view(pa.date32()),
+        ],
+        pa.schema(
+            [
+                pa.field("text", pa.string()),
+                pa.field("dictionary", pa.dictionary(pa.int32(), pa.string())),
+                pa.field("float", pa.float64(), metadata={b"format": b"{:,}"}),
+                pa.field("int", pa.int64(), metadata={b"format": b"{:,}"}),
+                pa.field("date", pa.date32(), metadata={b"unit": b"month"}),
+            ]
+        ),
+    )
+
+
+def _benchmark_load_untrusted(description: str, table: pa.Table, n_loads: int) -> None:
+    with arrow_table_context(table) as (path, _):
+
+        def load_many():
+            for _ in range(n_loads):
+                load_untrusted_arrow_file_with_columns(path)
+
+        _, seconds = timed(load_many)
+        if ARROW_VALIDATE.exists():
+
+            def legacy_load_many():
+                for _ in range(n_loads):
+                    _legacy_load_untrusted(path)
+
+            _, legacy_seconds = timed(legacy_load_many)
+            legacy_report = "%.3fs" % legacy_seconds
+        else:
+            legacy_report = "skipped: %s does not exist" % ARROW_VALIDATE
+
+    logger.info(
+        "%s: legacy arrow-validate + read_columns() %s; "
+        "load_untrusted_arrow_file_with_columns() %.3fs",
+        description,
+        legacy_report,
+        seconds,
+    )
+
+
+def main() -> None:
+    for unit in ("month", "quarter", "year"):
+        _benchmark_date_unit(unit)
+    _benchmark_load_untrusted(
+        "%d loads of a 100-row file" % N_SMALL_FILES, _mixed_table(100), N_SMALL_FILES
+    )
+    _benchmark_load_untrusted(
+        "1 load of a %d-row file" % N_ROWS, _mixed_table(N_ROWS), 1
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
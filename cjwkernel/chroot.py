@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import contextlib
 from dataclasses import dataclass, field
 import errno
@@ -7,7 +8,8 @@ import os.path
 from pathlib import Path
 import shutil
 import threading
-from typing import Callable, ContextManager, Iterator, List, Tuple
+from typing import AsyncContextManager, Callable, ContextManager, Iterator, List, Tuple
+import pyspawner
 from cjwkernel.util import tempdir_context, tempfile_context
 from cjwkernel.errors import ModuleExitedError
 
@@ -101,6 +103,16 @@ class Chroot:
     learn what the upper layer is.
     """
 
+    network_config: pyspawner.NetworkConfig = field(
+        default_factory=pyspawner.NetworkConfig
+    )
+    """
+    veth pair and addresses for networked children in this chroot.
+
+    Each editable chroot has its own, so children in different chroots can
+    reach the Internet at the same time.
+    """
+
     lock: threading.Lock = field(default_factory=threading.Lock)
     """
     Sanity check.
@@ -294,11 +306,81 @@ class ChrootContext:
         os.chown(path, old_stat.st_uid, old_stat.st_gid)
 
 
+class ChrootPool:
+    """
+    Hand out Chroots to asyncio callers, one caller per Chroot at a time.
+
+    Usage:
+
+        async with pool.acquire_context() as chroot_context:
+            ...  # just like `with chroot.acquire_context() as chroot_context`
+
+    When all Chroots are in use, `acquire_context()` waits for one to be
+    released. That makes `len(pool.chroots)` an upper bound on the number of
+    modules a process may run at once.
+    """
+
+    def __init__(self, chroots: List[Chroot]):
+        self.chroots = chroots
+        self._available = None  # asyncio.Queue -- created within the event loop
+
+    @contextlib.asynccontextmanager
+    async def acquire_context(self) -> AsyncContextManager[ChrootContext]:
+        if self._available is None:
+            self._available = asyncio.Queue()
+            for chroot in self.chroots:
+                self._available.put_nowait(chroot)
+
+        chroot = await self._available.get()
+        try:
+            with chroot.acquire_context() as chroot_context:
+                yield chroot_context
+        finally:
+            self._available.put_nowait(chroot)
+
+
 _chroots = Path("/var/lib/cjwkernel/chroot")
 _base = Path("/var/lib/cjwkernel/chroot-layers/base")
 
 
-EDITABLE_CHROOT = Chroot(
-    _chroots / "editable" / "root", _base, _chroots / "editable" / "upperfs" / "upper"
+def _editable_chroot(name: str, network_config: pyspawner.NetworkConfig) -> Chroot:
+    return Chroot(
+        _chroots / name / "root",
+        _base,
+        _chroots / name / "upperfs" / "upper",
+        network_config=network_config,
+    )
+
+
+def _extra_network_config(i: int) -> pyspawner.NetworkConfig:
+    """Network config for "editable-{i}".
+
+    Keep this in sync with `setup-sandboxes.sh`. Interface names may be at
+    most 15 characters long; each pair gets its own /24 so routes don't clash.
+    """
+    assert 1 <= i < 100
+    return pyspawner.NetworkConfig(
+        kernel_veth_name="veth-psp%d" % i,
+        child_veth_name="veth-psp%d-c" % i,
+        kernel_ipv4_address="192.168.%d.1" % (123 + i),
+        child_ipv4_address="192.168.%d.2" % (123 + i),
+    )
+
+
+N_EDITABLE_CHROOTS = int(os.environ.get("CJW_N_EDITABLE_CHROOTS", "1"))
+"""
+Number of editable chroots `setup-sandboxes.sh` creates.
+
+Keep this in sync with `setup-sandboxes.sh`: both read the same environment
+variable.
+"""
+
+EDITABLE_CHROOT = _editable_chroot("editable", pyspawner.NetworkConfig())
+EDITABLE_CHROOT_POOL = ChrootPool(
+    [EDITABLE_CHROOT]
+    + [
+        _editable_chroot("editable-%d" % i, _extra_network_config(i))
+        for i in range(1, N_EDITABLE_CHROOTS)
+    ]
 )
 READONLY_CHROOT_DIR = _chroots / "readonly" / "root"
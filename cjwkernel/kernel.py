@@ -1,18 +1,23 @@
 import io
+import json
 import logging
 import os
 import os.path
+import pickle
 import selectors
+import threading
 import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
 
 import pyspawner
 import thrift.protocol.TBinaryProtocol
 import thrift.transport.TTransport
 from cjwkernel.chroot import READONLY_CHROOT_DIR, ChrootContext
 from cjwkernel.errors import ModuleExitedError, ModuleTimeoutError
+from cjwkernel.pandas.main import SERVE_ONE_REQUEST
 from cjwkernel.thrift import ttypes
 from cjwkernel.types import (
     CompiledModule,
@@ -39,6 +44,7 @@ LOG_BUFFER_MAX_BYTES = 100 * 1024  # waaaay too much log output
 OUTPUT_BUFFER_MAX_BYTES = (
     2 * 1024 * 1024
 )  # a huge migrate_params() return value, perhaps?
+MAX_WARM_CHILDREN = 8  # idle children, each waiting for a request
 
 # Import all encodings. Some modules (e.g., loadurl) encounter weird stuff
 ENCODING_IMPORTS = [
@@ -109,6 +115,26 @@ class ChildReader:
         return str(self.buffer, encoding="utf-8", errors="replace")
 
 
+class WarmChildKey(NamedTuple):
+    """Everything a warm child committed to before it received its request."""
+
+    chroot_dir: Path
+    module_slug: str
+    marshalled_code_object: bytes
+    module_spec_json: str
+
+    @classmethod
+    def for_module(
+        cls, chroot_dir: Path, compiled_module: CompiledModule
+    ) -> "WarmChildKey":
+        return cls(
+            chroot_dir,
+            compiled_module.module_slug,
+            compiled_module.marshalled_code_object,
+            json.dumps(compiled_module.module_spec_dict, sort_keys=True, default=str),
+        )
+
+
 class Kernel:
     """Compiles and runs user-supplied module code.
 
@@ -126,6 +152,15 @@ class Kernel:
     Child processes cannot be trusted to return sane values. So we communicate
     via Thrift (which errors on unexpected data) rather than Python pickle
     (which executes code on unexpected data).
+
+    Forking and evaluating the module can take longer than the call itself --
+    say, renaming a column in a small table. So after a successful call, we
+    spawn a "warm" child for the same module: it evaluates the module and then
+    waits for a request on stdin. The next call to that module sends its
+    request to the warm child instead of spawning one. Each child still serves
+    exactly one request. Warm children only run in the read-only chroot
+    (validate, migrate_params): an editable chroot holds one caller's files,
+    and a child there would rarely outlive the caller's ChrootContext anyway.
     """
 
     def __init__(
@@ -134,11 +169,22 @@ class Kernel:
         migrate_params_timeout: float = TIMEOUT,
         fetch_timeout: float = TIMEOUT,
         render_timeout: float = TIMEOUT,
+        max_warm_children: int = MAX_WARM_CHILDREN,
     ):
         self.validate_timeout = validate_timeout
         self.migrate_params_timeout = migrate_params_timeout
         self.fetch_timeout = fetch_timeout
         self.render_timeout = render_timeout
+        self.max_warm_children = max_warm_children
+        self._warm_children: Dict[
+            WarmChildKey, pyspawner.ChildProcess
+        ] = OrderedDict()  # least-recently-spawned first
+        self._warm_children_lock = threading.Lock()
+        # Each editable chroot has its own veth pair (see setup-sandboxes.sh).
+        # Only one child may use a veth pair at a time, so we lock each one.
+        # (Callers never share a chroot; these locks are a sanity check.)
+        self._network_locks: Dict[str, threading.Lock] = {}
+        self._network_locks_lock = threading.Lock()
         self._pyspawner = pyspawner.Client(
             child_main="cjwkernel.pandas.main.main",
             executable="/opt/venv/cjwkernel/bin/python",
@@ -262,6 +308,7 @@ class Kernel:
         )
 
     def __del__(self):
+        self._kill_warm_children(lambda key: True)
         self._pyspawner.close()
 
     def validate(self, compiled_module: CompiledModule) -> None:
@@ -274,26 +321,49 @@ class Kernel:
             network_config=None,
             compiled_module=compiled_module,
             timeout=self.validate_timeout,
-            result=ttypes.ValidateModuleResult(),
+            results=[ttypes.ValidateModuleResult()],
             function="validate_thrift",
             args=[],
         )
+        # The caller will probably migrate_params() next
+        self._spawn_warm_child(READONLY_CHROOT_DIR, compiled_module)
 
     def migrate_params(
         self, compiled_module: CompiledModule, params: Dict[str, Any]
     ) -> None:
         """Call a module's migrate_params()."""
-        response = self._run_in_child(
+        [response] = self._run_in_child(
             chroot_dir=READONLY_CHROOT_DIR,
             network_config=None,
             compiled_module=compiled_module,
             timeout=self.migrate_params_timeout,
-            result=ttypes.MigrateParamsResult(),
+            results=[ttypes.MigrateParamsResult()],
             function="migrate_params_thrift",
             args=[pydict_to_thrift_json_object(params)],
         )
+        self._spawn_warm_child(READONLY_CHROOT_DIR, compiled_module)
         return thrift_json_object_to_pydict(response.params)
 
+    def migrate_params_batch(
+        self, compiled_module: CompiledModule, params_list: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Call a module's migrate_params() on each of `params_list`, in one child.
+
+        Raise ModuleError if any call fails. (The error doesn't say which.)
+        """
+        responses = self._run_in_child(
+            chroot_dir=READONLY_CHROOT_DIR,
+            network_config=None,
+            compiled_module=compiled_module,
+            timeout=self.migrate_params_timeout,
+            results=[ttypes.MigrateParamsResult() for _ in params_list],
+            function="migrate_params_batch_thrift",
+            args=[[pydict_to_thrift_json_object(params) for params in params_list]],
+            output_limit_bytes=OUTPUT_BUFFER_MAX_BYTES * len(params_list),
+        )
+        self._spawn_warm_child(READONLY_CHROOT_DIR, compiled_module)
+        return [thrift_json_object_to_pydict(response.params) for response in responses]
+
     def render(
         self,
         compiled_module: CompiledModule,
@@ -333,17 +403,17 @@ class Kernel:
         )
         if compiled_module.module_slug in {"pythoncode", "ACS2016"}:
             # TODO disallow networking; make network_config always None
-            network_config = pyspawner.NetworkConfig()
+            network_config = chroot_context.chroot.network_config
         else:
             network_config = None
         try:
             with chroot_context.writable_file(basedir / output_filename):
-                result = self._run_in_child(
+                [result] = self._run_in_child(
                     chroot_dir=chroot_dir,
                     network_config=network_config,
                     compiled_module=compiled_module,
                     timeout=self.render_timeout,
-                    result=ttypes.RenderResult(),
+                    results=[ttypes.RenderResult()],
                     function="render_thrift",
                     args=[request],
                 )
@@ -383,12 +453,12 @@ class Kernel:
         )
         try:
             with chroot_context.writable_file(basedir / output_filename):
-                result = self._run_in_child(
+                [result] = self._run_in_child(
                     chroot_dir=chroot_dir,
-                    network_config=pyspawner.NetworkConfig(),
+                    network_config=chroot_context.chroot.network_config,
                     compiled_module=compiled_module,
                     timeout=self.fetch_timeout,
-                    result=ttypes.FetchResult(),
+                    results=[ttypes.FetchResult()],
                     function="fetch_thrift",
                     args=[request],
                 )
@@ -406,6 +476,56 @@ class Kernel:
         # maximum file size.
         return thrift_fetch_result_to_arrow(result, basedir)
 
+    def _spawn_warm_child(
+        self, chroot_dir: Path, compiled_module: CompiledModule
+    ) -> None:
+        """Spawn a child that evaluates `compiled_module` and waits for a request.
+
+        `chroot_dir` must be read-only: the child may serve any later caller.
+        """
+        if self.max_warm_children <= 0:
+            return
+
+        key = WarmChildKey.for_module(chroot_dir, compiled_module)
+        with self._warm_children_lock:
+            if key in self._warm_children:
+                return
+
+        module_process = self._spawn_waiting_child(chroot_dir, compiled_module)
+
+        with self._warm_children_lock:
+            if key in self._warm_children:
+                # Another thread won the race
+                evicted = [module_process]
+            else:
+                self._warm_children[key] = module_process
+                evicted = []
+                while len(self._warm_children) > self.max_warm_children:
+                    evicted.append(self._warm_children.popitem(last=False)[1])
+        for child in evicted:
+            self._kill_child(child)
+
+    def _spawn_waiting_child(
+        self, chroot_dir: Path, compiled_module: CompiledModule
+    ) -> pyspawner.ChildProcess:
+        return self._pyspawner.spawn_child(
+            args=[compiled_module, SERVE_ONE_REQUEST, []],
+            process_name=compiled_module.module_slug,
+            sandbox_config=pyspawner.SandboxConfig(chroot_dir=chroot_dir, network=None),
+        )
+
+    def _kill_warm_children(self, predicate) -> None:
+        with self._warm_children_lock:
+            keys = [key for key in self._warm_children if predicate(key)]
+            children = [self._warm_children.pop(key) for key in keys]
+        for child in children:
+            self._kill_child(child)
+
+    @staticmethod
+    def _kill_child(module_process: pyspawner.ChildProcess) -> None:
+        module_process.kill()
+        module_process.wait(0)
+
     def _run_in_child(
         self,
         *,
@@ -413,40 +533,85 @@ class Kernel:
         network_config: Optional[pyspawner.NetworkConfig],
         compiled_module: CompiledModule,
         timeout: float,
-        result: Any,
+        results: List[Any],
         function: str,
         args: List[Any],
-    ) -> None:
-        """Fork a child process to run `function` with `args`.
+        output_limit_bytes: int = OUTPUT_BUFFER_MAX_BYTES,
+    ) -> List[Any]:
+        """Run `function` with `args` in a (warm or freshly-forked) child.
 
-        `args` must be Thrift data types. `result` must also be a Thrift type --
-        its `.read()` function will be called, which may produce an error if
-        the child process has a bug. (EOFError is very likely.)
+        `args` must be Thrift data types. `results` must be Thrift types, which
+        the child writes one after another. Each one's `.read()` function will
+        be called, which may produce an error if the child process has a bug.
+        (EOFError is very likely.) Return `results`.
 
         Raise ModuleExitedError if the child process did not behave as expected.
 
         Raise ModuleTimeoutError if it did not exit after a delay -- or if it
         closed its file descriptors long before it exited.
         """
-        limit_time = time.time() + timeout
+        if network_config is None:
+            key = WarmChildKey.for_module(chroot_dir, compiled_module)
+            with self._warm_children_lock:
+                module_process = self._warm_children.pop(key, None)
+            if module_process is None:
+                module_process = self._spawn_waiting_child(chroot_dir, compiled_module)
+            return self._communicate(
+                module_process,
+                compiled_module=compiled_module,
+                timeout=timeout,
+                results=results,
+                output_limit_bytes=output_limit_bytes,
+                request=pickle.dumps((function, args)),
+            )
+        else:
+            with self._network_locks_lock:
+                network_lock = self._network_locks.setdefault(
+                    network_config.kernel_veth_name, threading.Lock()
+                )
+            with network_lock:
+                module_process = self._pyspawner.spawn_child(
+                    args=[compiled_module, function, args],
+                    process_name=compiled_module.module_slug,
+                    sandbox_config=pyspawner.SandboxConfig(
+                        chroot_dir=chroot_dir, network=network_config
+                    ),
+                )
+                return self._communicate(
+                    module_process,
+                    compiled_module=compiled_module,
+                    timeout=timeout,
+                    results=results,
+                    output_limit_bytes=output_limit_bytes,
+                    request=None,
+                )
 
-        module_process = self._pyspawner.spawn_child(
-            args=[compiled_module, function, args],
-            process_name=compiled_module.module_slug,
-            sandbox_config=pyspawner.SandboxConfig(
-                chroot_dir=chroot_dir, network=network_config
-            ),
-        )
+    def _communicate(
+        self,
+        module_process: pyspawner.ChildProcess,
+        *,
+        compiled_module: CompiledModule,
+        timeout: float,
+        results: List[Any],
+        output_limit_bytes: int,
+        request: Optional[bytes],
+    ) -> List[Any]:
+        """Write `request` (if set) to the child's stdin; read its results."""
+        limit_time = time.time() + timeout
 
         # stdout is Thrift package; stderr is logs
-        output_reader = ChildReader(
-            module_process.stdout.fileno(), OUTPUT_BUFFER_MAX_BYTES
-        )
+        output_reader = ChildReader(module_process.stdout.fileno(), output_limit_bytes)
         log_reader = ChildReader(module_process.stderr.fileno(), LOG_BUFFER_MAX_BYTES)
         # Read until the child closes its stdout and stderr
         with selectors.DefaultSelector() as selector:
             selector.register(output_reader.fileno, selectors.EVENT_READ)
             selector.register(log_reader.fileno, selectors.EVENT_READ)
+            if request is not None:
+                # Write without blocking: the child may never read
+                stdin_fileno = module_process.stdin.fileno()
+                os.set_blocking(stdin_fileno, False)
+                selector.register(stdin_fileno, selectors.EVENT_WRITE)
+                unwritten = memoryview(request)
 
             timed_out = False
             while selector.get_map():
@@ -461,6 +626,14 @@ class Kernel:
 
                 events = selector.select(timeout=remaining)
                 ready = frozenset(key.fd for key, _ in events)
+                if request is not None and stdin_fileno in ready:
+                    try:
+                        unwritten = unwritten[os.write(stdin_fileno, unwritten) :]
+                    except BrokenPipeError:
+                        unwritten = unwritten[:0]  # child died; we'll see why
+                    if not unwritten:
+                        selector.unregister(stdin_fileno)
+                        module_process.stdin.close()  # EOF
                 for reader in (output_reader, log_reader):
                     if reader.fileno in ready:
                         reader.ingest()
@@ -501,7 +674,8 @@ class Kernel:
         transport = thrift.transport.TTransport.TMemoryBuffer(output_reader.buffer)
         protocol = thrift.protocol.TBinaryProtocol.TBinaryProtocol(transport)
         try:
-            result.read(protocol)
+            for result in results:
+                result.read(protocol)
         except EOFError:  # TODO handle other errors Thrift may throw
             raise ModuleExitedError(
                 compiled_module.module_slug, exit_code, log_reader.to_str()
@@ -517,4 +691,4 @@ class Kernel:
         if log_reader.buffer:
             logger.info("Output from module process: %s", log_reader.to_str())
 
-        return result
+        return results
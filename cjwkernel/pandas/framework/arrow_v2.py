@@ -0,0 +1,144 @@
+"""Streaming render: modules consume and emit record batches.
+
+A module opts in by defining a generator function:
+
+    def render_arrow_v2(batches, params, *, input_schema, **kwargs):
+        for batch in batches:
+            yield batch.filter(...)  # a pa.RecordBatch
+        return [RenderError(...)]  # optional: errors, or (errors, json)
+
+We write each yielded batch to the output file as soon as the module yields
+it, and we read input batches from a memory-mapped file only when the module
+asks for them. Row-wise modules (filter, rename, convert ...) never hold the
+whole table in memory.
+
+The first yielded batch sets the output schema; every batch must match it. To
+output columns but no rows, yield a zero-row batch. To output no columns,
+yield nothing.
+"""
+import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import pyarrow as pa
+from cjwmodule.types import UploadedFile
+from cjwmodule.arrow.types import TabOutput
+
+from cjwkernel import settings
+from cjwkernel.thrift import ttypes
+from cjwkernel.types import (
+    RenderError,
+    arrow_render_error_to_thrift,
+    pydict_to_thrift_json_object,
+    thrift_fetch_result_to_arrow,
+    thrift_json_object_to_pydict,
+)
+from cjwkernel.validate import load_trusted_arrow_file
+
+
+def _iter_batches(reader: pa.ipc.RecordBatchFileReader) -> Iterator[pa.RecordBatch]:
+    for i in range(reader.num_record_batches):
+        yield reader.get_batch(i)
+
+
+def _coerce_return_value(value: Any) -> Tuple[List[RenderError], Dict[str, Any]]:
+    if value is None:
+        return [], {}
+    elif isinstance(value, list):
+        return value, {}
+    elif isinstance(value, tuple) and len(value) == 2:
+        return value[0], value[1]
+    else:
+        # Crash. The module author wrote a buggy module.
+        raise ValueError(
+            "render_arrow_v2() must return None, a list of RenderError or a "
+            "(errors, json) tuple"
+        )
+
+
+def _write_batches(batches: Iterator[pa.RecordBatch], path: Path) -> Any:
+    """Write each batch from `batches` to `path`; return the generator's value."""
+    writer = None
+    schema = None  # pyarrow's writer doesn't expose its schema
+    try:
+        while True:
+            try:
+                batch = next(batches)
+            except StopIteration as stop:
+                if writer is None:
+                    # No batches: write a zero-column table
+                    writer = pa.ipc.RecordBatchFileWriter(path, pa.schema([]))
+                return stop.value
+
+            if not isinstance(batch, pa.RecordBatch):
+                raise ValueError(
+                    "render_arrow_v2() must yield pyarrow.RecordBatch; got %s"
+                    % type(batch).__name__
+                )
+            if writer is None:
+                schema = batch.schema
+                writer = pa.ipc.RecordBatchFileWriter(path, schema)
+            elif not batch.schema.equals(schema, check_metadata=True):
+                raise ValueError(
+                    "render_arrow_v2() yielded batches with different schemas"
+                )
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def call_render(render: Callable, request: ttypes.RenderRequest) -> ttypes.RenderResult:
+    basedir = Path(request.basedir)
+    params = thrift_json_object_to_pydict(request.params)
+
+    tab_outputs = {
+        k: TabOutput(
+            tab_name=v.tab_name,
+            table=load_trusted_arrow_file(basedir / v.table_filename),
+        )
+        for k, v in request.tab_outputs.items()
+    }
+
+    uploaded_files = {
+        k: UploadedFile(
+            name=v.name,
+            path=(basedir / v.filename),
+            uploaded_at=datetime.datetime.utcfromtimestamp(
+                v.uploaded_at_timestampus / 1000000.0
+            ),
+        )
+        for k, v in request.uploaded_files.items()
+    }
+
+    if request.fetch_result is None:
+        fetch_result = None
+    else:
+        fetch_result = thrift_fetch_result_to_arrow(request.fetch_result, basedir)
+
+    # Memory-map the input: batches we've read are paged in and out by the OS
+    # instead of piling up in our heap.
+    with pa.memory_map(str(basedir / request.input_filename)) as input_file:
+        reader = pa.ipc.open_file(input_file)
+        output = render(
+            _iter_batches(reader),
+            params,
+            input_schema=reader.schema,
+            settings=settings,
+            tab_name=request.tab_name,
+            tab_outputs=tab_outputs,
+            uploaded_files=uploaded_files,
+            fetch_result=fetch_result,
+        )
+        if not hasattr(output, "__next__"):
+            # Crash. The module author wrote a buggy module.
+            raise ValueError(
+                "render_arrow_v2() must be a generator that yields pyarrow.RecordBatch"
+            )
+        return_value = _write_batches(output, basedir / request.output_filename)
+
+    errors, json = _coerce_return_value(return_value)
+    return ttypes.RenderResult(
+        errors=[arrow_render_error_to_thrift(e) for e in errors],
+        json=pydict_to_thrift_json_object(json),
+    )
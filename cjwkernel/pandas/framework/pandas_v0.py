@@ -144,6 +144,7 @@ def call_render(
         kwargs["input_columns"] = arrow_schema_to_render_columns(table.schema)
 
     input_columns = read_columns(table, full=False)
+    passthrough = ptypes.find_passthrough_candidates(table, input_columns, dataframe)
     raw_result = render(dataframe, params, **kwargs)
 
     # raise ValueError if invalid
@@ -152,7 +153,9 @@ def call_render(
     )
     pandas_result.truncate_in_place_if_too_big()
 
-    arrow_result = pandas_result.to_arrow(basedir / request.output_filename)
+    arrow_result = pandas_result.to_arrow(
+        basedir / request.output_filename, passthrough
+    )
     return arrow_render_result_to_thrift(arrow_result)
 
 
@@ -1,3 +1,4 @@
+import pickle
 import sys
 import types
 from typing import Any, List
@@ -10,27 +11,64 @@ import cjwkernel.pandas.module
 from cjwkernel.types import CompiledModule
 
 
-def main(compiled_module: CompiledModule, function: str, args: List[Any]) -> None:
-    """Run `function` with `args`, and write the (Thrift) result to stdout."""
-
-    assert function in (
+FUNCTIONS = frozenset(
+    {
         "render_thrift",
         "migrate_params_thrift",
+        "migrate_params_batch_thrift",
         "fetch_thrift",
         "validate_thrift",
-    )
+    }
+)
+
+SERVE_ONE_REQUEST = "serve_one_request"
+"""Pseudo-function: load the module, then read `(function, args)` from stdin.
+
+The parent spawns "warm" children this way: the child executes the module's
+top-level code while the parent is busy elsewhere. When the parent has a
+request, it pickles `(function, args)` to the child's stdin and closes it. The
+child serves that one request and exits, just like any other child.
+"""
+
+
+def main(compiled_module: CompiledModule, function: str, args: List[Any]) -> None:
+    """Run `function` with `args`, and write the (Thrift) result to stdout."""
+
+    assert function in FUNCTIONS or function == SERVE_ONE_REQUEST
 
     # Point sys.stdout towards sys.stderr. We're printing Thrift messages to
     # stdout; we can't have text interwoven.
     sys.stdout = sys.stderr
 
-    run_in_sandbox(compiled_module, function, args)
+    if function == SERVE_ONE_REQUEST:
+        serve_one_request_in_sandbox(compiled_module)
+    else:
+        run_in_sandbox(compiled_module, function, args)
+
+
+def serve_one_request_in_sandbox(compiled_module: CompiledModule) -> None:
+    """Load the module; then read one request from stdin and run it.
+
+    The request comes from our parent, which we trust. (We're the untrusted
+    side: the parent never unpickles anything we write.)
+    """
+    module = load_module(compiled_module)
+    function, args = pickle.load(sys.stdin.buffer)
+    sys.stdin.close()
+    assert function in FUNCTIONS
+    call_and_write_result(module, function, args)
 
 
 def run_in_sandbox(
     compiled_module: CompiledModule, function: str, args: List[Any]
 ) -> None:
     """Run `function` with `args`, and write the (Thrift) result to `sys.stdout`."""
+    module = load_module(compiled_module)
+    call_and_write_result(module, function, args)
+
+
+def load_module(compiled_module: CompiledModule) -> types.ModuleType:
+    """Execute the user's code and return the module that calls into it."""
     # TODO sandbox -- will need an OS `clone()` with namespace, cgroups, ....
 
     # Run the user's code in a new (programmatic) module.
@@ -62,6 +100,7 @@ def run_in_sandbox(
         "render",
         "render_arrow",
         "render_arrow_v1",
+        "render_arrow_v2",
         "render_pandas",
         "render_thrift",
     ):
@@ -69,20 +108,33 @@ def run_in_sandbox(
             module.__dict__[fn] = user_code_module.__dict__[fn]
     # Set ModuleSpec global parameter -- module frameworks use it for params
     module.__dict__["ModuleSpec"] = load_spec(compiled_module.module_spec_dict)
+    return module
+
+
+def call_and_write_result(
+    module: types.ModuleType, function: str, args: List[Any]
+) -> None:
+    """Call `function` on `module`, and write the (Thrift) result to stdout.
 
+    "migrate_params_batch_thrift" takes a list of params and writes one
+    MigrateParamsResult per params, one after another.
+    """
     if function == "render_thrift":
-        result = module.render_thrift(*args)
+        results = [module.render_thrift(*args)]
     elif function == "migrate_params_thrift":
-        result = module.migrate_params_thrift(*args)
+        results = [module.migrate_params_thrift(*args)]
+    elif function == "migrate_params_batch_thrift":
+        results = [module.migrate_params_thrift(params) for params in args[0]]
     elif function == "validate_thrift":
-        result = module.validate_thrift(*args)
+        results = [module.validate_thrift(*args)]
     elif function == "fetch_thrift":
-        result = module.fetch_thrift(*args)
+        results = [module.fetch_thrift(*args)]
     else:
         raise NotImplementedError
 
     transport = thrift.transport.TTransport.TFileObjectTransport(sys.__stdout__.buffer)
     protocol = thrift.protocol.TBinaryProtocol.TBinaryProtocol(transport)
-    if result is not None:
-        result.write(protocol)
+    for result in results:
+        if result is not None:
+            result.write(protocol)
     transport.flush()
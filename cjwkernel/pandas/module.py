@@ -7,7 +7,7 @@ from typing import Any, Dict
 
 from cjwkernel.thrift import ttypes
 from cjwkernel.types import pydict_to_thrift_json_object, thrift_json_object_to_pydict
-from .framework import arrow_v0, arrow_v1, pandas_v0
+from .framework import arrow_v0, arrow_v1, arrow_v2, pandas_v0
 
 
 def render(table, params: Dict[str, Any], **kwargs):
@@ -21,7 +21,10 @@ def render(table, params: Dict[str, Any], **kwargs):
 def render_thrift(request: ttypes.RenderRequest) -> ttypes.RenderResult:
     global ModuleSpec  # injected by cjwkernel.pandas.main
 
-    if "render_arrow_v1" in globals():
+    if "render_arrow_v2" in globals():
+        global render_arrow_v2
+        return arrow_v2.call_render(render_arrow_v2, request)
+    elif "render_arrow_v1" in globals():
         global render_arrow_v1
         return arrow_v1.call_render(render_arrow_v1, request)
     else:
@@ -5,7 +5,7 @@ from __future__ import annotations
 import json
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Literal, NamedTuple, Optional
+from typing import Any, Dict, Iterable, List, Literal, NamedTuple, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -278,6 +278,99 @@ def series_to_arrow_array(series: pd.Series) -> pa.Array:
         return pa.array(series, type=_dtype_to_arrow_type(series.dtype))
 
 
+def _series_memory(
+    series: pd.Series,
+) -> Optional[Tuple[np.ndarray, Optional[pd.Index]]]:
+    """Return the ndarray (and categories) that hold `series` values.
+
+    Return None for numbers and timestamps: they convert to and from Arrow with
+    a memcpy, so proving they're untouched would cost as much as converting
+    them. Text and dates convert value by value.
+    """
+    if hasattr(series, "cat"):
+        return series.array.codes, series.cat.categories
+    elif pd.PeriodDtype(freq="D") == series.dtype:
+        return series.array.asi8, None
+    elif series.dtype == np.object_:
+        return series.values, None
+    else:
+        return None
+
+
+def _is_same_memory_prefix(a: np.ndarray, b: np.ndarray) -> bool:
+    """Return True if `a` is a view of `b[:len(a)]`."""
+    return (
+        a.dtype == b.dtype
+        and a.strides == b.strides
+        and len(a) <= len(b)
+        and a.__array_interface__["data"][0] == b.__array_interface__["data"][0]
+    )
+
+
+class PassthroughCandidate(NamedTuple):
+    """Input column that render() might return untouched.
+
+    pandas_v0 render() gets a DataFrame and returns one. Most modules leave
+    most columns alone. If an output Series still views the same memory as
+    the input Series, and that memory holds the values it held before
+    render(), we can write the input Arrow array instead of converting.
+    """
+
+    arrow: pa.ChunkedArray
+    """Input Arrow data."""
+
+    column: Column
+    """Input Column."""
+
+    memory: np.ndarray
+    """Pandas data we converted `arrow` to (or its categorical codes)."""
+
+    snapshot: np.ndarray
+    """Copy of `memory` from before render(), so we can spot in-place edits."""
+
+    categories: Optional[pd.Index]
+    """Categories of a categorical Series; None otherwise."""
+
+    def untouched_arrow_array(
+        self, series: pd.Series, column: Column
+    ) -> Optional[pa.ChunkedArray]:
+        """Return `self.arrow` (truncated) if `series` is untouched; else None."""
+        if column != self.column:
+            return None
+        watched = _series_memory(series)
+        if watched is None:
+            return None
+        memory, categories = watched
+        if not _is_same_memory_prefix(memory, self.memory):
+            return None
+        if categories is not self.categories:
+            return None
+        if categories is not None and len(memory) != len(self.memory):
+            return None  # a truncated dictionary may hold unused values
+        if not np.array_equal(memory, self.snapshot[: len(memory)]):
+            return None  # render() edited values in place
+        return self.arrow.slice(0, len(memory))
+
+
+def find_passthrough_candidates(
+    table: pa.Table, columns: List[Column], dataframe: pd.DataFrame
+) -> Dict[str, PassthroughCandidate]:
+    """Remember which memory holds `table`'s columns, after pandas conversion.
+
+    Call this before render(): it copies pointers (or codes, or ordinals) so
+    we can detect whether render() modifies data in place.
+    """
+    ret = {}
+    for column, arrow in zip(columns, table.columns):
+        watched = _series_memory(dataframe[column.name])
+        if watched is not None:
+            memory, categories = watched
+            ret[column.name] = PassthroughCandidate(
+                arrow, column, memory, memory.copy(), categories
+            )
+    return ret
+
+
 def _fix_arrow_field(field: pa.Field, column_type: ColumnType):
     if isinstance(column_type, ColumnType.Date):
         return field.with_metadata({"unit": column_type.unit})
@@ -287,12 +380,25 @@ def _fix_arrow_field(field: pa.Field, column_type: ColumnType):
 
 
 def dataframe_to_arrow_table(
-    dataframe: pd.DataFrame, columns: List[Column], path: Path
+    dataframe: pd.DataFrame,
+    columns: List[Column],
+    path: Path,
+    passthrough: Dict[str, PassthroughCandidate] = {},
 ) -> None:
-    """Write `dataframe` to an Arrow file."""
+    """Write `dataframe` to an Arrow file.
+
+    Where `passthrough` shows a column is untouched, write its Arrow data
+    instead of converting it from pandas.
+    """
     arrays = []
     for column in columns:
-        arrays.append(series_to_arrow_array(dataframe[column.name]))
+        series = dataframe[column.name]
+        array = None
+        if column.name in passthrough:
+            array = passthrough[column.name].untouched_arrow_array(series, column)
+        if array is None:
+            array = series_to_arrow_array(series)
+        arrays.append(array)
 
     arrow_table_without_metadata = pa.Table.from_arrays(
         arrays, names=[c.name for c in columns]
@@ -431,9 +537,16 @@ class ProcessResult:
         old_len = len(self.dataframe)
         new_len = min(old_len, settings.MAX_ROWS_PER_TABLE)
         if new_len != old_len:
-            self.dataframe.drop(
-                range(settings.MAX_ROWS_PER_TABLE, old_len), inplace=True
-            )
+            # Slice, don't copy: untouched columns stay views of their input
+            # data, so to_arrow() can pass them through.
+            dataframe = self.dataframe.iloc[:new_len].copy(deep=False)
+            dataframe.index = pd.RangeIndex(new_len)
+            # Nix unused categories
+            for column in dataframe:
+                series = dataframe[column]
+                if hasattr(series, "cat"):
+                    dataframe[column] = series.cat.remove_unused_categories()
+            self.dataframe = dataframe
             self.errors.append(
                 RenderError(
                     trans(
@@ -443,12 +556,6 @@ class ProcessResult:
                     )
                 )
             )
-            self.dataframe.reset_index(inplace=True, drop=True)
-            # Nix unused categories
-            for column in self.dataframe:
-                series = self.dataframe[column]
-                if hasattr(series, "cat"):
-                    series.cat.remove_unused_categories(inplace=True)
 
     @property
     def column_names(self):
@@ -605,13 +712,16 @@ class ProcessResult:
                     )
                 ) from err
 
-    def to_arrow(self, path: Path) -> atypes.RenderResult:
+    def to_arrow(
+        self, path: Path, passthrough: Dict[str, PassthroughCandidate] = {}
+    ) -> atypes.RenderResult:
         """Build a lower-level RenderResult from this ProcessResult.
 
-        An Arrow table (maybe-empty) will be written to `path`.
+        An Arrow table (maybe-empty) will be written to `path`. Untouched
+        columns found in `passthrough` are written without pandas conversion.
 
         RenderResult is a lower-level (and more modern) representation of a
         module's result. Prefer it everywhere. We will deprecate ProcessResult.
         """
-        dataframe_to_arrow_table(self.dataframe, self.columns, path)
+        dataframe_to_arrow_table(self.dataframe, self.columns, path, passthrough)
         return atypes.RenderResult(errors=self.errors, json=self.json)
@@ -11,8 +11,10 @@
 # is a source of frustration: integration-test runs privileged but staging
 # and production don't. If you're messing with sandboxes, test on staging.
 #
-# This is _one_ chroot environment, suitable for _one_ command. Assume
-# pyspawner never runs two commands at once.
+# Each editable chroot environment is suitable for _one_ command at a time.
+# Processes that run several commands at once (see EDITABLE_CHROOT_POOL in
+# cjwkernel/chroot.py) need one editable chroot per concurrent command.
+# Networking is shared: the kernel runs one network-enabled command at a time.
 #
 # We use overlay mounts:
 #
@@ -35,7 +37,7 @@
 #       * var/tmp/ (empty folder)
 #       * ...
 #   * chroot/ (on a separate filesystem)
-#     * editable/ (a singleton)
+#     * editable/ (and editable-1/, editable-2/, ... if CJW_N_EDITABLE_CHROOTS>1)
 #       * upperfs.ext4 (a 20GB sparse file with ext4 filesystem)
 #       * upperfs/ (upperfs.ext4, loopback-mounted)
 #         * upper/ (empty: where mounts and edits from caller+module go)
@@ -69,9 +71,12 @@ fi
 
 CHROOT=/var/lib/cjwkernel/chroot
 LAYERS=/var/lib/cjwkernel/chroot-layers
-EDITABLE_CHROOT_SIZE=20G  # max size of user edits in EDITABLE_CHROOT
+EDITABLE_CHROOT_SIZE=20G  # max size of user edits in each EDITABLE_CHROOT
+N_EDITABLE_CHROOTS=${CJW_N_EDITABLE_CHROOTS:-1}  # see cjwkernel/chroot.py
 
-# NetworkConfig mimics pyspawner/pyspawner/sandbox.py
+# NetworkConfig mimics pyspawner/pyspawner/sandbox.py for "editable"; each
+# "editable-$i" gets veth-psp$i and 192.168.$((123+i)).2 (see
+# cjwkernel/chroot.py).
 KERNEL_VETH=veth-pyspawn
 CHILD_VETH_IP4="192.168.123.2"
 
@@ -105,28 +110,41 @@ fi
 # script super-fast on producion. (We don't care much about FS speed. The
 # intended use case is large tempfiles and no fsync. When files grow beyond
 # the Linux I/O cache size, users should expect slowdowns.)
-mkdir -p $CHROOT/editable/upperfs
-truncate --size=$EDITABLE_CHROOT_SIZE $CHROOT/editable/upperfs.ext4  # create sparse file
-mkfs.ext4 -q -O ^has_journal $CHROOT/editable/upperfs.ext4
-if ! mount -o loop $CHROOT/editable/upperfs.ext4 $CHROOT/editable/upperfs; then
-  # Docker without --privileged doesn't provide a loopback device. This affects
-  # dev mode (which we don't care about). But it should never happen on production.
-  echo "******* WARNING: failed to mount loopback filesystem $CHROOT/editable/upperfs *****" >&2
-  echo "Workbench will not constrain modules' disk usage. If a module writes" >&2
-  echo "too much to disk, Workbench will experience undefined behavior." >&2
-fi
-# Build overlay filesystem, with upper layer on upperfs
-mkdir -p $CHROOT/editable/upperfs/{upper,work}
-mkdir -p $CHROOT/editable/root
-mount -t overlay overlay -o dirsync,lowerdir=$LAYERS/base,upperdir=$CHROOT/editable/upperfs/upper,workdir=$CHROOT/editable/upperfs/work $CHROOT/editable/root
+setup_editable_chroot() {
+  local dir="$1"
+  mkdir -p $dir/upperfs
+  truncate --size=$EDITABLE_CHROOT_SIZE $dir/upperfs.ext4  # create sparse file
+  mkfs.ext4 -q -O ^has_journal $dir/upperfs.ext4
+  if ! mount -o loop $dir/upperfs.ext4 $dir/upperfs; then
+    # Docker without --privileged doesn't provide a loopback device. This affects
+    # dev mode (which we don't care about). But it should never happen on production.
+    echo "******* WARNING: failed to mount loopback filesystem $dir/upperfs *****" >&2
+    echo "Workbench will not constrain modules' disk usage. If a module writes" >&2
+    echo "too much to disk, Workbench will experience undefined behavior." >&2
+  fi
+  # Build overlay filesystem, with upper layer on upperfs
+  mkdir -p $dir/upperfs/{upper,work}
+  mkdir -p $dir/root
+  mount -t overlay overlay -o dirsync,lowerdir=$LAYERS/base,upperdir=$dir/upperfs/upper,workdir=$dir/upperfs/work $dir/root
+}
 
+# The first editable chroot is "editable"; extras (for renderers and fetchers
+# that run several modules at once) are "editable-1", "editable-2", etc.
+# cjwkernel/chroot.py reads the same CJW_N_EDITABLE_CHROOTS.
+setup_editable_chroot $CHROOT/editable
+for i in $(seq 1 $(($N_EDITABLE_CHROOTS - 1))); do
+  setup_editable_chroot $CHROOT/editable-$i
+done
 
 # iptables
 # "ip route get 1.1.1.1" will display the default route. It looks like:
 #     1.1.1.1 via 192.168.86.1 dev wlp2s0 src 192.168.86.70 uid 1000
 # Grep for the "src x.x.x.x" part and store the "x.x.x.x"
 ipv4_snat_source=$(ip route get 1.1.1.1 | grep -oe "src [^ ]\+" | cut -d' ' -f2)
-cat << EOF | iptables-legacy-restore --noflush
+setup_network() {
+  local KERNEL_VETH="$1"
+  local CHILD_VETH_IP4="$2"
+  cat << EOF | iptables-legacy-restore --noflush
 *filter
 :INPUT ACCEPT
 :FORWARD DROP
@@ -165,3 +183,9 @@ COMMIT
 -A POSTROUTING -s $CHILD_VETH_IP4 -j SNAT --to-source $ipv4_snat_source
 COMMIT
 EOF
+}
+
+setup_network $KERNEL_VETH $CHILD_VETH_IP4
+for i in $(seq 1 $(($N_EDITABLE_CHROOTS - 1))); do
+  setup_network veth-psp$i 192.168.$((123 + $i)).2
+done
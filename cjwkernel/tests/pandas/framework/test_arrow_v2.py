@@ -0,0 +1,142 @@
+import unittest
+
+import pyarrow as pa
+import pyarrow.compute
+from cjwmodule.arrow.testing import assert_arrow_table_equals, make_column, make_table
+from cjwmodule.types import I18nMessage, RenderError
+
+from cjwkernel.tests.util import override_settings
+from cjwkernel.types import RenderResult
+from .util import ModuleTestEnv
+
+
+class RenderTests(unittest.TestCase):
+    def test_render_with_tab_name(self):
+        def render_arrow_v2(batches, params, *, tab_name, **kwargs):
+            self.assertEqual(tab_name, "Tab X")
+            yield from ()
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            env.call_render(make_table(), {}, tab_name="Tab X")
+
+    @override_settings(MAX_ROWS_PER_TABLE=12)
+    def test_render_with_settings(self):
+        def render_arrow_v2(batches, params, *, settings, **kwargs):
+            self.assertEqual(settings.MAX_ROWS_PER_TABLE, 12)
+            yield from ()
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            env.call_render(make_table(), {})
+
+    def test_render_exception_raises(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            raise RuntimeError("move along")
+            yield  # make this a generator
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            with self.assertRaisesRegex(RuntimeError, "move along"):
+                env.call_render(make_table(), {})
+
+    def test_render_not_a_generator(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            return make_table()
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            with self.assertRaisesRegex(ValueError, "must be a generator"):
+                env.call_render(make_table(), {})
+
+    def test_render_yield_not_a_record_batch(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            yield make_table()
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            with self.assertRaisesRegex(ValueError, "must yield pyarrow.RecordBatch"):
+                env.call_render(make_table(), {})
+
+    def test_render_yield_different_schemas(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            yield pa.record_batch([pa.array(["x"])], ["A"])
+            yield pa.record_batch([pa.array(["x"])], ["B"])
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            with self.assertRaisesRegex(ValueError, "different schemas"):
+                env.call_render(make_table(), {})
+
+    def test_render_input_batches(self):
+        def render_arrow_v2(batches, params, *, input_schema, **kwargs):
+            self.assertEqual(input_schema, input_table.schema)
+            self.assertEqual(
+                [batch.column(0).to_pylist() for batch in batches],
+                [["x", "y"], ["z"]],
+            )
+            yield from ()
+
+        input_table = pa.table(
+            {"A": pa.chunked_array([pa.array(["x", "y"]), pa.array(["z"])])}
+        )
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            env.call_render(input_table, {})
+
+    def test_render_input_schema_without_batches(self):
+        def render_arrow_v2(batches, params, *, input_schema, **kwargs):
+            self.assertEqual(input_schema.names, ["A"])
+            self.assertEqual(list(batches), [])
+            yield pa.record_batch([pa.array([], pa.string())], ["A"])
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            outcome = env.call_render(make_table(make_column("A", [], pa.string())), {})
+            assert_arrow_table_equals(
+                outcome.read_table(), make_table(make_column("A", [], pa.string()))
+            )
+
+    def test_render_stream_output_batches(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            for batch in batches:
+                yield batch.filter(pa.compute.not_equal(batch.column(0), "y"))
+
+        input_table = pa.table(
+            {"A": pa.chunked_array([pa.array(["x", "y"]), pa.array(["z"])])}
+        )
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            outcome = env.call_render(input_table, {})
+            self.assertEqual(outcome.result, RenderResult())
+            table = outcome.read_table()
+            self.assertEqual(table.column(0).num_chunks, 2)
+            assert_arrow_table_equals(table, make_table(make_column("A", ["x", "z"])))
+
+    def test_render_no_batches_means_no_columns(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            yield from ()
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            outcome = env.call_render(make_table(make_column("A", ["x"])), {})
+            assert_arrow_table_equals(outcome.read_table(), make_table())
+
+    def test_render_return_errors(self):
+        error = RenderError(I18nMessage("x", {"y": 1}, "module"))
+
+        def render_arrow_v2(batches, params, **kwargs):
+            yield pa.record_batch([pa.array(["x"])], ["A"])
+            return [error]
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            outcome = env.call_render(make_table(), {})
+            self.assertEqual(outcome.result, RenderResult([error]))
+
+    def test_render_return_errors_and_json(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            yield from ()
+            return [], {"json": ["A-", 1]}
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            outcome = env.call_render(make_table(), {})
+            self.assertEqual(outcome.result, RenderResult([], {"json": ["A-", 1]}))
+
+    def test_render_invalid_return_value(self):
+        def render_arrow_v2(batches, params, **kwargs):
+            yield from ()
+            return {"foo": "bar"}
+
+        with ModuleTestEnv(render_arrow_v2=render_arrow_v2) as env:
+            with self.assertRaisesRegex(ValueError, "must return None"):
+                env.call_render(make_table(), {})
@@ -225,6 +225,81 @@ class RenderTests(unittest.TestCase):
                 ),
             )
 
+    def test_render_pass_through_untouched_columns(self):
+        def render(table, params):
+            table["B"] = table["B"] * 2
+            return table
+
+        input_table = pa.table(
+            [
+                # pandas->Arrow conversion would give int8 indices; passthrough
+                # keeps int32
+                pa.DictionaryArray.from_arrays(
+                    pa.array([0, 1, 0], pa.int32()), pa.array(["x", "y"])
+                ),
+                pa.array([1, 2, 3]),
+            ],
+            pa.schema(
+                [
+                    pa.field("A", pa.dictionary(pa.int32(), pa.string())),
+                    pa.field("B", pa.int64(), metadata={"format": "{:,d}"}),
+                ]
+            ),
+        )
+        with ModuleTestEnv(render=render) as env:
+            outcome = env.call_render(input_table, {})
+            result = outcome.read_table()
+            self.assertEqual(result["A"].type.index_type, pa.int32())
+            self.assertEqual(result["A"].to_pylist(), ["x", "y", "x"])
+            self.assertEqual(result["B"].to_pylist(), [2, 4, 6])
+
+    def test_render_detect_in_place_edit_of_passthrough_candidate(self):
+        def render(table, params):
+            table.loc[0, "A"] = "y"
+            table.loc[1, "B"] = "c"
+            return table
+
+        input_table = pa.table(
+            [
+                pa.DictionaryArray.from_arrays(
+                    pa.array([0, 1], pa.int32()), pa.array(["x", "y"])
+                ),
+                pa.array(["a", "b"]),
+            ],
+            pa.schema(
+                [
+                    pa.field("A", pa.dictionary(pa.int32(), pa.string())),
+                    pa.field("B", pa.string()),
+                ]
+            ),
+        )
+        with ModuleTestEnv(render=render) as env:
+            outcome = env.call_render(input_table, {})
+            result = outcome.read_table()
+            self.assertEqual(result["A"].to_pylist(), ["y", "y"])
+            self.assertEqual(result["B"].to_pylist(), ["a", "c"])
+
+    @override_settings(MAX_ROWS_PER_TABLE=2)
+    def test_render_truncate_pass_through_untouched_columns(self):
+        def render(table, params):
+            return table
+
+        with ModuleTestEnv(render=render) as env:
+            outcome = env.call_render(
+                make_table(
+                    make_column("A", ["a", "b", "c"]),
+                    make_column("B", [date(2021, 4, 1), None, None], unit="month"),
+                ),
+                {},
+            )
+            assert_arrow_table_equals(
+                outcome.read_table(),
+                make_table(
+                    make_column("A", ["a", "b"]),
+                    make_column("B", [date(2021, 4, 1), None], unit="month"),
+                ),
+            )
+
     def test_render_using_tab_output(self):
         def render(table, params):
             self.assertEqual(params["tabparam"].name, "Tab 1")
@@ -101,8 +101,9 @@ class ModuleTestEnv:
 
     def __exit__(self, *args):
         cjwkernel.pandas.module.__dict__.update(self.old_defs)
-        if hasattr(cjwkernel.pandas.module, "render_arrow_v1"):
-            del cjwkernel.pandas.module.render_arrow_v1
+        for name in ("render_arrow_v1", "render_arrow_v2"):
+            if hasattr(cjwkernel.pandas.module, name):
+                delattr(cjwkernel.pandas.module, name)
         del self.old_defs
         shutil.rmtree(self.basedir)
         del self.basedir
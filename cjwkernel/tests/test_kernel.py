@@ -2,6 +2,7 @@ import contextlib
 import marshal
 import os
 import textwrap
+import time
 import unittest
 from unittest.mock import patch
 
@@ -141,6 +142,39 @@ class KernelTests(unittest.TestCase):
         result = self.kernel.migrate_params(mod, {"foo": 123})
         self.assertEquals(result, {"nested": {"foo": 123}})
 
+    def test_migrate_params_batch(self):
+        mod = _compile("foo", "def migrate_params(params): return {'nested': params}")
+        result = self.kernel.migrate_params_batch(mod, [{"foo": 1}, {"foo": 2}])
+        self.assertEqual(result, [{"nested": {"foo": 1}}, {"nested": {"foo": 2}}])
+
+    def test_migrate_params_batch_error(self):
+        mod = _compile(
+            "foo",
+            "def migrate_params(params): return params if params['ok'] else range(2)",
+        )
+        with self.assertRaises(ModuleExitedError):
+            self.kernel.migrate_params_batch(mod, [{"ok": True}, {"ok": False}])
+
+    def test_migrate_params_in_warm_child(self):
+        mod = _compile(
+            "foo",
+            textwrap.dedent(
+                """
+                import time
+                LOADED_AT = time.time()
+                def migrate_params(params):
+                    return {"age": time.time() - LOADED_AT}
+                """
+            ),
+        )
+        # First call spawns a child and then a warm one
+        self.assertLess(self.kernel.migrate_params(mod, {})["age"], 0.5)
+        time.sleep(0.6)
+        # Second call uses the warm child, which loaded the module long ago
+        self.assertGreater(self.kernel.migrate_params(mod, {})["age"], 0.5)
+        # Third call uses a new warm child: each child serves one request
+        self.assertLess(self.kernel.migrate_params(mod, {})["age"], 0.5)
+
     def test_migrate_params_retval_not_thrift_ready(self):
         mod = _compile("foo", "def migrate_params(params): return range(2)")
         with self.assertRaises(ModuleExitedError):
@@ -205,6 +239,11 @@ class KernelTests(unittest.TestCase):
                         make_column("B", ["aXX", "bXX", "cXX"]),
                     ),
                 )
+        # No warm child in the editable chroot: it would see this basedir
+        self.assertNotIn(
+            self.chroot_context.chroot.root,
+            {key.chroot_dir for key in self.kernel._warm_children},
+        )
 
     def test_render_exception(self):
         mod = _compile(
@@ -8,9 +8,13 @@ from cjwmodule.arrow.testing import make_column
 from cjwkernel.types import Column, ColumnType
 from cjwkernel.util import tempfile_context
 from cjwkernel.validate import (
+    load_untrusted_arrow_file_with_columns,
     read_columns,
-    validate_arrow_file,
+    ColumnNameHasControlCharacter,
+    ColumnNameTooLong,
     DateValueHasWrongUnit,
+    DictionaryNotNormalized,
+    FloatNotFinite,
     DateOutOfRange,
     FieldMetadataNotAllowed,
     InvalidNumberFormat,
@@ -19,7 +23,6 @@ from cjwkernel.validate import (
     TimestampUnitNotAllowed,
     DuplicateColumnName,
     InvalidArrowFile,
-    TableHasTooManyRecordBatches,
     WrongColumnType,
 )
 from cjwkernel.tests.util import arrow_table_context
@@ -41,14 +44,13 @@ def Timestamp(name: str) -> Column:
     return Column(name, ColumnType.Timestamp())
 
 
-class ValidateArrowFileTests(unittest.TestCase):
-    # A note on implementation: we know validate_arrow_file() simply runs
-    # /usr/bin/arrow-validate. We aren't testing /usr/bin/arrow-validate here.
-    # We're just testing that errors get propagated and success is possible.
-
+class LoadUntrustedArrowFileWithColumnsTests(unittest.TestCase):
     def test_happy_path(self):
-        with arrow_table_context(make_column("A", ["x"])) as (path, _):
-            validate_arrow_file(path)  # do not raise
+        with arrow_table_context(make_column("A", ["x"])) as (path, table):
+            self.assertEqual(
+                load_untrusted_arrow_file_with_columns(path),
+                (table, [Column("A", ColumnType.Text())]),
+            )
 
     def test_arrow_file_does_not_validate(self):
         array = pa.StringArray.from_buffers(
@@ -64,25 +66,33 @@ class ValidateArrowFileTests(unittest.TestCase):
                 writer.write_table(table)
 
             with self.assertRaisesRegex(
-                InvalidArrowFile, "arrow-validate: --check-safe failed"
+                InvalidArrowFile, "Invalid Arrow file: column 'A': .*UTF8"
             ):
-                validate_arrow_file(path)
+                load_untrusted_arrow_file_with_columns(path)
+
+    def test_many_record_batches(self):
+        table = pa.table({"A": pa.chunked_array([pa.array(["x"]), pa.array(["y"])])})
+        with arrow_table_context(table) as (path, _):
+            result_table, columns = load_untrusted_arrow_file_with_columns(path)
+            self.assertEqual(result_table.column(0).num_chunks, 2)
+            self.assertEqual(result_table, table)
+            self.assertEqual(columns, [Column("A", ColumnType.Text())])
 
     def test_arrow_file_does_not_open(self):
         with tempfile_context() as path:
             path.write_bytes(b"this is not an Arrow file")
             with self.assertRaisesRegex(
-                InvalidArrowFile, "arrow-validate: .*Not an Arrow file"
+                InvalidArrowFile, "Invalid Arrow file: .*Not an Arrow file"
             ):
-                validate_arrow_file(path)
+                load_untrusted_arrow_file_with_columns(path)
 
     def test_arrow_file_does_not_exist(self):
         with tempfile_context() as path:
             path.unlink()
             with self.assertRaisesRegex(
-                InvalidArrowFile, "arrow-validate: .*No such file or directory"
+                InvalidArrowFile, "Invalid Arrow file: .*No such file or directory"
             ):
-                validate_arrow_file(path)
+                load_untrusted_arrow_file_with_columns(path)
 
 
 class ReadColumnsTest(unittest.TestCase):
@@ -91,9 +101,20 @@ class ReadColumnsTest(unittest.TestCase):
         with self.assertRaises(TableSchemaHasMetadata):
             read_columns(table)
 
-    def test_table_too_many_record_batches(self):
+    def test_table_many_record_batches(self):
         table = pa.table({"A": pa.chunked_array([pa.array(["x"]), pa.array(["y"])])})
-        with self.assertRaises(TableHasTooManyRecordBatches):
+        self.assertEqual(read_columns(table), [Column("A", ColumnType.Text())])
+
+    def test_date_unit_bad_in_later_record_batch(self):
+        table = pa.table(
+            [
+                pa.chunked_array(
+                    [pa.array([date(2021, 1, 1)]), pa.array([None, date(2021, 2, 2)])]
+                )
+            ],
+            pa.schema([pa.field("A", pa.date32(), metadata={b"unit": b"month"})]),
+        )
+        with self.assertRaises(DateValueHasWrongUnit):
             read_columns(table)
 
     def test_duplicate_column_names(self):
@@ -107,6 +128,22 @@ class ReadColumnsTest(unittest.TestCase):
         ):
             read_columns(table)
 
+    def test_column_name_too_long(self):
+        table = pa.table({"A" * 121: ["x"]})
+        with self.assertRaises(ColumnNameTooLong):
+            read_columns(table)
+
+    def test_column_name_control_character(self):
+        table = pa.table({"A\nB": ["x"]})
+        with self.assertRaises(ColumnNameHasControlCharacter):
+            read_columns(table)
+
+    def test_column_name_not_checked_when_not_full(self):
+        table = pa.table({"A\nB": ["x"]})
+        self.assertEqual(
+            read_columns(table, full=False), [Column("A\nB", ColumnType.Text())]
+        )
+
     def test_timestamp_metadata_non_null(self):
         table = pa.table(
             [pa.array([123123123], pa.timestamp("ns"))],
@@ -201,6 +238,14 @@ class ReadColumnsTest(unittest.TestCase):
             read_columns(table), [Column("A", ColumnType.Date(unit="month"))]
         )
 
+    def test_date_unit_month_bad_after_null(self):
+        table = pa.table(
+            [pa.array([date(2021, 1, 1), None, date(2021, 2, 2)])],
+            pa.schema([pa.field("A", pa.date32(), metadata={b"unit": b"month"})]),
+        )
+        with self.assertRaises(DateValueHasWrongUnit):
+            read_columns(table)
+
     def test_date_unit_quarter_bad(self):
         table = pa.table(
             [pa.array([date(2021, 3, 1)])],
@@ -266,6 +311,84 @@ class ReadColumnsTest(unittest.TestCase):
             [Column("A", ColumnType.Text())],
         )
 
+    def test_text_dictionary_shared_by_record_batches(self):
+        # An Arrow file has one dictionary per column: each batch may use
+        # only some of its values
+        dictionary = pa.array(["x", "y"])
+        table = pa.table(
+            {
+                "A": pa.chunked_array(
+                    [
+                        pa.DictionaryArray.from_arrays(
+                            pa.array([0, 0], pa.int32()), dictionary
+                        ),
+                        pa.DictionaryArray.from_arrays(
+                            pa.array([1], pa.int32()), dictionary
+                        ),
+                    ]
+                )
+            }
+        )
+        self.assertEqual(read_columns(table), [Column("A", ColumnType.Text())])
+
+    def test_text_dictionary_null(self):
+        table = pa.table(
+            {
+                "A": pa.DictionaryArray.from_arrays(
+                    pa.array([0, 1], pa.int32()), pa.array(["x", None])
+                )
+            }
+        )
+        with self.assertRaisesRegex(DictionaryNotNormalized, "contains null"):
+            read_columns(table)
+
+    def test_text_dictionary_duplicates(self):
+        table = pa.table(
+            {
+                "A": pa.DictionaryArray.from_arrays(
+                    pa.array([0, 1], pa.int32()), pa.array(["x", "x"])
+                )
+            }
+        )
+        with self.assertRaisesRegex(DictionaryNotNormalized, "contains duplicates"):
+            read_columns(table)
+
+    def test_text_dictionary_unused(self):
+        table = pa.table(
+            {
+                "A": pa.DictionaryArray.from_arrays(
+                    pa.array([0, None], pa.int32()), pa.array(["x", "y"])
+                )
+            }
+        )
+        with self.assertRaisesRegex(DictionaryNotNormalized, "contains unused"):
+            read_columns(table)
+
+    def test_number_nan(self):
+        table = pa.table(
+            [pa.array([1.0, None, float("nan")])],
+            pa.schema([pa.field("A", pa.float64(), metadata={b"format": b"{:,}"})]),
+        )
+        with self.assertRaises(FloatNotFinite):
+            read_columns(table)
+
+    def test_number_infinity(self):
+        table = pa.table(
+            [pa.array([float("inf")], pa.float32())],
+            pa.schema([pa.field("A", pa.float32(), metadata={b"format": b"{:,}"})]),
+        )
+        with self.assertRaises(FloatNotFinite):
+            read_columns(table)
+
+    def test_number_float_with_null_ok(self):
+        table = pa.table(
+            [pa.array([1.0, None])],
+            pa.schema([pa.field("A", pa.float64(), metadata={b"format": b"{:,}"})]),
+        )
+        self.assertEqual(
+            read_columns(table), [Column("A", ColumnType.Number(format="{:,}"))]
+        )
+
     def test_number_metadata_none(self):
         table = pa.table({"A": pa.array([123123123])})
         with self.assertRaises(FieldMetadataNotAllowed):
@@ -1,8 +1,8 @@
-import subprocess
-import time
+import re
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+import numpy as np
 import pyarrow as pa
 import pyarrow.compute
 from cjwmodule.arrow.format import parse_number_format
@@ -16,13 +16,13 @@ class ValidateError(ValueError):
 
 
 class InvalidArrowFile(ValidateError):
-    """arrow-validate of a path failed.
+    """Arrow file at a path does not open, or its buffers are unsafe.
 
-    Run arrow-validate before opening an Arrow file in Python, for SECURITY.
+    Validate untrusted data before reading its values in Python, for SECURITY.
     """
 
     def __init__(self, text):
-        super().__init__("arrow-validate: " + text)
+        super().__init__("Invalid Arrow file: " + text)
 
 
 class TableSchemaHasMetadata(ValidateError):
@@ -30,11 +30,6 @@ class TableSchemaHasMetadata(ValidateError):
         super().__init__("table.schema.metadata must be None; got non-null")
 
 
-class TableHasTooManyRecordBatches(ValidateError):
-    def __init__(self, actual: int):
-        super().__init__("Table has %d record batches; we only support 1" % actual)
-
-
 class DuplicateColumnName(ValidateError):
     def __init__(self, name: str, position1: int, position2: int):
         super().__init__(
@@ -106,41 +101,123 @@ class InvalidNumberFormat(ValidateError):
         )
 
 
-def validate_arrow_file(path: Path) -> None:
-    """Validate that `table` can be loaded at all.
+class ColumnNameIsInvalidUtf8(ValidateError):
+    def __init__(self, position: int):
+        super().__init__("Table column %d has a name that is not UTF-8" % position)
+
+
+class ColumnNameTooLong(ValidateError):
+    def __init__(self, name: str, max_bytes: int):
+        super().__init__(
+            "Table column %r has a name longer than %d bytes" % (name, max_bytes)
+        )
+
+
+class ColumnNameHasControlCharacter(ValidateError):
+    def __init__(self, name: str):
+        super().__init__(
+            "Table column %r has a name with an ASCII control character" % (name,)
+        )
+
+
+class FloatNotFinite(ValidateError):
+    def __init__(self, name: str):
+        super().__init__(
+            "Table column %r has NaN or Infinity values; use null instead" % (name,)
+        )
+
+
+class DictionaryNotNormalized(ValidateError):
+    def __init__(self, name: str, problem: str):
+        super().__init__(
+            "Table column %r has an invalid dictionary: %s" % (name, problem)
+        )
+
+
+_ASCII_CONTROL_CHARACTER = re.compile(r"[\x00-\x1f]")
+
 
-    Raise InvalidArrowFile if:
+def _read_untrusted_column_name(field: pa.Field, position: int) -> str:
+    """Return `field.name`, or raise ValidateError."""
+    try:
+        name = field.name
+    except UnicodeDecodeError:
+        raise ColumnNameIsInvalidUtf8(position) from None
+    if len(name.encode("utf-8")) > settings.MAX_BYTES_PER_COLUMN_NAME:
+        raise ColumnNameTooLong(name, settings.MAX_BYTES_PER_COLUMN_NAME)
+    if _ASCII_CONTROL_CHARACTER.search(name):
+        raise ColumnNameHasControlCharacter(name)
+    return name
+
+
+def _validate_untrusted_column_values(column: pa.ChunkedArray, name: str) -> None:
+    """Raise ValidateError if `column` is unsafe to read or has invalid values.
 
-    * The file is empty or has no Arrow header
-    * Text columns' offsets are invalid
-    * A column name has invalid UTF-8
-    * A column name is too long (see settings.MAX_BYTES_PER_COLUMN_NAME)
-    * A column name contains ASCII control characters (a newline, for example)
-    * Some text data has invalid UTF-8
-    * A float is NaN or Infinity.
-    * A dictionary column's dictionary contains nulls or unused values
+    Check (in this order -- later checks read values):
+
+    * Buffers and offsets are in bounds, and text is valid UTF-8
+    * Floats are all finite (null, not NaN or Infinity)
+    * Dictionaries contain no nulls, no duplicates and no unused values
     """
     try:
-        subprocess.run(
-            [
-                "/usr/bin/arrow-validate",
-                "--check-column-name-control-characters",
-                f"--check-column-name-max-bytes={settings.MAX_BYTES_PER_COLUMN_NAME}",
-                "--check-dictionary-values-all-used",
-                "--check-dictionary-values-not-null",
-                "--check-dictionary-values-unique",
-                "--check-floats-all-finite",
-                "--check-safe",
-                path.as_posix(),
-            ],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            encoding="utf-8",
-        )
-    except subprocess.CalledProcessError as err:
-        message = err.stdout[:-1]  # strip trailing "\n"
-        raise InvalidArrowFile(message) from None
+        column.validate(full=True)
+    except pa.ArrowException as err:
+        raise InvalidArrowFile("column %r: %s" % (name, str(err))) from None
+
+    if pa.types.is_floating(column.type):
+        for chunk in column.chunks:
+            values = chunk.to_numpy(zero_copy_only=False)
+            if chunk.null_count:
+                values = values[~chunk.is_null().to_numpy(zero_copy_only=False)]
+            if not np.isfinite(values).all():
+                raise FloatNotFinite(name)
+    elif pa.types.is_dictionary(column.type):
+        for chunks in _group_chunks_by_dictionary(column.chunks):
+            dictionary = chunks[0].dictionary
+            if dictionary.null_count:
+                raise DictionaryNotNormalized(name, "it contains null")
+            if len(pa.compute.unique(dictionary)) != len(dictionary):
+                raise DictionaryNotNormalized(name, "it contains duplicates")
+            used = pa.compute.unique(
+                pa.chunked_array([chunk.indices for chunk in chunks])
+            )
+            if len(used) - used.null_count != len(dictionary):
+                raise DictionaryNotNormalized(name, "it contains unused values")
+
+
+def _group_chunks_by_dictionary(
+    chunks: List[pa.DictionaryArray],
+) -> List[List[pa.DictionaryArray]]:
+    """Group consecutive chunks that share a dictionary.
+
+    An Arrow file holds one dictionary per column, shared by all its record
+    batches: each batch may use only some of the dictionary's values. Tables
+    built in memory may have a different dictionary in each chunk.
+    """
+    groups = []
+    for chunk in chunks:
+        if groups and groups[-1][0].dictionary.equals(chunk.dictionary):
+            groups[-1].append(chunk)
+        else:
+            groups.append([chunk])
+    return groups
+
+
+def _date32_chunk_has_wrong_unit(chunk: pa.Array, unit: str) -> bool:
+    """Return True if any value in `chunk` doesn't start a month/quarter/year."""
+    # Nulls become 1970-01-01, which is the first day of all units
+    days = (
+        pa.compute.fill_null(chunk.view(pa.int32()), 0)
+        .to_numpy()
+        .astype("datetime64[D]")
+    )
+    if unit == "year":
+        starts = days.astype("datetime64[Y]")  # rounds down
+    else:
+        starts = days.astype("datetime64[M]")  # rounds down
+        if unit == "quarter" and (starts.astype(np.int64) % 3).any():
+            return True  # month isn't January, April, July or October
+    return bool((starts.astype("datetime64[D]") != days).any())
 
 
 def _read_column_type(
@@ -198,20 +275,9 @@ def _read_column_type(
                         raise DateValueHasWrongUnit(field.name, "week")
                 return ColumnType.Date(unit="week")
             else:
-                is_valid = {
-                    "month": lambda st: st.tm_mday == 1,
-                    "quarter": lambda st: st.tm_mday == 1 and st.tm_mon % 3 == 1,
-                    "year": lambda st: st.tm_mon == 1 and st.tm_mday == 1,
-                }[unit]
                 for chunk in column.chunks:
-                    unix_timestamps = pa.compute.multiply(
-                        chunk.view(pa.int32()).cast(pa.int64()), 86400
-                    )
-                    for unix_timestamp in unix_timestamps:
-                        if unix_timestamp.is_valid:
-                            struct_time = time.gmtime(unix_timestamp.as_py())
-                            if not is_valid(struct_time):
-                                raise DateValueHasWrongUnit(field.name, unit)
+                    if _date32_chunk_has_wrong_unit(chunk, unit):
+                        raise DateValueHasWrongUnit(field.name, unit)
 
         return ColumnType.Date(unit=unit)
 
@@ -256,14 +322,23 @@ def read_columns(table: pa.Table, full: bool = True) -> List[Column]:
     Raise ValidateError if:
 
     * table has metadata
-    * table has more than one record batch
     * columns have invalid metadata (e.g., a "format" on a "text" column, or
       a timestamp with unit!=ns or a timezone)
     * column values disagree with metadata (e.g., date32 "2021-04-12" with
       `ColumnType.Date("month")`)
 
-    Be sure the Arrow file backing the table was validated with
-    `validate_arrow_file()` first. Otherwise, you'll get undefined behavior.
+    If `full=True` (the default), also raise ValidateError if:
+
+    * a column name is not UTF-8, is too long (see
+      settings.MAX_BYTES_PER_COLUMN_NAME) or contains ASCII control characters
+      (a newline, for example)
+    * buffers or offsets are out of bounds, or text is not valid UTF-8
+    * a float is NaN or Infinity
+    * a dictionary column's dictionary contains nulls, duplicates or unused
+      values
+
+    These checks happen column by column, in the same pass that reads column
+    types: we never read a column's values before validating its buffers.
 
     If `full=False`, skip costly checks. Only pass `full=False` when you can
     guarantee the data has been generated by a source you trust. (In particular,
@@ -277,17 +352,19 @@ def read_columns(table: pa.Table, full: bool = True) -> List[Column]:
 
     for position, column in enumerate(table.itercolumns()):
         field = table.field(position)
-        if column.num_chunks > 1:
-            raise TableHasTooManyRecordBatches(column.num_chunks)
 
-        if field.name in seen_column_names:
-            raise DuplicateColumnName(
-                field.name, seen_column_names[field.name], position
-            )
+        if full:
+            name = _read_untrusted_column_name(field, position)
+            _validate_untrusted_column_values(column, name)
+        else:
+            name = field.name
+
+        if name in seen_column_names:
+            raise DuplicateColumnName(name, seen_column_names[name], position)
         else:
-            seen_column_names[field.name] = position
+            seen_column_names[name] = position
 
-        ret.append(Column(field.name, _read_column_type(column, field, full=full)))
+        ret.append(Column(name, _read_column_type(column, field, full=full)))
 
     return ret
 
@@ -301,13 +378,18 @@ def load_untrusted_arrow_file_with_columns(path: Path) -> Tuple[pa.Table, List[C
 
     Use this to load modules' outputs. If loading succeeds, you can now "trust"
     the Arrow file at `path`.
-    """
-    validate_arrow_file(path)  # raise ValidateError
 
-    # Validate passed, so it's safe to open the Arrow file ... and the read will
-    # not fail.
-    reader = pyarrow.ipc.open_file(path)
-    table = reader.read_all()
+    Validation happens in-process, in one pass over the table. pyarrow checks
+    the file's structure (flatbuffers, buffer bounds) as it reads;
+    `read_columns()` checks each column's buffers before reading its values.
+    """
+    try:
+        reader = pyarrow.ipc.open_file(path)
+        table = reader.read_all()
+    except (OSError, pa.ArrowException) as err:
+        # OSError: file does not exist
+        # ArrowInvalid: "Not an Arrow file", invalid flatbuffers, etc.
+        raise InvalidArrowFile(str(err)) from None
 
     columns = read_columns(table, full=True)  # raise ValidateError
 
@@ -0,0 +1,72 @@
+import os
+
+__all__ = (
+    "RENDER_MEMO_DIR",
+    "RENDER_MEMO_MAX_BYTES",
+    "RENDERCACHE_LOCAL_DIR",
+    "RENDERCACHE_LOCAL_MAX_BYTES",
+    "RENDERCACHE_ARROW_FORMAT",
+    "STOREDOBJECTS_LOCAL_DIR",
+    "STOREDOBJECTS_LOCAL_MAX_BYTES",
+)
+
+RENDER_MEMO_DIR = os.environ.get("CJW_RENDER_MEMO_DIR", "/var/tmp/render-memo")
+"""Directory where the renderer memoizes render() outputs.
+
+Renderer processes on the same node may share this directory.
+"""
+
+RENDER_MEMO_MAX_BYTES = int(os.environ.get("CJW_RENDER_MEMO_MAX_BYTES", "0"))
+"""Maximum size of `RENDER_MEMO_DIR`. `0` disables the render memo.
+
+When the directory grows past this size, the renderer deletes the
+least-recently-used memoized outputs.
+"""
+
+RENDERCACHE_LOCAL_DIR = os.environ.get(
+    "CJW_RENDERCACHE_LOCAL_DIR", "/var/tmp/rendercache"
+)
+"""Directory where we keep local copies of render-cache Parquet files.
+
+All processes on the same node (web, renderer, fetcher) may share this
+directory.
+"""
+
+RENDERCACHE_LOCAL_MAX_BYTES = int(
+    os.environ.get("CJW_RENDERCACHE_LOCAL_MAX_BYTES", "0")
+)
+"""Maximum size of `RENDERCACHE_LOCAL_DIR`. `0` disables the local copies.
+
+When the directory grows past this size, we delete the least-recently-used
+Parquet files. (They are still on S3.)
+"""
+
+RENDERCACHE_ARROW_FORMAT = os.environ.get("CJW_RENDERCACHE_ARROW_FORMAT", "")
+"""Also store each render result as an Arrow file: "", "uncompressed" or "lz4".
+
+The default, "", stores only Parquet. Loading a cached result from Parquet to
+resume a render costs several passes over the data. With "uncompressed", the
+renderer downloads the Arrow file straight into the next step's input file.
+"lz4" costs less storage and bandwidth, plus one decompression pass.
+
+Parquet is always stored, too: the web tier and fetcher read it.
+"""
+
+STOREDOBJECTS_LOCAL_DIR = os.environ.get(
+    "CJW_STOREDOBJECTS_LOCAL_DIR", "/var/tmp/storedobjects"
+)
+"""Directory where we keep local copies of content-addressed fetch results.
+
+The fetcher reads the previous fetch result on every fetch, to pass it to the
+module. Most of the time, that's the same file it read last time.
+"""
+
+STOREDOBJECTS_LOCAL_MAX_BYTES = int(
+    os.environ.get("CJW_STOREDOBJECTS_LOCAL_MAX_BYTES", str(1024 * 1024 * 1024))
+)
+"""Maximum size of `STOREDOBJECTS_LOCAL_DIR`. `0` disables the local copies.
+
+On by default: content-addressed files never change, so a local copy can
+never be stale. When the directory grows past this size, we delete the
+least-recently-used copies. (They are still on S3.)
+"""
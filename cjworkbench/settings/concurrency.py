@@ -0,0 +1,42 @@
+import os
+
+__all__ = (
+    "MAX_CONCURRENT_FETCHES_PER_HOST",
+    "MAX_CONCURRENT_TABS_PER_RENDER",
+    "N_CONCURRENT_FETCHES",
+    "N_CONCURRENT_RENDERS",
+)
+
+MAX_CONCURRENT_TABS_PER_RENDER = int(
+    os.environ.get("CJW_MAX_CONCURRENT_TABS_PER_RENDER", "1")
+)
+"""How many of a workflow's tabs may one renderer render at the same time?
+
+Each tab renders in its own chroot from `EDITABLE_CHROOT_POOL`, so the actual
+limit is the lesser of this and `CJW_N_EDITABLE_CHROOTS`.
+"""
+
+N_CONCURRENT_RENDERS = int(os.environ.get("CJW_N_CONCURRENT_RENDERS", "1"))
+"""How many workflows may one renderer process render at the same time?
+
+This is also the renderer's RabbitMQ prefetch count. Each render acquires a
+chroot from `EDITABLE_CHROOT_POOL` for each tab, so set
+`CJW_N_EDITABLE_CHROOTS` at least this high.
+"""
+
+N_CONCURRENT_FETCHES = int(os.environ.get("CJW_N_CONCURRENT_FETCHES", "1"))
+"""How many fetches may one fetcher process run at the same time?
+
+This is also the fetcher's RabbitMQ prefetch count. Each fetch acquires a
+chroot (and its veth pair) from `EDITABLE_CHROOT_POOL`, so set
+`CJW_N_EDITABLE_CHROOTS` at least this high.
+"""
+
+MAX_CONCURRENT_FETCHES_PER_HOST = int(
+    os.environ.get("CJW_MAX_CONCURRENT_FETCHES_PER_HOST", "2")
+)
+"""How many of one fetcher's concurrent fetches may request the same host?
+
+Fetches with a "url" param are keyed by its hostname; others (Twitter, Google
+Sheets, ...) are keyed by module ID. Keeps us from hammering a single origin.
+"""
@@ -1,6 +1,39 @@
 import os
 
-__all__ = ("AWS_S3_ENDPOINT", "S3_BUCKET_NAME_PATTERN")
+from .util import FalsyStrings
+
+__all__ = (
+    "AWS_S3_ENDPOINT",
+    "S3_BUCKET_NAME_PATTERN",
+    "S3_MULTIPART_UPLOAD",
+    "S3_MULTIPART_CHUNK_SIZE",
+    "S3_MULTI_DELETE",
+    "S3_TRANSFER_CONCURRENCY",
+)
 
 AWS_S3_ENDPOINT = os.environ.get("AWS_S3_ENDPOINT")  # None means AWS default
 S3_BUCKET_NAME_PATTERN = os.environ.get("S3_BUCKET_NAME_PATTERN", "%s")
+
+S3_MULTIPART_UPLOAD = (
+    os.environ.get("CJW_S3_MULTIPART_UPLOAD", "False") not in FalsyStrings
+)
+"""Upload big files in parallel parts.
+
+Google Cloud Storage's S3 emulation doesn't support multipart uploads. Enable
+this on AWS and Minio.
+"""
+
+S3_MULTIPART_CHUNK_SIZE = int(
+    os.environ.get("CJW_S3_MULTIPART_CHUNK_SIZE", str(8 * 1024 * 1024))
+)
+"""Size of each part of a multipart upload (and the threshold for using one)."""
+
+S3_MULTI_DELETE = os.environ.get("CJW_S3_MULTI_DELETE", "False") not in FalsyStrings
+"""Delete up to 1,000 keys per request, with DeleteObjects.
+
+Google Cloud Storage's S3 emulation doesn't support DeleteObjects. Enable this
+on AWS and Minio.
+"""
+
+S3_TRANSFER_CONCURRENCY = int(os.environ.get("CJW_S3_TRANSFER_CONCURRENCY", "10"))
+"""Number of parallel requests per upload, download or batch delete."""
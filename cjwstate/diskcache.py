@@ -0,0 +1,164 @@
+"""Size-bounded, least-recently-used cache of files on local disk.
+
+A DiskCache is a directory. Each entry is a file named after its key. Several
+processes on the same node may share a directory: writes are atomic renames,
+and readers never read a file that is being written or evicted.
+
+Keys must identify immutable data. There is no "update" operation: if two
+processes write the same key, one write wins and the other is discarded.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import ContextManager, Optional
+
+from cjwkernel.util import tempfile_context
+
+
+logger = logging.getLogger(__name__)
+
+
+LOG_STATS_EVERY_N_LOOKUPS = 1000
+
+
+@dataclass
+class DiskCacheStats:
+    """Per-process counters. (Other processes sharing the directory keep their own.)"""
+
+    n_hits: int = 0
+    n_misses: int = 0
+    n_bytes_saved: int = 0
+    """Sum of the sizes of files we read from cache instead of elsewhere."""
+
+    n_evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        n_lookups = self.n_hits + self.n_misses
+        return self.n_hits / n_lookups if n_lookups else 0.0
+
+
+def _key_to_filename(key: str) -> str:
+    # Keys may contain "/" and other unsafe characters; hash them. Keep the
+    # last few characters of the key so humans can debug.
+    return (
+        hashlib.sha1(key.encode("utf-8")).hexdigest()
+        + "-"
+        + "".join(c if c.isalnum() or c in "-." else "_" for c in key[-40:])
+    )
+
+
+class DiskCache:
+    """Cache files in `root`, evicting least-recently-used ones past `max_bytes`.
+
+    A DiskCache with `max_bytes == 0` is disabled: it never stores anything.
+    """
+
+    def __init__(self, name: str, root: Path, max_bytes: int):
+        self.name = name
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = DiskCacheStats()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _count(self, *, hit: bool, n_bytes: int = 0) -> None:
+        with self._stats_lock:
+            if hit:
+                self.stats.n_hits += 1
+                self.stats.n_bytes_saved += n_bytes
+            else:
+                self.stats.n_misses += 1
+            n_lookups = self.stats.n_hits + self.stats.n_misses
+            if n_lookups % LOG_STATS_EVERY_N_LOOKUPS == 0:
+                logger.info(
+                    "DiskCache %s: %d lookups, %.1f%% hits, %0.1fMB saved, %d evictions",
+                    self.name,
+                    n_lookups,
+                    self.stats.hit_rate * 100,
+                    self.stats.n_bytes_saved / 1024 / 1024,
+                    self.stats.n_evictions,
+                )
+
+    @contextlib.contextmanager
+    def open(self, key: str) -> ContextManager[Optional[Path]]:
+        """Yield a read-only Path to the file cached at `key`, or `None`.
+
+        The yielded file stays valid until the context exits, even if another
+        process evicts `key` in the meantime. Do not modify it.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        path = self.root / _key_to_filename(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile_context(prefix="reading-", dir=self.root) as reader_path:
+            # Hard-link, so eviction (which unlinks `path`) won't delete our data
+            reader_path.unlink()
+            try:
+                os.link(path, reader_path)
+            except FileNotFoundError:
+                self._count(hit=False)
+                yield None
+                return
+
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)  # mark as recently used
+            self._count(hit=True, n_bytes=reader_path.stat().st_size)
+            yield reader_path
+
+    def put(self, key: str, path: Path) -> None:
+        """Copy the file at `path` into the cache, then evict old entries.
+
+        Do nothing if the file is larger than `max_bytes`.
+        """
+        if not self.enabled:
+            return
+
+        size = path.stat().st_size
+        if size > self.max_bytes:
+            return
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile_context(prefix="writing-", dir=self.root) as writing_path:
+            shutil.copyfile(path, writing_path)
+            # Atomic: readers see the whole file or no file
+            os.replace(writing_path, self.root / _key_to_filename(key))
+
+        self._evict_until_size(self.max_bytes)
+
+    def _evict_until_size(self, max_bytes: int) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name.startswith(("reading-", "writing-")):
+                    continue  # in-progress: not counted, not evicted
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # another process evicted it
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= max_bytes:
+            return
+
+        entries.sort()  # oldest (least recently used) first
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+                with self._stats_lock:
+                    self.stats.n_evictions += 1
+            total -= size
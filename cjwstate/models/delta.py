@@ -24,7 +24,10 @@ class Delta(models.Model):
             models.Index(
                 fields=("workflow_id", "last_applied_at"),
                 name="index_delta_for_stale_scan",
-            )
+            ),
+            # deltadeleter.py finds each workflow's first delta. (This also
+            # serves as the index for the workflow foreign key.)
+            models.Index(fields=("workflow_id", "id"), name="delta_workflow_id_id"),
         ]
         constraints = [
             # Django's CharField.choices doesn't add a DB constraint. So let's
@@ -37,7 +40,7 @@ class Delta(models.Model):
 
     # These fields must be set by any child classes, when instantiating
     workflow = models.ForeignKey(
-        "Workflow", related_name="deltas", on_delete=models.CASCADE
+        "Workflow", related_name="deltas", on_delete=models.CASCADE, db_index=False
     )
 
     # Next and previous Deltas on this workflow, a linked list.
@@ -0,0 +1,95 @@
+from collections import defaultdict
+from typing import Dict, NamedTuple, Optional
+
+from cjwstate import clientside
+from cjwstate.modules.types import ModuleZipfile
+
+from .step import Step
+from .stored_object import StoredObject
+from .uploaded_file import UploadedFile
+from .workflow import Workflow
+
+
+class WorkflowSnapshot(NamedTuple):
+    """Everything the client needs to know about a Workflow (but not its user)."""
+
+    workflow: clientside.WorkflowUpdate
+    tabs: Dict[str, clientside.TabUpdate]
+    steps: Dict[int, clientside.StepUpdate]
+    blocks: Optional[Dict[str, clientside.Block]]
+    """`None` unless the caller passed `include_blocks=True`."""
+
+
+def load_clientside_snapshot(
+    workflow: Workflow,
+    modules: Dict[str, ModuleZipfile],
+    *,
+    include_blocks: bool = False,
+) -> WorkflowSnapshot:
+    """Query `workflow`'s tabs, steps and (optionally) blocks, for the client.
+
+    Call this within a `workflow.cooperative_lock()`.
+
+    The number of queries does not depend on the number of tabs, steps or
+    blocks: we query each table once, instead of once per Step. (The
+    exception: a Step whose cached migrated params are stale will write its
+    newly-migrated params.)
+
+    `modules` maps module ID to the ModuleZipfile each Step should use, as
+    returned by `MODULE_REGISTRY.all_latest()`.
+
+    Blocks cost a query. Pass `include_blocks=True` only if you need them.
+    """
+    tabs = list(workflow.live_tabs)
+    tabs_by_id = {tab.id: tab for tab in tabs}
+    steps = list(Step.live_in_workflow(workflow))
+
+    step_ids_by_tab_id = defaultdict(list)
+    for step in steps:
+        step.tab = tabs_by_id[step.tab_id]  # so step.tab_slug won't query
+        step_ids_by_tab_id[step.tab_id].append(step.id)
+    step_ids = [step.id for step in steps]
+
+    files_by_step_id = defaultdict(list)
+    for step_id, name, uuid, size, created_at in (
+        UploadedFile.objects.filter(step_id__in=step_ids)
+        .order_by("step_id", "-created_at")
+        .values_list("step_id", "name", "uuid", "size", "created_at")
+    ):
+        files_by_step_id[step_id].append(
+            clientside.UploadedFile(
+                name=name, uuid=uuid, size=size, created_at=created_at
+            )
+        )
+
+    versions_by_step_id = defaultdict(list)
+    for step_id, stored_at in (
+        StoredObject.objects.filter(step_id__in=step_ids)
+        .order_by("step_id", "-stored_at")
+        .values_list("step_id", "stored_at")
+    ):
+        versions_by_step_id[step_id].append(stored_at)
+
+    return WorkflowSnapshot(
+        workflow=workflow.to_clientside(),
+        tabs={
+            tab.slug: tab.to_clientside(prefetched_step_ids=step_ids_by_tab_id[tab.id])
+            for tab in tabs
+        },
+        steps={
+            step.id: step.to_clientside(
+                force_module_zipfile=modules.get(step.module_id_name),
+                prefetched_files=files_by_step_id[step.id],
+                prefetched_versions=versions_by_step_id[step.id],
+            )
+            for step in steps
+        },
+        blocks=(
+            {
+                block.slug: block.to_clientside()
+                for block in workflow.blocks.select_related("step", "tab")
+            }
+            if include_blocks
+            else None
+        ),
+    )
@@ -1,3 +1,4 @@
+import datetime
 import json
 import logging
 import secrets
@@ -481,11 +482,15 @@ class Step(models.Model):
         super().delete(*args, **kwargs)
 
     def _get_clientside_files(
-        self, module_zipfile: Optional[ModuleZipfile]
+        self,
+        module_zipfile: Optional[ModuleZipfile],
+        prefetched: Optional[List[clientside.UploadedFile]],
     ) -> List[clientside.UploadedFile]:
         if module_zipfile and any(
             p.type == "file" for p in module_zipfile.get_spec().param_fields
         ):
+            if prefetched is not None:
+                return prefetched
             return [
                 clientside.UploadedFile(
                     name=name, uuid=uuid, size=size, created_at=created_at
@@ -499,17 +504,22 @@ class Step(models.Model):
             return []
 
     def _get_clientside_fetched_version_list(
-        self, module_zipfile: Optional[ModuleZipfile]
+        self,
+        module_zipfile: Optional[ModuleZipfile],
+        prefetched: Optional[List[datetime.datetime]],
     ) -> clientside.FetchedVersionList:
         if module_zipfile and any(
             p.type == "custom" and p.id_name == "version_select"
             for p in module_zipfile.get_spec().param_fields
         ):
-            versions = list(
-                self.stored_objects.order_by("-stored_at").values_list(
-                    "stored_at", flat=True
+            if prefetched is not None:
+                versions = prefetched
+            else:
+                versions = list(
+                    self.stored_objects.order_by("-stored_at").values_list(
+                        "stored_at", flat=True
+                    )
                 )
-            )
             return clientside.FetchedVersionList(
                 versions=versions, selected=self.stored_data_version
             )
@@ -518,8 +528,17 @@ class Step(models.Model):
             return clientside.FetchedVersionList([], None)
 
     def to_clientside(
-        self, *, force_module_zipfile: Optional[ModuleZipfile] = None
+        self,
+        *,
+        force_module_zipfile: Optional[ModuleZipfile] = None,
+        prefetched_files: Optional[List[clientside.UploadedFile]] = None,
+        prefetched_versions: Optional[List[datetime.datetime]] = None,
     ) -> clientside.StepUpdate:
+        """Build a StepUpdate with all this Step's data.
+
+        `prefetched_files` and `prefetched_versions` (newest first) let the
+        caller skip per-Step queries. See `cjwstate.models.snapshot`.
+        """
         # module_zipfile, for params
         if force_module_zipfile:
             module_zipfile = force_module_zipfile
@@ -561,7 +580,7 @@ class Step(models.Model):
             tab_slug=self.tab_slug,
             is_busy=self.is_busy,
             render_result=crr,
-            files=self._get_clientside_files(module_zipfile),
+            files=self._get_clientside_files(module_zipfile, prefetched_files),
             params=params,
             secrets=self.secret_metadata,
             is_collapsed=self.is_collapsed,
@@ -571,5 +590,7 @@ class Step(models.Model):
             last_fetched_at=self.last_update_check,
             is_notify_on_change=self.notifications,
             last_relevant_delta_id=self.last_relevant_delta_id,
-            versions=self._get_clientside_fetched_version_list(module_zipfile),
+            versions=self._get_clientside_fetched_version_list(
+                module_zipfile, prefetched_versions
+            ),
         )
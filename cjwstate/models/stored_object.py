@@ -1,7 +1,7 @@
 import datetime
 
-from django.db import models
-from django.db.models.signals import pre_delete
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete
 from django.dispatch import receiver
 
 from cjwstate import s3
@@ -9,11 +9,36 @@ from cjwstate import s3
 from .step import Step
 
 
+CONTENT_ADDRESSED_KEY_PREFIX = "sha256/"
+"""Prefix of S3 keys that are named after their files' SHA-256 hashes."""
+
+KeyLockKey = 3
+"""Postgres advisory lock key1 for `lock_key()`. (PgRenderLocker uses 1 and 2.)"""
+
+
+def lock_key(key: str) -> None:
+    """Block until no other transaction is adding or removing a reference to `key`.
+
+    Call this within a transaction: Postgres releases the lock on commit or
+    rollback.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, hashtext(%s))", [KeyLockKey, key]
+        )
+
+
 class StoredObject(models.Model):
     """EVIL way of storing fetch results.
 
     StoredObject links to an S3 key in s3.StoredObjectsBucket. The key must
-    adhere to the format: "{workflow_id}/{step_id}/{uuidv1()}"
+    adhere to one of these formats:
+
+    * "sha256/{sha256_hex}.dat" -- "content-addressed": every StoredObject
+      with the same file contents shares the same key. The file is deleted
+      when its last StoredObject is deleted.
+    * "{workflow_id}/{step_id}/{uuidv1()}" -- legacy: one file per
+      StoredObject.
 
     TODO store fetch results as fetches.
     """
@@ -31,12 +56,31 @@ class StoredObject(models.Model):
     key = models.CharField(max_length=255, null=False, blank=True, default="")
     stored_at = models.DateTimeField(default=datetime.datetime.now)
 
-    # used only for stored tables
-    hash = models.CharField(max_length=32)
+    # SHA-256 hex digest of file contents; "unhashed" for legacy objects
+    hash = models.CharField(max_length=64)
     size = models.IntegerField(default=0)  # file size
 
+    @property
+    def is_content_addressed(self) -> bool:
+        """True if `hash` is the file's SHA-256 and other objects may share `key`."""
+        return self.key.startswith(CONTENT_ADDRESSED_KEY_PREFIX)
+
     # make a deep copy for another Step
     def duplicate(self, to_step):
+        if self.is_content_addressed:
+            # Share the file: the copy is just one more reference to it
+            with transaction.atomic():
+                lock_key(self.key)
+                if not StoredObject.objects.filter(key=self.key).exists():
+                    # We raced with deletion, and the file is gone
+                    raise StoredObject.DoesNotExist("file was deleted")
+                return to_step.stored_objects.create(
+                    stored_at=self.stored_at,
+                    hash=self.hash,
+                    key=self.key,
+                    size=self.size,
+                )
+
         basename = self.key.split("/")[-1]
         key = f"{to_step.workflow_id}/{to_step.id}/{basename}"
         s3.copy(s3.StoredObjectsBucket, key, f"{s3.StoredObjectsBucket}/{self.key}")
@@ -46,14 +90,23 @@ class StoredObject(models.Model):
         )
 
 
-@receiver(pre_delete, sender=StoredObject)
-def _delete_from_s3_pre_delete(sender, instance, **kwargs):
-    """Delete file from S3, pre-delete.
+@receiver(post_delete, sender=StoredObject)
+def _delete_from_s3_post_delete(sender, instance, **kwargs):
+    """Delete file from S3 if no other StoredObject references it.
+
+    Why post-delete? Because a single QuerySet.delete() can delete several
+    StoredObjects that share a file. Django sends every pre_delete signal
+    before deleting any row, so at pre-delete time each object would see the
+    others and nobody would delete the file. At post-delete time, the rows are
+    gone and we can count what remains.
 
-    Why pre-delete and not post-delete? Because our user expects the file to be
-    _gone_, completely, forever -- that's what "delete" means to the user. If
-    deletion fails, we need the link to remain in our database -- that's how
-    the user will know it isn't deleted.
+    Django sends post_delete within the deletion's transaction. So if S3
+    deletion fails, the database rollback keeps the link -- our user expects
+    the file to be _gone_, completely, forever, and that's how the user will
+    know it isn't.
     """
     if instance.key:
-        s3.remove(s3.StoredObjectsBucket, instance.key)
+        with transaction.atomic():
+            lock_key(instance.key)
+            if not StoredObject.objects.filter(key=instance.key).exists():
+                s3.remove(s3.StoredObjectsBucket, instance.key)
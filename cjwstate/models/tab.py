@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from django.db import models
 from .workflow import Workflow
 from cjwstate import clientside
@@ -52,10 +54,16 @@ class Tab(models.Model):
         for step in steps:
             step.duplicate_into_new_workflow(new_tab)
 
-    def to_clientside(self) -> clientside.TabUpdate:
+    def to_clientside(
+        self, *, prefetched_step_ids: Optional[List[int]] = None
+    ) -> clientside.TabUpdate:
+        if prefetched_step_ids is None:
+            step_ids = list(self.live_steps.values_list("id", flat=True))
+        else:
+            step_ids = prefetched_step_ids
         return clientside.TabUpdate(
             slug=self.slug,
             name=self.name,
             selected_step_index=self.selected_step_position,
-            step_ids=list(self.live_steps.values_list("id", flat=True)),
+            step_ids=step_ids,
         )
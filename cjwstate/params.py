@@ -1,6 +1,7 @@
 import logging
 import time
-from typing import Any, Dict
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 
 import cjwstate.modules
 from cjwkernel.errors import ModuleError
@@ -12,8 +13,64 @@ from cjwstate.modules.types import ModuleZipfile
 logger = logging.getLogger(__name__)
 
 
+class PremigratedParams(NamedTuple):
+    """migrate_params() output, computed before locking the workflow.
+
+    `get_migrated_params()` uses it only if `step.params` and the module
+    version still match -- that is, if nobody edited the Step meanwhile.
+    """
+
+    raw_params: Dict[str, Any]
+    module_version: str
+    result: Union[Dict[str, Any], ModuleError]
+
+
+def _is_stale(step: Step, module_zipfile: ModuleZipfile) -> bool:
+    return (
+        module_zipfile.version == "develop"
+        # works if cached version (and thus cached _result_) is None
+        or module_zipfile.version != step.cached_migrated_params_module_version
+    )
+
+
+def premigrate_params(
+    steps: List[Step], module_zipfiles: Dict[str, ModuleZipfile]
+) -> Dict[int, PremigratedParams]:
+    """Call migrate_params() for each of `steps` whose cached params are stale.
+
+    Call this _outside_ of `Workflow.cooperative_lock()`: it may take a while.
+    Then pass the result to `get_migrated_params()` within the lock, which
+    re-validates each entry against the (possibly-changed) Step.
+
+    Each module's steps are migrated in a single kernel call, so migrating a
+    40-step workflow with 5 stale modules costs 5 forks, not 40.
+
+    Return a dict keyed by Step ID.
+    """
+    steps_by_module_id = defaultdict(list)
+    for step in steps:
+        module_zipfile = module_zipfiles.get(step.module_id_name)
+        if module_zipfile is not None and _is_stale(step, module_zipfile):
+            steps_by_module_id[step.module_id_name].append(step)
+
+    ret = {}
+    for module_id, module_steps in steps_by_module_id.items():
+        module_zipfile = module_zipfiles[module_id]
+        results = invoke_migrate_params_batch(
+            module_zipfile, [step.params for step in module_steps]
+        )
+        for step, result in zip(module_steps, results):
+            ret[step.id] = PremigratedParams(
+                step.params, module_zipfile.version, result
+            )
+    return ret
+
+
 def get_migrated_params(
-    step: Step, *, module_zipfile: ModuleZipfile = None
+    step: Step,
+    *,
+    module_zipfile: ModuleZipfile = None,
+    premigrated: Optional[Dict[int, PremigratedParams]] = None,
 ) -> Dict[str, Any]:
     """Read `step.params`, calling migrate_params() or using cache fields.
 
@@ -34,25 +91,29 @@ def get_migrated_params(
     The result may be invalid. Call `validate()` to raise a `ValueError` to
     detect that case.
 
-    TODO avoid holding the database lock whilst executing stuff on the kernel.
-    (This will involve auditing and modifying all callers to handle new error
-    cases.)
+    If `premigrated` (from `premigrate_params()`) holds a result for this
+    exact `step.params` and module version, use it instead of invoking the
+    kernel while the caller holds the database lock.
     """
     if module_zipfile is None:
         # raise KeyError
         module_zipfile = MODULE_REGISTRY.latest(step.module_id_name)
 
-    stale = (
-        module_zipfile.version == "develop"
-        # works if cached version (and thus cached _result_) is None
-        or module_zipfile.version != step.cached_migrated_params_module_version
-    )
-
-    if not stale:
+    if not _is_stale(step, module_zipfile):
         return step.cached_migrated_params
     else:
-        # raise ModuleError
-        params = invoke_migrate_params(module_zipfile, step.params)
+        premigrated_params = (premigrated or {}).get(step.id)
+        if (
+            premigrated_params is not None
+            and premigrated_params.module_version == module_zipfile.version
+            and premigrated_params.raw_params == step.params
+        ):
+            if isinstance(premigrated_params.result, ModuleError):
+                raise premigrated_params.result
+            params = premigrated_params.result
+        else:
+            # raise ModuleError
+            params = invoke_migrate_params(module_zipfile, step.params)
         step.cached_migrated_params = params
         step.cached_migrated_params_module_version = module_zipfile.version
         try:
@@ -103,3 +164,55 @@ def invoke_migrate_params(
             status,
             int((time2 - time1) * 1000),
         )
+
+
+def invoke_migrate_params_batch(
+    module_zipfile: ModuleZipfile, raw_params_list: List[Dict[str, Any]]
+) -> List[Union[Dict[str, Any], ModuleError]]:
+    """Call module `migrate_params()` on each of `raw_params_list`.
+
+    Try a single kernel call first. If it fails, we can't tell which params
+    caused the error; so call `invoke_migrate_params()` on each params in
+    turn, and return each one's result or ModuleError.
+
+    As with `invoke_migrate_params()`, results may not be valid.
+    """
+    if len(raw_params_list) == 1:
+        try:
+            return [invoke_migrate_params(module_zipfile, raw_params_list[0])]
+        except ModuleError as err:
+            return [err]
+
+    time1 = time.time()
+    logger.info(
+        "%s:migrate_params() x%d begin",
+        module_zipfile.path.name,
+        len(raw_params_list),
+    )
+    status = "???"
+    try:
+        results = cjwstate.modules.kernel.migrate_params_batch(
+            module_zipfile.compile_code_without_executing(), raw_params_list
+        )  # raise ModuleError
+        status = "ok"
+        return results
+    except ModuleError as err:
+        status = type(err).__name__
+    finally:
+        time2 = time.time()
+        logger.info(
+            "%s:migrate_params() x%d => %s in %dms",
+            module_zipfile.path.name,
+            len(raw_params_list),
+            status,
+            int((time2 - time1) * 1000),
+        )
+
+    # At least one failed. Find out which.
+    results = []
+    for raw_params in raw_params_list:
+        try:
+            results.append(invoke_migrate_params(module_zipfile, raw_params))
+        except ModuleError as err:
+            results.append(err)
+    return results
@@ -15,7 +15,6 @@ to all HTTP connections listening on a workflow, they _send_ using
 its Django Channels channel layer.
 """
 import logging
-import pickle
 from typing import Any, Dict
 
 import carehare
@@ -23,6 +22,7 @@ import msgpack
 
 from .. import clientside
 from .connection import get_global_connection
+from .updatecodec import encode_update
 
 logger = logging.getLogger(__name__)
 
@@ -149,7 +149,7 @@ async def send_user_update_to_user_clients(
 
     `maintain_global_connection()` must be running.
 
-    Django Channels will call Websockets consumers' `send_pickled_update()`
+    Django Channels will call Websockets consumers' `send_encoded_update()`
     method.
 
     If one of those queues is full, we may warn about a DeliveryError
@@ -161,10 +161,10 @@ async def send_user_update_to_user_clients(
     Raise if our RabbitMQ connection is in turmoil. (Some other caller should
     shut down our process in that case.)
     """
-    pickled_update = pickle.dumps(clientside.Update(user=user_update))
+    encoded_update = encode_update(clientside.Update(user=user_update))
     group = _user_group_name(user_id)
     await _queue_for_group(
-        group, type="send_pickled_update", pickled_update=pickled_update
+        group, type="send_encoded_update", encoded_update=encoded_update
     )
 
 
@@ -175,7 +175,7 @@ async def send_update_to_workflow_clients(
 
     `maintain_global_connection()` must be running.
 
-    Django Channels will call Websockets consumers' `send_pickled_update()`
+    Django Channels will call Websockets consumers' `send_encoded_update()`
     method.
 
     If one of those queues is full, we may warn about a DeliveryError
@@ -187,10 +187,10 @@ async def send_update_to_workflow_clients(
     Raise if our RabbitMQ connection is in turmoil. (Some other caller should
     shut down our process in that case.)
     """
-    pickled_update = pickle.dumps(update)
+    encoded_update = encode_update(update)
     group = _workflow_group_name(workflow_id)
     await _queue_for_group(
-        group, type="send_pickled_update", pickled_update=pickled_update
+        group, type="send_encoded_update", encoded_update=encoded_update
     )
 
 
@@ -3,7 +3,7 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import logging
-from typing import AsyncContextManager, Awaitable, Callable, Optional
+from typing import AsyncContextManager, Awaitable, Callable, Optional, Set
 
 import carehare
 from django.conf import settings
@@ -207,3 +207,63 @@ async def stop_global_connection():
 
     assert _global_awaitable_connection == None
     assert _global_stopping == None
+
+
+async def consume_concurrently(
+    connection: carehare.Connection,
+    queue_name: str,
+    handle: Callable[[bytes], Awaitable[None]],
+    *,
+    concurrency: int,
+) -> None:
+    """Call `await handle(message)` for each message on `queue_name`.
+
+    Handle up to `concurrency` messages at once. (RabbitMQ won't deliver more
+    than that: we set `prefetch_count=concurrency` on the consumer.) Ack each
+    message after its `handle()` returns.
+
+    If a `handle()` raises, do not ack its message: raise the error. This is
+    catastrophic: the caller should exit, and RabbitMQ will redeliver all
+    unacked messages to other consumers.
+
+    Return when the consumer is closed, after in-flight handlers finish.
+    """
+    async with connection.acking_consumer(
+        queue_name, prefetch_count=concurrency
+    ) as consumer:
+
+        async def handle_and_ack(message: bytes, delivery_tag: int) -> None:
+            await handle(message)
+            consumer.ack(delivery_tag)
+
+        handling: Set[asyncio.Task] = set()
+        receiving: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if receiving is None and len(handling) < concurrency:
+                    receiving = asyncio.create_task(consumer.next_delivery())
+
+                waiting = handling if receiving is None else {receiving, *handling}
+                done, _ = await asyncio.wait(
+                    waiting, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task is receiving:
+                        receiving = None
+                        try:
+                            message, delivery_tag = task.result()
+                        except carehare.ChannelClosed:
+                            if handling:
+                                await asyncio.wait(handling)
+                            for handler in handling:
+                                handler.result()  # or raise
+                            return
+                        handling.add(
+                            asyncio.create_task(handle_and_ack(message, delivery_tag))
+                        )
+                    else:
+                        handling.remove(task)
+                        task.result()  # or raise
+        finally:
+            if receiving is not None:
+                receiving.cancel()
@@ -0,0 +1,251 @@
+"""Compact, versioned encoding of `clientside.Update` for RabbitMQ messages.
+
+Renderer, fetcher and web processes send each other Updates. We used to
+pickle them. Pickle is large (it names every class and field in every
+message), slow to decode and unsafe (anybody who can write to RabbitMQ can
+run code in our web server). And during a deploy, old and new processes may
+disagree about what a pickled class looks like.
+
+Instead, we use msgpack. Each class we allow is in `_SCHEMAS`, with a
+numeric code and an explicit list of fields. We encode an object as a
+msgpack "ext" value: the code, then its field values in order (not their
+names).
+
+Compatibility rules:
+
+* To add a field, append it to its class's field list. (Decoders ignore
+  trailing values they don't know about, and use defaults for trailing
+  values that are missing.)
+* Any other change -- removing, reordering or renaming fields, or reusing a
+  code -- must bump FORMAT_VERSION. Decoders reject messages with a
+  different version.
+"""
+import datetime
+from typing import Any, Dict, NamedTuple, Tuple, Type
+
+import msgpack
+
+from cjwkernel.types import (
+    Column,
+    ColumnType,
+    I18nMessage,
+    QuickFix,
+    QuickFixAction,
+    RenderError,
+    TableMetadata,
+)
+from cjworkbench.models.userlimits import UserLimits
+from cjworkbench.models.userusage import UserUsage
+from cjwstate import clientside
+from cjwstate.models.cached_render_result import CachedRenderResult
+
+__all__ = ("FORMAT_VERSION", "decode_update", "encode_update")
+
+
+FORMAT_VERSION = 1
+
+
+class _Schema(NamedTuple):
+    cls: Type
+    fields: Tuple[str, ...]
+
+
+_SCHEMAS: Dict[int, _Schema] = {
+    1: _Schema(clientside._Null, ()),
+    # 2, 3: datetime.datetime and frozenset -- see _default() and _ext_hook()
+    10: _Schema(
+        clientside.Update,
+        (
+            "mutation_id",
+            "user",
+            "workflow",
+            # not "modules": modules only go to clients in HTTP responses
+            "steps",
+            "tabs",
+            "blocks",
+            "clear_tab_slugs",
+            "clear_step_ids",
+            "clear_block_slugs",
+        ),
+    ),
+    11: _Schema(
+        clientside.UserUpdate,
+        (
+            "display_name",
+            "email",
+            "is_staff",
+            "stripe_customer_id",
+            "subscribed_stripe_product_ids",
+            "limits",
+            "usage",
+        ),
+    ),
+    12: _Schema(
+        clientside.WorkflowUpdate,
+        (
+            "id",
+            "secret_id",
+            "owner_email",
+            "owner_display_name",
+            "selected_tab_position",
+            "name",
+            "tab_slugs",
+            "has_custom_report",
+            "block_slugs",
+            "public",
+            "updated_at",
+            "fetches_per_day",
+            "acl",
+        ),
+    ),
+    13: _Schema(
+        clientside.StepUpdate,
+        (
+            "id",
+            "slug",
+            "module_slug",
+            "tab_slug",
+            "is_busy",
+            "last_relevant_delta_id",
+            "render_result",
+            "files",
+            "params",
+            "secrets",
+            "is_collapsed",
+            "notes",
+            "is_auto_fetch",
+            "fetch_interval",
+            "last_fetched_at",
+            "is_notify_on_change",
+            "versions",
+        ),
+    ),
+    14: _Schema(
+        clientside.TabUpdate, ("slug", "name", "step_ids", "selected_step_index")
+    ),
+    15: _Schema(clientside.TextBlock, ("markdown",)),
+    16: _Schema(clientside.ChartBlock, ("step_slug",)),
+    17: _Schema(clientside.TableBlock, ("tab_slug",)),
+    18: _Schema(clientside.AclEntry, ("email", "role")),
+    19: _Schema(clientside.UploadedFile, ("name", "uuid", "size", "created_at")),
+    20: _Schema(clientside.FetchedVersionList, ("versions", "selected")),
+    21: _Schema(
+        UserLimits,
+        ("max_fetches_per_day", "max_delta_age_in_days", "can_create_secret_link"),
+    ),
+    22: _Schema(UserUsage, ("fetches_per_day",)),
+    30: _Schema(
+        CachedRenderResult,
+        (
+            "workflow_id",
+            "step_id",
+            "delta_id",
+            "status",
+            "errors",
+            "json",
+            "table_metadata",
+        ),
+    ),
+    31: _Schema(TableMetadata, ("n_rows", "columns")),
+    32: _Schema(Column, ("name", "type")),
+    33: _Schema(ColumnType.Text, ()),
+    34: _Schema(ColumnType.Number, ("format",)),
+    35: _Schema(ColumnType.Timestamp, ()),
+    36: _Schema(ColumnType.Date, ("unit",)),
+    37: _Schema(RenderError, ("message", "quick_fixes")),
+    38: _Schema(I18nMessage, ("id", "arguments", "source")),
+    39: _Schema(QuickFix, ("button_text", "action")),
+    40: _Schema(QuickFixAction.PrependStep, ("module_slug", "partial_params")),
+}
+
+_CODES: Dict[Type, int] = {schema.cls: code for code, schema in _SCHEMAS.items()}
+
+_DATETIME_CODE = 2
+_FROZENSET_CODE = 3
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _pack(value: Any) -> bytes:
+    # strict_types: send NamedTuples (tuple subclasses) to _default()
+    return msgpack.packb(value, default=_default, strict_types=True, use_bin_type=True)
+
+
+def _unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, ext_hook=_ext_hook, strict_map_key=False, raw=False)
+
+
+def _default(value: Any) -> Any:
+    cls = type(value)
+    try:
+        code = _CODES[cls]
+    except KeyError:
+        pass
+    else:
+        fields = _SCHEMAS[code].fields
+        if cls is clientside.Update and value.modules:
+            raise TypeError("Cannot encode clientside.Update.modules")
+        return msgpack.ExtType(code, _pack([getattr(value, f) for f in fields]))
+
+    if cls is datetime.datetime:
+        if value.tzinfo is not None:
+            raise TypeError("Cannot encode timezone-aware datetime %r" % value)
+        # Microseconds since the epoch. (Our datetimes are naive UTC.)
+        return msgpack.ExtType(
+            _DATETIME_CODE,
+            _pack((value - _EPOCH) // datetime.timedelta(microseconds=1)),
+        )
+    elif cls is frozenset:
+        return msgpack.ExtType(_FROZENSET_CODE, _pack(list(value)))
+    elif isinstance(value, tuple):
+        return list(value)
+    elif isinstance(value, dict):
+        return dict(value)
+    elif isinstance(value, str):
+        # e.g., Django's SafeString. Not str(value): SafeString.__str__()
+        # returns `value` itself, which msgpack would hand back to us.
+        return str.__str__(value)
+    elif isinstance(value, int):
+        return int(value)  # e.g., an IntEnum
+    else:
+        raise TypeError("Cannot encode %r" % cls)
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == _DATETIME_CODE:
+        return _EPOCH + datetime.timedelta(microseconds=_unpack(data))
+    elif code == _FROZENSET_CODE:
+        return frozenset(_unpack(data))
+
+    try:
+        schema = _SCHEMAS[code]
+    except KeyError:
+        raise ValueError("Unknown ext code %d" % code)
+    if not schema.fields:
+        return schema.cls()
+    values = _unpack(data)
+    return schema.cls(**dict(zip(schema.fields, values)))
+
+
+def encode_update(update: clientside.Update) -> bytes:
+    """Encode `update` for `decode_update()`.
+
+    Raise TypeError if `update` contains a value we cannot encode.
+    """
+    return _pack([FORMAT_VERSION, update])
+
+
+def decode_update(data: bytes) -> clientside.Update:
+    """Decode the output of `encode_update()`.
+
+    Raise ValueError if `data` is invalid or has another FORMAT_VERSION.
+    """
+    try:
+        version, update = _unpack(data)
+    except (TypeError, ValueError) as err:  # msgpack errors are ValueErrors
+        raise ValueError("Invalid encoded update") from err
+    if version != FORMAT_VERSION:
+        raise ValueError("Unknown update format version %r" % version)
+    if not isinstance(update, clientside.Update):
+        raise ValueError("Encoded value is not an Update")
+    return update
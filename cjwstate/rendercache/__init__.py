@@ -4,16 +4,24 @@ from .io import (
     downloaded_parquet_file,
     load_cached_render_result,
     open_cached_render_result,
+    read_cached_render_result_slice,
     read_cached_render_result_slice_as_text,
+    read_cached_render_result_summaries,
+    reuse_cached_render_result,
     CorruptCacheError,
 )
+from .summaries import ColumnSummary
 
 __all__ = (
     "CachedRenderResult",
+    "ColumnSummary",
     "CorruptCacheError",
     "cache_render_result",
     "downloaded_parquet_file",
     "load_cached_render_result",
     "open_cached_render_result",
+    "read_cached_render_result_slice",
     "read_cached_render_result_slice_as_text",
+    "read_cached_render_result_summaries",
+    "reuse_cached_render_result",
 )
@@ -1,20 +1,72 @@
 import contextlib
+import logging
+import shutil
 from pathlib import Path
-from typing import ContextManager
+from typing import ContextManager, List, Optional
 
 import cjwparquet
 import pyarrow as pa
+import pyarrow.parquet
+from django.conf import settings
 
 from cjwkernel.files import read_parquet_as_arrow
 from cjwkernel.types import LoadedRenderResult
 from cjwkernel.util import json_encode, tempfile_context
 from cjwstate import s3
+from cjwstate.diskcache import DiskCache
 from cjwstate.models import Step, Workflow, CachedRenderResult
+from .summaries import (
+    ColumnSummary,
+    summaries_from_json_bytes,
+    summaries_to_json_bytes,
+    summarize_table,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 BUCKET = s3.CachedRenderResultsBucket
 
 
+_local_cache: Optional[DiskCache] = None
+
+
+def _get_local_cache() -> DiskCache:
+    """Local copies of S3 files, keyed by `_local_cache_key()`."""
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = DiskCache(
+            "rendercache",
+            Path(settings.RENDERCACHE_LOCAL_DIR),
+            settings.RENDERCACHE_LOCAL_MAX_BYTES,
+        )
+    return _local_cache
+
+
+def _local_cache_key(key: str) -> Optional[str]:
+    """Return the local-cache key for the current contents of S3 `key`.
+
+    S3 keys are _not_ immutable: re-rendering a delta overwrites its files.
+    So we append the S3 ETag. Stale local copies are never read again, and
+    the local cache evicts them as it would any other unused file.
+
+    Return `None` (without a HEAD request) if the local cache is disabled.
+
+    Raise FileNotFoundError if the file is not on S3.
+    """
+    if not _get_local_cache().enabled:
+        return None
+    return "%s@%s" % (key, s3.stat(BUCKET, key).etag)
+
+
+PARQUET_ROW_GROUP_SIZE = 16384
+"""Number of rows per Parquet row group.
+
+Readers of a few rows (such as table tiles) read only the row groups they need.
+"""
+
+
 STEP_FIELDS = [
     "cached_render_result_delta_id",
     "cached_render_result_errors",
@@ -49,6 +101,69 @@ def crr_parquet_key(crr: CachedRenderResult) -> str:
     return parquet_key(crr.workflow_id, crr.step_id, crr.delta_id)
 
 
+def summaries_key(workflow_id: int, step_id: int, delta_id: int) -> str:
+    """
+    Path to a JSON file, where the specified result's column summaries are saved.
+    """
+    return "%sdelta-%d.summaries.json" % (
+        parquet_prefix(workflow_id, step_id),
+        delta_id,
+    )
+
+
+def crr_summaries_key(crr: CachedRenderResult) -> str:
+    return summaries_key(crr.workflow_id, crr.step_id, crr.delta_id)
+
+
+def arrow_key(workflow_id: int, step_id: int, delta_id: int, arrow_format: str) -> str:
+    """
+    Path to an Arrow file, where the specified result may also be saved.
+
+    `arrow_format` is "uncompressed" or "lz4". (See
+    `settings.RENDERCACHE_ARROW_FORMAT`.)
+    """
+    if arrow_format == "uncompressed":
+        suffix = "arrow"
+    elif arrow_format == "lz4":
+        suffix = "lz4.arrow"
+    else:
+        raise ValueError("Unknown Arrow format %r" % arrow_format)
+    return "%sdelta-%d.%s" % (parquet_prefix(workflow_id, step_id), delta_id, suffix)
+
+
+def crr_arrow_key(crr: CachedRenderResult, arrow_format: str) -> str:
+    return arrow_key(crr.workflow_id, crr.step_id, crr.delta_id, arrow_format)
+
+
+def _write_arrow_file(path: Path, table: pa.Table, arrow_format: str) -> None:
+    if arrow_format == "lz4":
+        options = pa.ipc.IpcWriteOptions(compression="lz4")
+    else:
+        options = None
+    with pa.ipc.RecordBatchFileWriter(path, table.schema, options=options) as writer:
+        writer.write_table(table)
+
+
+def _write_parquet(path: Path, table: pa.Table) -> None:
+    """Write `table` like `cjwparquet.write()` does, in many row groups."""
+    if table.num_rows == 0:
+        # cjwparquet.write() works around Arrow bugs with empty tables
+        cjwparquet.write(path, table)
+    else:
+        pyarrow.parquet.write_table(
+            table,
+            str(path),
+            version="2.0",
+            compression="SNAPPY",
+            use_dictionary=[
+                name.encode("utf-8")
+                for name, column in zip(table.column_names, table.columns)
+                if pa.types.is_dictionary(column.type)
+            ],
+            row_group_size=PARQUET_ROW_GROUP_SIZE,
+        )
+
+
 def cache_render_result(
     workflow: Workflow, step: Step, delta_id: int, result: LoadedRenderResult
 ) -> None:
@@ -86,11 +201,137 @@ def cache_render_result(
     delete_parquet_files_for_step(workflow.id, step.id)  # makes old cache inconsistent
     step.save(update_fields=STEP_FIELDS)  # makes new cache inconsistent
     if result.table.num_columns:  # only write non-zero-column tables
+        key = parquet_key(workflow.id, step.id, delta_id)
         with tempfile_context() as parquet_path:
-            cjwparquet.write(parquet_path, result.table)
-            s3.fput_file(
-                BUCKET, parquet_key(workflow.id, step.id, delta_id), parquet_path
-            )  # makes new cache consistent
+            _write_parquet(parquet_path, result.table)
+            s3.fput_file(BUCKET, key, parquet_path)  # makes new cache consistent
+            # We'll probably read it soon (to render the next step, or to
+            # display it).
+            cache_key = _local_cache_key(key)
+            if cache_key is not None:
+                _get_local_cache().put(cache_key, parquet_path)
+
+        # Write summaries _after_ Parquet. Readers fall back to the table
+        # when summaries are missing.
+        s3.put_bytes(
+            BUCKET,
+            summaries_key(workflow.id, step.id, delta_id),
+            summaries_to_json_bytes(summarize_table(result.table, result.columns)),
+        )
+
+        arrow_format = settings.RENDERCACHE_ARROW_FORMAT
+        if arrow_format:
+            # Write Arrow _after_ Parquet. Readers fall back to Parquet when
+            # the Arrow file is missing.
+            key = arrow_key(workflow.id, step.id, delta_id, arrow_format)
+            with tempfile_context() as arrow_path:
+                _write_arrow_file(arrow_path, result.table, arrow_format)
+                s3.fput_file(BUCKET, key, arrow_path)
+                cache_key = _local_cache_key(key)
+                if cache_key is not None:
+                    _get_local_cache().put(cache_key, arrow_path)
+
+
+def reuse_cached_render_result(workflow: Workflow, step: Step, delta_id: int) -> None:
+    """Mark `step`'s stale cached result as the result for `delta_id`.
+
+    Call this instead of `cache_render_result()` when you know rendering
+    `step` at `delta_id` would produce exactly its stale cached result. It
+    copies the Parquet file to its new key instead of re-uploading it.
+
+    Raise AssertionError if `delta_id` is not what we expect.
+
+    Raise CorruptCacheError if the stale cached Parquet file is missing.
+
+    Since this alters data, call it within a lock:
+
+        with workflow.cooperative_lock():
+            step.refresh_from_db()  # may change delta_id
+            reuse_cached_render_result(workflow, step, delta_id)
+    """
+    assert delta_id == step.last_relevant_delta_id
+    stale_crr = step.get_stale_cached_render_result()
+    assert stale_crr is not None
+
+    if stale_crr.table_metadata.columns:
+        old_key = crr_parquet_key(stale_crr)
+        try:
+            s3.copy(
+                BUCKET,
+                parquet_key(workflow.id, step.id, delta_id),
+                "%(Bucket)s/%(Key)s" % {"Bucket": BUCKET, "Key": old_key},
+            )
+        except s3.layer.error.NoSuchKey:
+            raise CorruptCacheError
+    else:
+        old_key = None
+
+    if old_key is not None:
+        old_summaries_key = crr_summaries_key(stale_crr)
+        try:
+            s3.copy(
+                BUCKET,
+                summaries_key(workflow.id, step.id, delta_id),
+                "%(Bucket)s/%(Key)s" % {"Bucket": BUCKET, "Key": old_summaries_key},
+            )
+        except s3.layer.error.NoSuchKey:
+            pass  # readers will fall back to the table
+    else:
+        old_summaries_key = None
+
+    arrow_format = settings.RENDERCACHE_ARROW_FORMAT
+    if old_key is not None and arrow_format:
+        old_arrow_key = crr_arrow_key(stale_crr, arrow_format)
+        try:
+            s3.copy(
+                BUCKET,
+                arrow_key(workflow.id, step.id, delta_id, arrow_format),
+                "%(Bucket)s/%(Key)s" % {"Bucket": BUCKET, "Key": old_arrow_key},
+            )
+        except s3.layer.error.NoSuchKey:
+            pass  # readers will fall back to Parquet
+    else:
+        old_arrow_key = None
+
+    step.cached_render_result_delta_id = delta_id
+    step.save(update_fields=["cached_render_result_delta_id"])
+    # Delete synchronously, in parallel. (Undo can make a Step's delta ID
+    # revert to an old value; a background delete could race with a render
+    # that rewrites these same keys.)
+    s3.remove_many(
+        BUCKET,
+        [key for key in (old_key, old_summaries_key, old_arrow_key) if key is not None],
+    )
+
+
+@contextlib.contextmanager
+def _downloaded_file(key: str, dir=None) -> ContextManager[Path]:
+    """Yield a local copy of `key`, from the local cache or from S3.
+
+    Raise FileNotFoundError if the file is not on S3.
+    """
+    # If another process overwrites `key` between our HEAD request and our
+    # download, we'll cache its new contents under the old ETag. That's
+    # harmless: readers look up the new ETag.
+    cache_key = _local_cache_key(key)  # raise FileNotFoundError
+    local_cache = _get_local_cache()
+    with contextlib.ExitStack() as ctx:
+        if cache_key is None:
+            cached_path = None
+        else:
+            cached_path = ctx.enter_context(local_cache.open(cache_key))
+        if cached_path is None:
+            path = ctx.enter_context(s3.temporarily_download(BUCKET, key, dir=dir))
+            if cache_key is not None:
+                local_cache.put(cache_key, path)
+        elif dir is not None:
+            # The caller wants the file in `dir` (e.g., in a chroot)
+            path = ctx.enter_context(tempfile_context(prefix="s3-download-", dir=dir))
+            shutil.copyfile(cached_path, path)
+        else:
+            path = cached_path
+
+        yield path
 
 
 @contextlib.contextmanager
@@ -100,6 +341,9 @@ def downloaded_parquet_file(crr: CachedRenderResult, dir=None) -> ContextManager
     This is cheaper than open_cached_render_result() because it does not parse
     the file. Use this function when you suspect you won't need the table data.
 
+    If `settings.RENDERCACHE_LOCAL_MAX_BYTES` is set, keep a local copy of the
+    file and reuse it next time. Do not modify the yielded file.
+
     Raise CorruptCacheError if the cached data is missing.
 
     Usage:
@@ -110,15 +354,62 @@ def downloaded_parquet_file(crr: CachedRenderResult, dir=None) -> ContextManager
         except rendercache.CorruptCacheError:
             # file does not exist....
     """
-    with contextlib.ExitStack() as ctx:
-        try:
-            path = ctx.enter_context(
-                s3.temporarily_download(BUCKET, crr_parquet_key(crr), dir=dir)
-            )
-        except FileNotFoundError:
-            raise CorruptCacheError
+    try:
+        with _downloaded_file(crr_parquet_key(crr), dir=dir) as path:
+            yield path
+    except FileNotFoundError:
+        raise CorruptCacheError
 
-        yield path
+
+def _load_arrow_file(crr: CachedRenderResult, path: Path) -> Optional[pa.Table]:
+    """Write `crr`'s Arrow file (uncompressed) to `path` and return its table.
+
+    Return `None` if there is no usable Arrow file. (The caller should fall
+    back to Parquet.)
+    """
+    arrow_format = settings.RENDERCACHE_ARROW_FORMAT
+    if not arrow_format:
+        return None
+
+    key = crr_arrow_key(crr, arrow_format)
+    try:
+        if arrow_format == "uncompressed":
+            # One sequential copy, straight into `path`
+            cache_key = _local_cache_key(key)  # raise FileNotFoundError
+            if cache_key is None:
+                s3.download(BUCKET, key, path)
+            else:
+                with _get_local_cache().open(cache_key) as cached_path:
+                    if cached_path is None:
+                        s3.download(BUCKET, key, path)
+                        _get_local_cache().put(cache_key, path)
+                    else:
+                        shutil.copyfile(cached_path, path)
+        else:
+            # One pass: decompress each record batch into `path`
+            with _downloaded_file(key) as compressed_path:
+                with pa.ipc.open_file(compressed_path) as reader:
+                    with pa.ipc.RecordBatchFileWriter(path, reader.schema) as writer:
+                        for i in range(reader.num_record_batches):
+                            writer.write_batch(reader.get_batch(i))
+
+        # Don't validate the file: we wrote it ourselves.
+        with pa.ipc.open_file(path) as reader:
+            table = reader.read_all()
+    except FileNotFoundError:
+        return None  # written before RENDERCACHE_ARROW_FORMAT was set
+    except (pa.ArrowInvalid, pa.ArrowIOError):
+        logger.exception("Falling back to Parquet after reading %s", key)
+        return None
+
+    if (
+        table.num_columns != len(crr.table_metadata.columns)
+        or table.num_rows != crr.table_metadata.n_rows
+    ):
+        logger.error("Falling back to Parquet: %s does not match database", key)
+        return None
+
+    return table
 
 
 def load_cached_render_result(
@@ -131,6 +422,9 @@ def load_cached_render_result(
     The returned LoadedRenderResult is backed by `path`, an mmapped file on
     disk. The whole operation doesn't require much physical RAM.
 
+    If `settings.RENDERCACHE_ARROW_FORMAT` is set and an Arrow file was cached
+    alongside the Parquet file, copy that instead of converting from Parquet.
+
     Raise CorruptCacheError if the cached data does not match `crr`. That can
     mean:
 
@@ -151,6 +445,16 @@ def load_cached_render_result(
             json=crr.json,
         )
     else:
+        table = _load_arrow_file(crr, path)
+        if table is not None:
+            return LoadedRenderResult(
+                path=path,
+                table=table,
+                columns=crr.table_metadata.columns,
+                errors=crr.errors,
+                json=crr.json,
+            )
+
         # raises CorruptCacheError
         with downloaded_parquet_file(crr) as parquet_path:
             try:
@@ -199,6 +503,127 @@ def open_cached_render_result(
         yield loaded_result
 
 
+def read_cached_render_result_summaries(
+    crr: CachedRenderResult,
+) -> Optional[List[ColumnSummary]]:
+    """Return one ColumnSummary per column, without reading the table.
+
+    Return `None` if there are no summaries -- for instance, if `crr` was cached
+    before we stored summaries, or it is stale. Callers should fall back to
+    reading the table.
+    """
+    if not crr.table_metadata.columns:
+        return []
+
+    try:
+        with _downloaded_file(crr_summaries_key(crr)) as path:
+            summaries = summaries_from_json_bytes(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+    if summaries is None or len(summaries) != len(crr.table_metadata.columns):
+        return None
+    return summaries
+
+
+@contextlib.contextmanager
+def _opened_parquet_file(
+    crr: CachedRenderResult,
+) -> ContextManager[pyarrow.parquet.ParquetFile]:
+    """Yield a ParquetFile that reads only the parts of the file it needs.
+
+    Read from the local cache if we have a copy; otherwise, use S3 range
+    requests.
+
+    Raise CorruptCacheError if the file is missing or is not Parquet.
+    """
+    key = crr_parquet_key(crr)
+    try:
+        cache_key = _local_cache_key(key)  # raise FileNotFoundError
+    except FileNotFoundError as err:
+        raise CorruptCacheError from err
+
+    with contextlib.ExitStack() as ctx:
+        if cache_key is None:
+            cached_path = None
+        else:
+            cached_path = ctx.enter_context(_get_local_cache().open(cache_key))
+        try:
+            if cached_path is None:
+                source = s3.RangeFile(BUCKET, key)  # raise FileNotFoundError
+            else:
+                source = str(cached_path)
+            # raise ArrowInvalid, ArrowIOError
+            parquet_file = pyarrow.parquet.ParquetFile(source)
+        except (pa.ArrowInvalid, pa.ArrowIOError, FileNotFoundError) as err:
+            raise CorruptCacheError from err
+
+        yield parquet_file
+
+
+def read_cached_render_result_slice(
+    crr: CachedRenderResult, only_columns: range, only_rows: range
+) -> pa.Table:
+    """Read some columns and rows of the cached table -- and nothing else.
+
+    Ignore out-of-range rows and columns.
+
+    This reads the Parquet footer, then the selected columns of the row groups
+    that contain `only_rows`. Unless we have a local copy of the file, those
+    reads are S3 range requests: cost is proportional to the size of the
+    output, not the size of the table.
+
+    The returned table's fields have no metadata (such as number formats). Read
+    `crr.table_metadata.columns` for that.
+
+    Raise CorruptCacheError if the cached data does not match `crr`. That can
+    mean:
+
+        * The cached Parquet file is corrupt
+        * The cached Parquet file is missing
+        * `crr` is stale -- the cached result is for a different delta. This
+          could be detected by a `Workflow.cooperative_lock()`, too, should the
+          caller want to distinguish this error from the others.
+    """
+    column_names = [
+        column.name
+        for column in crr.table_metadata.columns[only_columns.start : only_columns.stop]
+    ]
+    if not column_names:
+        # Zero-column tables aren't written to cache
+        return pa.table({})
+
+    with _opened_parquet_file(crr) as parquet_file:
+        metadata = parquet_file.metadata
+        row_groups = []
+        first_row = 0  # index of first row of row_groups[0]
+        offset = 0
+        for i in range(metadata.num_row_groups):
+            n_rows = metadata.row_group(i).num_rows
+            if offset < only_rows.stop and offset + n_rows > only_rows.start:
+                if not row_groups:
+                    first_row = offset
+                row_groups.append(i)
+            offset += n_rows
+
+        try:
+            if row_groups:
+                table = parquet_file.read_row_groups(
+                    row_groups, columns=column_names, use_threads=False
+                )
+                return table.slice(only_rows.start - first_row, len(only_rows))
+            elif metadata.num_row_groups:
+                # Rows are out of range. Read a row group, for its schema.
+                table = parquet_file.read_row_group(
+                    0, columns=column_names, use_threads=False
+                )
+                return table.slice(0, 0)
+            else:
+                return parquet_file.read(columns=column_names, use_threads=False)
+        except (pa.ArrowInvalid, pa.ArrowIOError) as err:
+            raise CorruptCacheError from err
+
+
 def read_cached_render_result_slice_as_text(
     crr: CachedRenderResult, format: str, only_columns: range, only_rows: range
 ) -> str:
@@ -218,22 +643,32 @@ def read_cached_render_result_slice_as_text(
     To limit the amount of text stored in RAM, use relatively small ranges for
     `only_columns` and `only_rows`.
 
-    This uses `parquet-to-text-stream` with `--row-range` and `--column-range`.
-    Read `parquet-to-text-stream` documentation to see how nulls and floats are
-    handled in your chosen format (`csv` or `json`). (In a nutshell: it's
-    mostly non-lossy, though CSV can't represent `null`.)
+    This reads only the requested slice (see
+    `read_cached_render_result_slice()`), writes it to a small Parquet file and
+    runs `parquet-to-text-stream` on that. Read `parquet-to-text-stream`
+    documentation to see how nulls and floats are handled in your chosen format
+    (`csv` or `json`). (In a nutshell: it's mostly non-lossy, though CSV can't
+    represent `null`.)
     """
     if not crr.table_metadata.columns:
         # Zero-column tables aren't written to cache
         return {}
 
+    # raise CorruptCacheError
+    table = read_cached_render_result_slice(crr, only_columns, only_rows)
+    if not table.num_columns:
+        return "[]" if format == "json" else ""
+
     try:
-        with downloaded_parquet_file(crr) as parquet_path:
+        with tempfile_context(suffix=".parquet") as parquet_path:
+            # Same types as the cached file, so parquet-to-text-stream formats
+            # values the same way.
+            cjwparquet.write(parquet_path, table)
             return cjwparquet.read_slice_as_text(
                 parquet_path,
                 format=format,
-                only_columns=only_columns,
-                only_rows=only_rows,
+                only_columns=range(table.num_columns),
+                only_rows=range(table.num_rows),
             )
     except (pa.ArrowIOError, FileNotFoundError):  # FIXME unit-test
         raise CorruptCacheError
@@ -0,0 +1,135 @@
+"""Small per-column summaries of render results, stored next to the table.
+
+The web tier answers some questions about a table -- such as "how often does
+each value appear in column A?" -- many times over for the same render result.
+We compute the answers once, when caching the result, so the web tier needn't
+read the table at all.
+"""
+import collections
+import datetime
+import json
+import math
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import pyarrow as pa
+import pyarrow.compute
+
+from cjwkernel.types import Column, ColumnType
+from cjwkernel.util import json_encode
+
+
+SUMMARIES_FORMAT_VERSION = 1
+
+MAX_VALUE_COUNTS = 1000
+"""Number of distinct values above which we don't store a text column's counts.
+
+(Readers must fall back to reading the column.)
+"""
+
+
+class ColumnSummary(NamedTuple):
+    """Facts about one column of a cached table."""
+
+    n_nulls: int
+
+    value_counts: Optional[Dict[str, int]] = None
+    """Number of times each non-null value appears in a text column.
+
+    `None` if the column is not text or has too many distinct values.
+    """
+
+    min: Any = None
+    """Smallest non-null number, date ("YYYY-MM-DD") or timestamp (ISO8601).
+
+    `None` for text columns and all-null columns.
+    """
+
+    max: Any = None
+    """Largest non-null number, date or timestamp. (See `min`.)"""
+
+
+def count_text_values(chunked_array: pa.ChunkedArray) -> Dict[str, int]:
+    """Count how often each non-null value appears in a text column.
+
+    Count chunk by chunk: dictionary chunks (say, from different Parquet row
+    groups) may each have a different dictionary.
+    """
+    result = collections.Counter()
+    for chunk in chunked_array.chunks:
+        pyarrow_value_counts = chunk.value_counts()
+        # values can be either a StringArray or a DictionaryArray. In either
+        # case, .to_pylist() converts to a Python List[str].
+        values = pyarrow_value_counts.field("values").to_pylist()
+        counts = pyarrow_value_counts.field("counts").to_pylist()
+        result.update({v: c for v, c in zip(values, counts) if v is not None})
+    return dict(result)
+
+
+def _summarize_text(chunked_array: pa.ChunkedArray) -> Dict[str, Any]:
+    value_counts = count_text_values(chunked_array)
+    if len(value_counts) > MAX_VALUE_COUNTS:
+        return {}
+    return {"value_counts": value_counts}
+
+
+def _date_to_iso(value: int) -> str:
+    # `value` is days since the epoch
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=value)).isoformat()
+
+
+def _timestamp_to_iso(value: int) -> str:
+    # `value` is nanoseconds since the epoch. Truncate to microseconds.
+    dt = datetime.datetime(1970, 1, 1) + datetime.timedelta(microseconds=value // 1000)
+    return dt.isoformat() + "Z"
+
+
+def _summarize_min_max(chunked_array: pa.ChunkedArray, column_type) -> Dict[str, Any]:
+    if chunked_array.null_count == len(chunked_array):
+        return {}
+
+    # Compute over integers: they're fast, and min_max() supports them
+    if isinstance(column_type, ColumnType.Timestamp):
+        chunked_array = chunked_array.cast(pa.int64())
+    elif isinstance(column_type, ColumnType.Date):
+        chunked_array = chunked_array.cast(pa.int32())
+    min_max = pyarrow.compute.min_max(chunked_array)
+    min = min_max["min"].as_py()
+    max = min_max["max"].as_py()
+
+    if isinstance(column_type, ColumnType.Number):
+        if not (math.isfinite(min) and math.isfinite(max)):
+            return {}  # JSON can't represent NaN or Infinity
+        return {"min": min, "max": max}
+    elif isinstance(column_type, ColumnType.Date):
+        return {"min": _date_to_iso(min), "max": _date_to_iso(max)}
+    else:
+        return {"min": _timestamp_to_iso(min), "max": _timestamp_to_iso(max)}
+
+
+def summarize_table(table: pa.Table, columns: List[Column]) -> List[ColumnSummary]:
+    """Summarize each column of `table`, which must be a valid render result."""
+    summaries = []
+    for chunked_array, column in zip(table.columns, columns):
+        if isinstance(column.type, ColumnType.Text):
+            kwargs = _summarize_text(chunked_array)
+        else:
+            kwargs = _summarize_min_max(chunked_array, column.type)
+        summaries.append(ColumnSummary(n_nulls=chunked_array.null_count, **kwargs))
+    return summaries
+
+
+def summaries_to_json_bytes(summaries: List[ColumnSummary]) -> bytes:
+    return json_encode(
+        {
+            "version": SUMMARIES_FORMAT_VERSION,
+            "columns": [summary._asdict() for summary in summaries],
+        }
+    ).encode("utf-8")
+
+
+def summaries_from_json_bytes(value: bytes) -> Optional[List[ColumnSummary]]:
+    """Parse summaries; return `None` if they are in an unknown format."""
+    data = json.loads(value)
+    if data.get("version") != SUMMARIES_FORMAT_VERSION:
+        return None
+    return [ColumnSummary(**column) for column in data["columns"]]
@@ -1,15 +1,23 @@
 """High-level storage backed by AWS S3, Google GCS, or Minio.
 """
 
+import collections
+import concurrent.futures
 import errno
+import functools
+import io
 import json
 import logging
 import pathlib
 import sys
+import threading
+import time
 import urllib3
 import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import ContextManager, NamedTuple
+from dataclasses import dataclass
+from typing import ContextManager, Dict, Iterable, List, NamedTuple
 
 import boto3
 import botocore
@@ -22,17 +30,52 @@ from cjwkernel.util import tempfile_context
 logger = logging.getLogger(__name__)
 
 
+LOG_STATS_EVERY_N_OPERATIONS = 1000
+
+MAX_KEYS_PER_DELETE = 1000
+"""Maximum number of keys in a DeleteObjects request (an S3 limit)."""
+
+
 def encode_content_disposition(filename: str) -> str:
     """Build a Content-Disposition header value for the given filename."""
     enc_filename = urllib.parse.quote(filename, encoding="utf-8")
     return "attachment; filename*=UTF-8''" + enc_filename
 
 
+@dataclass
+class TransferStats:
+    """Per-process counters for one kind of operation (e.g., "upload")."""
+
+    n_operations: int = 0
+    n_bytes: int = 0
+    n_seconds: float = 0.0
+    """Sum of all operations' wall-clock durations."""
+
+    @property
+    def mean_latency(self) -> float:
+        return self.n_seconds / self.n_operations if self.n_operations else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second, counting only time spent in operations."""
+        return self.n_bytes / self.n_seconds if self.n_seconds else 0.0
+
+
+@dataclass
+class Measurement:
+    n_bytes: int
+
+
 class Layer:
     def __init__(self):
         self._client = None
         self._uploader = None
         self._downloader = None
+        self._executor = None
+        self._background_executor = None
+        self._init_lock = threading.Lock()
+        self.stats: Dict[str, TransferStats] = collections.defaultdict(TransferStats)
+        self._stats_lock = threading.Lock()
 
     @property
     def client(self):
@@ -54,23 +97,85 @@ class Layer:
         threads S3 uses.
         """
         if self._downloader is None:
-            self._downloader = S3Transfer(self.client, TransferConfig())
+            self._downloader = S3Transfer(
+                self.client,
+                TransferConfig(max_concurrency=settings.S3_TRANSFER_CONCURRENCY),
+            )
         return self._downloader
 
     @property
     def uploader(self):
         """Upload configuration.
 
-        To support Google Cloud Storage, we disable multipart uploads. Every upload
-        uses the calling thread and uploads in a single part.
+        With `settings.S3_MULTIPART_UPLOAD`, big files upload in parallel parts.
+        Otherwise (to support Google Cloud Storage), every upload uses the
+        calling thread and uploads in a single part.
         """
         if self._uploader is None:
-            self._uploader = S3Transfer(
-                self.client,
-                TransferConfig(use_threads=False, multipart_threshold=sys.maxsize),
-            )
+            if settings.S3_MULTIPART_UPLOAD:
+                config = TransferConfig(
+                    multipart_threshold=settings.S3_MULTIPART_CHUNK_SIZE,
+                    multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+                    max_concurrency=settings.S3_TRANSFER_CONCURRENCY,
+                )
+            else:
+                config = TransferConfig(
+                    use_threads=False, multipart_threshold=sys.maxsize
+                )
+            self._uploader = S3Transfer(self.client, config)
         return self._uploader
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool for parallel requests within one operation (e.g., deletes)."""
+        with self._init_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.S3_TRANSFER_CONCURRENCY,
+                    thread_name_prefix="s3-",
+                )
+            return self._executor
+
+    @property
+    def background_executor(self) -> ThreadPoolExecutor:
+        """Single thread that runs operations nobody waits for, one at a time.
+
+        Operations queue here so that callers return immediately; each
+        operation may in turn use `executor` for parallelism.
+        """
+        with self._init_lock:
+            if self._background_executor is None:
+                self._background_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="s3-background-"
+                )
+            return self._background_executor
+
+    @contextmanager
+    def measure(self, operation: str, n_bytes: int = 0) -> ContextManager[Measurement]:
+        """Add the duration of the `with` block to `self.stats[operation]`.
+
+        If the caller doesn't know `n_bytes` beforehand, it may set the yielded
+        Measurement's `n_bytes` within the block. Failed operations are not
+        counted.
+        """
+        measurement = Measurement(n_bytes)
+        start = time.monotonic()
+        yield measurement
+        duration = time.monotonic() - start
+        with self._stats_lock:
+            stats = self.stats[operation]
+            stats.n_operations += 1
+            stats.n_bytes += measurement.n_bytes
+            stats.n_seconds += duration
+            if stats.n_operations % LOG_STATS_EVERY_N_OPERATIONS == 0:
+                logger.info(
+                    "S3 %s: %d operations, %.1fms mean latency, %.1fMB/s",
+                    operation,
+                    stats.n_operations,
+                    stats.mean_latency * 1000,
+                    stats.throughput / 1024 / 1024,
+                )
+
     @property
     def error(self):
         """Namespace for exceptions.
@@ -126,13 +231,15 @@ def list_file_keys(bucket: str, prefix: str):
 
 
 def fput_file(bucket: str, key: str, path: pathlib.Path) -> None:
-    layer.uploader.upload_file(str(path.resolve()), bucket, key)
+    with layer.measure("upload", path.stat().st_size):
+        layer.uploader.upload_file(str(path.resolve()), bucket, key)
 
 
 def put_bytes(bucket: str, key: str, body: bytes, **kwargs) -> None:
-    layer.client.put_object(
-        Bucket=bucket, Key=key, Body=body, ContentLength=len(body), **kwargs
-    )
+    with layer.measure("put", len(body)):
+        layer.client.put_object(
+            Bucket=bucket, Key=key, Body=body, ContentLength=len(body), **kwargs
+        )
 
 
 def exists(bucket: str, key: str) -> bool:
@@ -150,12 +257,24 @@ def exists(bucket: str, key: str) -> bool:
 
 class Stat(NamedTuple):
     size: int
+    etag: str
+    """Changes whenever the object is overwritten."""
 
 
 def stat(bucket: str, key: str) -> Stat:
-    """Return an object's metadata or raise an error."""
-    response = layer.client.head_object(Bucket=bucket, Key=key)
-    return Stat(response["ContentLength"])
+    """Return an object's metadata or raise an error.
+
+    Raise FileNotFoundError if the key is not on S3.
+    """
+    try:
+        response = layer.client.head_object(Bucket=bucket, Key=key)
+    except layer.error.ClientError as err:
+        # head_object() raises ClientError instead of NoSuchKey
+        if err.response.get("Error", {}).get("Code") == "404":
+            raise FileNotFoundError(errno.ENOENT, f"No file at {bucket}/{key}")
+        else:
+            raise
+    return Stat(response["ContentLength"], response["ETag"])
 
 
 def remove(bucket: str, key: str) -> None:
@@ -166,6 +285,80 @@ def remove(bucket: str, key: str) -> None:
         pass
 
 
+def _remove_batch(bucket: str, keys: List[str]) -> None:
+    response = layer.client.delete_objects(
+        Bucket=bucket, Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+    )
+    errors = [
+        error for error in response.get("Errors", []) if error["Code"] != "NoSuchKey"
+    ]
+    if errors:
+        raise RuntimeError(
+            "Failed to delete %d keys from %s: %r" % (len(errors), bucket, errors[:10])
+        )
+
+
+def remove_many(bucket: str, keys: Iterable[str]) -> None:
+    """Delete many files, in parallel. Skip files that are already deleted.
+
+    With `settings.S3_MULTI_DELETE`, send up to 1,000 keys per request.
+    Otherwise (to support Google Cloud Storage), send one request per key.
+
+    This is _not atomic_. On error, some files may be deleted and others not.
+    Either way, we wait for every request to finish before returning or
+    raising (the first error, in `keys` order).
+    """
+    keys = list(keys)
+    if not keys:
+        return
+
+    if settings.S3_MULTI_DELETE:
+        batches = [
+            keys[i : i + MAX_KEYS_PER_DELETE]
+            for i in range(0, len(keys), MAX_KEYS_PER_DELETE)
+        ]
+        do_remove = functools.partial(_remove_batch, bucket)
+    else:
+        batches = keys
+        do_remove = functools.partial(remove, bucket)
+
+    with layer.measure("delete"):
+        if len(batches) == 1:
+            do_remove(batches[0])  # skip thread overhead in the common case
+        else:
+            futures = [layer.executor.submit(do_remove, batch) for batch in batches]
+            concurrent.futures.wait(futures)
+            for future in futures:
+                future.result()  # raise the first error
+
+
+def _log_background_error(future: Future) -> None:
+    if future.exception() is not None:
+        logger.error("Background S3 operation failed", exc_info=future.exception())
+
+
+def remove_many_in_background(bucket: str, keys: Iterable[str]) -> Future:
+    """Queue `remove_many()` on a background thread; return immediately.
+
+    Use this for files nobody will read again, when the caller shouldn't wait
+    -- for instance, on a renderer thread. Errors are logged. The returned
+    Future resolves when the files are deleted.
+    """
+    future = layer.background_executor.submit(remove_many, bucket, list(keys))
+    future.add_done_callback(_log_background_error)
+    return future
+
+
+def remove_recursive_in_background(bucket: str, prefix: str) -> Future:
+    """Queue `remove_recursive()` on a background thread; return immediately.
+
+    See `remove_many_in_background()`.
+    """
+    future = layer.background_executor.submit(remove_recursive, bucket, prefix)
+    future.add_done_callback(_log_background_error)
+    return future
+
+
 def copy(bucket: str, key: str, copy_source: str, **kwargs) -> None:
     layer.client.copy_object(Bucket=bucket, Key=key, CopySource=copy_source, **kwargs)
 
@@ -176,7 +369,8 @@ def _remove_by_prefix(bucket: str, prefix: str, force=False) -> None:
     This is _not atomic_. An aborted delete may leave some objects deleted
     and others not-deleted.
 
-    It's also slow. Be certain there aren't many files to delete.
+    It lists 1,000 keys per request. Be certain there aren't many files to
+    delete.
 
     If you mean to use a directory-style `prefix` -- that is, one that ends in
     `"/"` -- then use `remove_recursive()` to signal your intent.
@@ -205,13 +399,7 @@ def _remove_by_prefix(bucket: str, prefix: str, force=False) -> None:
         list_response = layer.client.list_objects(Bucket=bucket, Prefix=prefix)
         done = not list_response.get("IsTruncated", False)
         keys = [o["Key"] for o in list_response.get("Contents", [])]
-        # Use layer.client.delete_object(), not delete_objects(), because Google Cloud
-        # Storage doesn't emulate DeleteObjects.
-        #
-        # This is slow. But so is multi-delete through s3, because s3's
-        # GCS gateway deletes one-at-a-time anyway.
-        for key in keys:
-            remove(bucket, key)
+        remove_many(bucket, keys)
 
 
 def remove_recursive(bucket: str, prefix: str, force=False) -> None:
@@ -229,6 +417,111 @@ def remove_recursive(bucket: str, prefix: str, force=False) -> None:
     return _remove_by_prefix(bucket, prefix, force)
 
 
+def read_range(bucket: str, key: str, begin: int, end: int) -> bytes:
+    """Read bytes `begin` (inclusive) to `end` (exclusive) with an HTTP range GET.
+
+    `end` must not exceed the file size.
+    """
+    with layer.measure("read_range", end - begin):
+        response = layer.client.get_object(
+            Bucket=bucket, Key=key, Range="bytes=%d-%d" % (begin, end - 1)
+        )
+        return response["Body"].read()
+
+
+class RangeFile(io.RawIOBase):
+    """Read-only, seekable file whose reads are S3 range requests.
+
+    Use this to read a small part of a large file (for instance, a few columns
+    of a Parquet file) without downloading the rest.
+
+    Small reads are rounded up to `block_size` and the last few blocks are kept
+    in memory, so a reader's many small reads of nearby bytes cost few requests.
+
+    Raise FileNotFoundError if the key is not on S3.
+    """
+
+    N_CACHED_BLOCKS = 16
+
+    def __init__(self, bucket: str, key: str, *, block_size: int = 1024 * 1024):
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        try:
+            response = layer.client.head_object(Bucket=bucket, Key=key)
+        except layer.error.ClientError as err:
+            # head_object() raises ClientError instead of NoSuchKey
+            if err.response.get("Error", {}).get("Code") == "404":
+                raise FileNotFoundError(errno.ENOENT, f"No file at {bucket}/{key}")
+            else:
+                raise
+        self.size = response["ContentLength"]
+        self._position = 0
+        self._blocks = collections.OrderedDict()  # block index => bytes
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError("Invalid whence %r" % whence)
+        if position < 0:
+            raise OSError(errno.EINVAL, "Negative seek position %d" % position)
+        self._position = position
+        return position
+
+    def _get_range(self, begin: int, end: int) -> bytes:
+        return read_range(self.bucket, self.key, begin, end)
+
+    def _get_block(self, index: int) -> bytes:
+        try:
+            self._blocks.move_to_end(index)
+            return self._blocks[index]
+        except KeyError:
+            begin = index * self.block_size
+            block = self._get_range(begin, min(begin + self.block_size, self.size))
+            self._blocks[index] = block
+            if len(self._blocks) > self.N_CACHED_BLOCKS:
+                self._blocks.popitem(last=False)
+            return block
+
+    def readinto(self, b) -> int:
+        begin = self._position
+        end = min(begin + len(b), self.size)
+        if end <= begin:
+            return 0
+
+        view = memoryview(b).cast("B")
+        if end - begin >= self.block_size:
+            # Big read: one request, and don't cache it
+            view[: end - begin] = self._get_range(begin, end)
+        else:
+            position = begin
+            while position < end:
+                index, block_offset = divmod(position, self.block_size)
+                block = self._get_block(index)
+                n = min(len(block) - block_offset, end - position)
+                view[position - begin : position - begin + n] = block[
+                    block_offset : block_offset + n
+                ]
+                position += n
+
+        self._position = end
+        return end - begin
+
+
 @contextmanager
 def temporarily_download(
     bucket: str, key: str, dir=None
@@ -255,7 +548,9 @@ def download(bucket: str, key: str, path: pathlib.Path) -> None:
     Raise FileNotFoundError if the key is not on S3.
     """
     try:
-        layer.downloader.download_file(bucket, key, str(path))
+        with layer.measure("download") as measurement:
+            layer.downloader.download_file(bucket, key, str(path))
+            measurement.n_bytes = path.stat().st_size
     # _downloader.download_file() seems to raise ClientError instead of a
     # wrapped error.
     # except layer.error.NoSuchKey:
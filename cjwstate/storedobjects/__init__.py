@@ -1,10 +1,12 @@
 from .io import (
+    compute_hash,
     create_stored_object,
     delete_old_files_to_enforce_storage_limits,
     downloaded_file,
 )
 
 __all__ = (
+    "compute_hash",
     "create_stored_object",
     "delete_old_files_to_enforce_storage_limits",
     "downloaded_file",
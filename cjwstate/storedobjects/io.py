@@ -1,17 +1,68 @@
+import contextlib
 import datetime
-import uuid
+import hashlib
+import shutil
 from pathlib import Path
 from typing import ContextManager, Optional
 
 from django.conf import settings
+from django.db import transaction
 
 from cjwkernel.util import tempfile_context
 from cjwstate import s3
+from cjwstate.diskcache import DiskCache
 from cjwstate.models import Step, StoredObject
+from cjwstate.models.stored_object import CONTENT_ADDRESSED_KEY_PREFIX, lock_key
 from cjwstate.util import find_deletable_ids
 
 BUCKET = s3.StoredObjectsBucket
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+_local_cache: Optional[DiskCache] = None
+
+
+def _get_local_cache() -> DiskCache:
+    """Local copies of content-addressed files, keyed by their S3 keys."""
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = DiskCache(
+            "storedobjects",
+            Path(settings.STOREDOBJECTS_LOCAL_DIR),
+            settings.STOREDOBJECTS_LOCAL_MAX_BYTES,
+        )
+    return _local_cache
+
+
+def compute_hash(path: Path) -> str:
+    """Return the SHA-256 hex digest of the file at `path`.
+
+    Read the file in chunks, so memory use stays constant.
+    """
+    sha = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+@contextlib.contextmanager
+def _downloaded_content_addressed_file(key: str, dir=None) -> ContextManager[Path]:
+    with tempfile_context(prefix="storedobjects-", dir=dir) as path:
+        # A content-addressed file never changes, so a local copy is as good
+        # as S3's
+        with _get_local_cache().open(key) as cached_path:
+            if cached_path is None:
+                s3.download(BUCKET, key, path)  # raise FileNotFoundError
+                _get_local_cache().put(key, path)
+            else:
+                shutil.copyfile(cached_path, path)
+        yield path
+
 
 def downloaded_file(stored_object: StoredObject, dir=None) -> ContextManager[Path]:
     """Context manager to download and yield `path`, the StoredObject's file.
@@ -30,6 +81,9 @@ def downloaded_file(stored_object: StoredObject, dir=None) -> ContextManager[Pat
         # Some stored objects with size=0 do not have key. These are valid:
         # they represent empty files.
         return tempfile_context(prefix="storedobjects-empty-file", dir=dir)
+    elif stored_object.is_content_addressed:
+        # raises FileNotFoundError
+        return _downloaded_content_addressed_file(stored_object.key, dir=dir)
     else:
         # raises FileNotFoundError
         return s3.temporarily_download(
@@ -37,9 +91,13 @@ def downloaded_file(stored_object: StoredObject, dir=None) -> ContextManager[Pat
         )
 
 
-def _build_key(workflow_id: int, step_id: int) -> str:
-    """Build a helpful S3 key."""
-    return f"{workflow_id}/{step_id}/{uuid.uuid1()}.dat"
+def _build_key(content_hash: str) -> str:
+    """Build an S3 key that every file with these contents shares.
+
+    The key is outside the "{workflow_id}/" prefixes: a file may outlive the
+    workflow that first stored it.
+    """
+    return f"{CONTENT_ADDRESSED_KEY_PREFIX}{content_hash}.dat"
 
 
 def create_stored_object(
@@ -47,28 +105,39 @@ def create_stored_object(
     step_id: int,
     path: Path,
     stored_at: Optional[datetime.datetime] = None,
+    *,
+    content_hash: Optional[str] = None,
 ) -> StoredObject:
     """Write and return a new StoredObject.
 
+    If another StoredObject -- in any workflow -- has the same file contents,
+    share its S3 file instead of uploading. Pass `content_hash` (from
+    `compute_hash(path)`) if you already have it, to avoid reading `path`
+    twice.
+
     The caller should call enforce_storage_limits() after calling this.
 
     Raise IntegrityError if a database race prevents saving this. Raise a s3
-    error if writing to s3 failed. In case of partial completion, a
-    StoredObject will exist in the database but no file will be saved in s3.
+    error if writing to s3 failed. In case of partial completion, a file may
+    exist in s3 that no StoredObject references.
     """
     if stored_at is None:
         stored_at = datetime.datetime.now()
-    key = _build_key(workflow_id, step_id)
+    if content_hash is None:
+        content_hash = compute_hash(path)
+    key = _build_key(content_hash)
     size = path.stat().st_size
-    stored_object = StoredObject.objects.create(
-        stored_at=stored_at,
-        step_id=step_id,
-        key=key,
-        size=size,
-        hash="unhashed",
-    )
-    s3.fput_file(BUCKET, key, path)
-    return stored_object
+    with transaction.atomic():
+        lock_key(key)  # so nobody deletes the file between our check and create
+        if not StoredObject.objects.filter(key=key).exists():
+            s3.fput_file(BUCKET, key, path)
+        return StoredObject.objects.create(
+            stored_at=stored_at,
+            step_id=step_id,
+            key=key,
+            size=size,
+            hash=content_hash,
+        )
 
 
 def delete_old_files_to_enforce_storage_limits(*, step: Step) -> None:
@@ -86,6 +155,6 @@ def delete_old_files_to_enforce_storage_limits(*, step: Step) -> None:
     )
 
     if to_delete:
-        # QuerySet.delete() sends pre_delete signal, which deletes from S3
+        # QuerySet.delete() sends post_delete signal, which deletes from S3
         # ref: https://docs.djangoproject.com/en/2.2/ref/models/querysets/#django.db.models.query.QuerySet.delete
         step.stored_objects.filter(id__in=to_delete).delete()
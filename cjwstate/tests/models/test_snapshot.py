@@ -0,0 +1,118 @@
+import datetime
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from cjwstate.models import Step, StoredObject, UploadedFile, Workflow
+from cjwstate.models.snapshot import load_clientside_snapshot
+from cjwstate.tests.utils import (
+    DbTestCaseWithModuleRegistryAndMockKernel,
+    create_module_zipfile,
+)
+
+
+class LoadClientsideSnapshotTests(DbTestCaseWithModuleRegistryAndMockKernel):
+    def setUp(self):
+        super().setUp()
+        self.module_zipfile = create_module_zipfile(
+            "loadfile",
+            spec_kwargs={
+                "parameters": [
+                    {"id_name": "file", "type": "file"},
+                    {"id_name": "version_select", "type": "custom"},
+                ]
+            },
+        )
+        self.modules = {"loadfile": self.module_zipfile}
+
+    def _create_workflow(self, n_steps_per_tab: int) -> Workflow:
+        workflow = Workflow.create_and_init()
+        tab1 = workflow.tabs.first()
+        tab2 = workflow.tabs.create(position=1, slug="tab-2", name="Tab 2")
+        for tab in (tab1, tab2):
+            for order in range(n_steps_per_tab):
+                params = {"file": None, "version_select": ""}
+                step = tab.steps.create(
+                    order=order,
+                    slug=f"step-{tab.slug}-{order}",
+                    module_id_name="loadfile",
+                    params=params,
+                    cached_migrated_params=params,
+                    cached_migrated_params_module_version=self.module_zipfile.version,
+                )
+                for i in range(2):
+                    UploadedFile.objects.create(
+                        step=step,
+                        name=f"file{i}.csv",
+                        size=i,
+                        uuid=f"uuid-{step.id}-{i}",
+                        key=f"key-{step.id}-{i}",
+                        created_at=datetime.datetime(2021, 4, 1, i),
+                    )
+                    StoredObject.objects.create(
+                        step=step,
+                        key=f"key-{step.id}-{i}",
+                        stored_at=datetime.datetime(2021, 4, 1, i),
+                        hash="unhashed",
+                    )
+            workflow.blocks.create(
+                position=tab.position,
+                slug=f"block-{tab.slug}",
+                block_type="Table",
+                tab=tab,
+            )
+        workflow.blocks.create(
+            position=2, slug="block-chart", block_type="Chart", step=step
+        )
+        return workflow
+
+    def _count_queries(self, workflow: Workflow, **kwargs) -> int:
+        with CaptureQueriesContext(connection) as context:
+            load_clientside_snapshot(workflow, self.modules, **kwargs)
+        return len(context.captured_queries)
+
+    def test_skip_blocks_query_by_default(self):
+        workflow = self._create_workflow(1)
+        with CaptureQueriesContext(connection) as context:
+            snapshot = load_clientside_snapshot(workflow, self.modules)
+        self.assertIsNone(snapshot.blocks)
+        self.assertEqual(
+            len(context.captured_queries),
+            self._count_queries(workflow, include_blocks=True) - 1,
+        )
+
+    def test_query_count_does_not_depend_on_n_steps(self):
+        n_small = self._count_queries(self._create_workflow(1))
+        n_large = self._count_queries(self._create_workflow(30))
+        self.assertEqual(n_large, n_small)
+        self.assertLessEqual(n_large, 10)
+
+    def test_same_as_per_step_to_clientside(self):
+        workflow = self._create_workflow(2)
+        snapshot = load_clientside_snapshot(workflow, self.modules, include_blocks=True)
+
+        self.assertEqual(snapshot.workflow, workflow.to_clientside())
+        self.assertEqual(
+            snapshot.tabs,
+            {tab.slug: tab.to_clientside() for tab in workflow.live_tabs},
+        )
+        self.assertEqual(
+            snapshot.steps,
+            {
+                step.id: step.to_clientside(force_module_zipfile=self.module_zipfile)
+                for step in Step.live_in_workflow(workflow)
+            },
+        )
+        self.assertEqual(
+            snapshot.blocks,
+            {block.slug: block.to_clientside() for block in workflow.blocks.all()},
+        )
+        # sanity-check that we tested something
+        step_update = next(iter(snapshot.steps.values()))
+        self.assertEqual(
+            [f.name for f in step_update.files], ["file1.csv", "file0.csv"]
+        )
+        self.assertEqual(
+            step_update.versions.versions,
+            [datetime.datetime(2021, 4, 1, 1), datetime.datetime(2021, 4, 1, 0)],
+        )
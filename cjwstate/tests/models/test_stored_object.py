@@ -28,6 +28,20 @@ class StoredObjectTests(DbTestCase):
             b"12345",
         )
 
+    def test_duplicate_content_addressed_shares_file(self):
+        key = "sha256/" + "a" * 64 + ".dat"
+        s3.put_bytes(s3.StoredObjectsBucket, key, b"12345")
+        self.step2 = self.step1.tab.steps.create(order=1, slug="step-2")
+        so1 = self.step1.stored_objects.create(key=key, size=5, hash="a" * 64)
+        so2 = so1.duplicate(self.step2)
+
+        self.assertEqual(so2.key, so1.key)
+        self.assertEqual(so2.hash, so1.hash)
+        so1.delete()
+        self.assertTrue(s3.exists(s3.StoredObjectsBucket, key))
+        so2.delete()
+        self.assertFalse(s3.exists(s3.StoredObjectsBucket, key))
+
     def test_delete_workflow_deletes_from_s3(self):
         s3.put_bytes(s3.StoredObjectsBucket, "test.dat", b"abcd")
         workflow = Workflow.create_and_init()
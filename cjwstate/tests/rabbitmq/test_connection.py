@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+
+import carehare
+
+from cjwstate.rabbitmq.connection import consume_concurrently
+
+
+class FakeConsumer:
+    """Delivers `messages`, then raises ChannelClosed."""
+
+    def __init__(self, messages):
+        self.deliveries = asyncio.Queue()
+        for i, message in enumerate(messages):
+            self.deliveries.put_nowait((message, i + 1))
+        self.deliveries.put_nowait(None)  # close
+        self.acks = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def next_delivery(self):
+        delivery = await self.deliveries.get()
+        if delivery is None:
+            self.deliveries.put_nowait(None)  # stay closed
+            raise carehare.ChannelClosed
+        return delivery
+
+    def ack(self, delivery_tag):
+        self.acks.append(delivery_tag)
+
+
+class FakeConnection:
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.prefetch_count = None
+
+    def acking_consumer(self, queue_name, *, prefetch_count):
+        self.prefetch_count = prefetch_count
+        return self.consumer
+
+
+class ConsumeConcurrentlyTest(unittest.IsolatedAsyncioTestCase):
+    async def test_limit_concurrency(self):
+        consumer = FakeConsumer([b"1", b"2", b"3", b"4", b"5"])
+        connection = FakeConnection(consumer)
+        running = 0
+        max_running = 0
+
+        async def handle(message):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await consume_concurrently(connection, "q", handle, concurrency=2)
+        self.assertEqual(connection.prefetch_count, 2)
+        self.assertEqual(max_running, 2)
+        self.assertEqual(sorted(consumer.acks), [1, 2, 3, 4, 5])
+
+    async def test_ack_after_handle_returns(self):
+        consumer = FakeConsumer([b"1"])
+        acks_during_handle = None
+
+        async def handle(message):
+            nonlocal acks_during_handle
+            await asyncio.sleep(0)
+            acks_during_handle = list(consumer.acks)
+
+        await consume_concurrently(FakeConnection(consumer), "q", handle, concurrency=1)
+        self.assertEqual(acks_during_handle, [])
+        self.assertEqual(consumer.acks, [1])
+
+    async def test_handle_raises_means_no_ack(self):
+        consumer = FakeConsumer([b"1", b"2"])
+
+        async def handle(message):
+            if message == b"2":
+                raise RuntimeError("boom")
+
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            await consume_concurrently(
+                FakeConnection(consumer), "q", handle, concurrency=1
+            )
+        self.assertEqual(consumer.acks, [1])  # RabbitMQ will redeliver 2
+
+    async def test_channel_closed_waits_for_in_flight_handlers(self):
+        consumer = FakeConsumer([b"1", b"2"])
+        finished = []
+
+        async def handle(message):
+            await asyncio.sleep(0.01)
+            finished.append(message)
+
+        # concurrency=3: we receive ChannelClosed while both handlers run
+        await consume_concurrently(FakeConnection(consumer), "q", handle, concurrency=3)
+        self.assertEqual(sorted(finished), [b"1", b"2"])
+        self.assertEqual(sorted(consumer.acks), [1, 2])
@@ -0,0 +1,150 @@
+import dataclasses
+import datetime
+import pickle
+import unittest
+
+import msgpack
+from django.utils.safestring import mark_safe
+
+from cjwkernel.types import (
+    Column,
+    ColumnType,
+    I18nMessage,
+    QuickFix,
+    QuickFixAction,
+    RenderError,
+    TableMetadata,
+)
+from cjworkbench.models.userlimits import UserLimits
+from cjworkbench.models.userusage import UserUsage
+from cjwstate import clientside
+from cjwstate.models.cached_render_result import CachedRenderResult
+from cjwstate.rabbitmq import updatecodec
+from cjwstate.rabbitmq.updatecodec import decode_update, encode_update
+
+
+class UpdateCodecTests(unittest.TestCase):
+    def test_round_trip(self):
+        update = clientside.Update(
+            mutation_id="mutation-1",
+            user=clientside.UserUpdate(
+                display_name="Alice",
+                stripe_customer_id=clientside.Null,
+                limits=UserLimits(max_fetches_per_day=100),
+                usage=UserUsage(fetches_per_day=3),
+            ),
+            workflow=clientside.WorkflowUpdate(
+                name="W",
+                updated_at=datetime.datetime(2021, 5, 6, 7, 8, 9, 123456),
+                acl=[clientside.AclEntry("a@example.org", "editor")],
+            ),
+            steps={
+                123: clientside.StepUpdate(
+                    module_slug="filter",
+                    is_busy=True,
+                    render_result=CachedRenderResult(
+                        workflow_id=1,
+                        step_id=123,
+                        delta_id=4,
+                        status="ok",
+                        errors=[
+                            RenderError(
+                                I18nMessage("err", {"a": 1, "b": "x"}, "module"),
+                                [
+                                    QuickFix(
+                                        I18nMessage("fix", {}, None),
+                                        QuickFixAction.PrependStep(
+                                            "converttotext", {"colnames": ["A"]}
+                                        ),
+                                    )
+                                ],
+                            )
+                        ],
+                        json={"x": [1, 2.5, None, True]},
+                        table_metadata=TableMetadata(
+                            3,
+                            [
+                                Column("A", ColumnType.Text()),
+                                Column("B", ColumnType.Number("{:,.2f}")),
+                                Column("C", ColumnType.Timestamp()),
+                                Column("D", ColumnType.Date("month")),
+                            ],
+                        ),
+                    ),
+                    files=[
+                        clientside.UploadedFile(
+                            "x.csv", "uuid", 4, datetime.datetime(2021, 1, 1)
+                        )
+                    ],
+                    params={"a": {"b": [1, "2"]}},
+                    last_fetched_at=clientside.Null,
+                    versions=clientside.FetchedVersionList(
+                        [datetime.datetime(2021, 1, 1)], datetime.datetime(2021, 1, 1)
+                    ),
+                )
+            },
+            tabs={"tab-1": clientside.TabUpdate(step_ids=[123])},
+            blocks={
+                "block-1": clientside.TextBlock("hi"),
+                "block-2": clientside.ChartBlock("step-1"),
+                "block-3": clientside.TableBlock("tab-1"),
+            },
+            clear_tab_slugs=frozenset(["tab-2"]),
+            clear_step_ids=frozenset([4, 5]),
+        )
+        self.assertEqual(decode_update(encode_update(update)), update)
+
+    def test_smaller_than_pickle(self):
+        update = clientside.Update(
+            steps={
+                1: clientside.StepUpdate(
+                    is_busy=False, last_fetched_at=datetime.datetime(2021, 1, 1)
+                )
+            }
+        )
+        self.assertLess(len(encode_update(update)), len(pickle.dumps(update)) / 2)
+
+    def test_schemas_list_every_field(self):
+        for code, schema in updatecodec._SCHEMAS.items():
+            if dataclasses.is_dataclass(schema.cls):
+                all_fields = [f.name for f in dataclasses.fields(schema.cls)]
+            else:
+                all_fields = list(schema.cls._fields)
+            if schema.cls is clientside.Update:
+                all_fields.remove("modules")
+            if "type" in all_fields and schema.cls.__name__.endswith("Block"):
+                all_fields.remove("type")
+            self.assertEqual(list(schema.fields), all_fields, schema.cls)
+
+    def test_round_trip_safe_string(self):
+        update = clientside.Update(
+            workflow=clientside.WorkflowUpdate(name=mark_safe("x"))
+        )
+        decoded = decode_update(encode_update(update))
+        self.assertEqual(decoded.workflow.name, "x")
+        self.assertIs(type(decoded.workflow.name), str)
+
+    def test_decode_missing_trailing_field_uses_default(self):
+        data = msgpack.packb(
+            [
+                updatecodec.FORMAT_VERSION,
+                msgpack.ExtType(10, msgpack.packb(["mutation-1"])),
+            ]
+        )
+        self.assertEqual(
+            decode_update(data), clientside.Update(mutation_id="mutation-1")
+        )
+
+    def test_decode_wrong_version(self):
+        data = msgpack.packb([updatecodec.FORMAT_VERSION + 1, None])
+        with self.assertRaisesRegex(ValueError, "version"):
+            decode_update(data)
+
+    def test_decode_unknown_code(self):
+        data = msgpack.packb([updatecodec.FORMAT_VERSION, msgpack.ExtType(99, b"")])
+        with self.assertRaises(ValueError):
+            decode_update(data)
+
+    def test_encode_modules_raises(self):
+        with self.assertRaises(TypeError):
+            encode_update(clientside.Update(modules={"x": None}))
@@ -1,7 +1,9 @@
 import datetime
+from unittest.mock import patch
 
 import numpy as np
 import pyarrow as pa
+from django.test import override_settings
 from cjwmodule.arrow.testing import assert_arrow_table_equals, make_column, make_table
 
 from cjwkernel.types import (
@@ -15,9 +17,12 @@ from cjwkernel.types import (
     TableMetadata,
 )
 from cjwkernel.tests.util import arrow_table_context, tempfile_context
+from cjwkernel.util import tempdir_context
 from cjwstate import s3
+from cjwstate.diskcache import DiskCache
 from cjwstate.models import Workflow, Step
 from cjwstate.tests.utils import DbTestCase
+import cjwstate.rendercache.io
 from cjwstate.rendercache.io import (
     BUCKET,
     CorruptCacheError,
@@ -25,6 +30,9 @@ from cjwstate.rendercache.io import (
     open_cached_render_result,
     clear_cached_render_result_for_step,
     crr_parquet_key,
+    downloaded_parquet_file,
+    load_cached_render_result,
+    read_cached_render_result_slice,
     read_cached_render_result_slice_as_text,
 )
 
@@ -127,6 +135,190 @@ class RendercacheIoTests(DbTestCase):
 
         self.assertEqual(cached_result.table_metadata, TableMetadata(1, columns))
 
+    def test_downloaded_parquet_file_uses_local_cache(self):
+        with tempdir_context() as cache_dir:
+            local_cache = DiskCache("test", cache_dir, 1024 * 1024)
+            with patch.object(cjwstate.rendercache.io, "_local_cache", local_cache):
+                with arrow_table_context(make_column("A", ["x"])) as (path, table):
+                    result = LoadedRenderResult(
+                        path=path,
+                        table=table,
+                        columns=[Column("A", ColumnType.Text())],
+                        errors=[],
+                        json={},
+                    )
+                    cache_render_result(self.workflow, self.step, 1, result)
+                crr = self.step.cached_render_result
+                with patch.object(s3, "download") as download:
+                    with downloaded_parquet_file(crr) as parquet_path:
+                        self.assertEqual(parquet_path.read_bytes()[:4], b"PAR1")
+                download.assert_not_called()
+        self.assertEqual(local_cache.stats.n_hits, 1)
+        self.assertGreater(local_cache.stats.n_bytes_saved, 0)
+
+    def test_downloaded_parquet_file_ignores_local_copy_of_overwritten_key(self):
+        with tempdir_context() as cache_dir:
+            local_cache = DiskCache("test", cache_dir, 1024 * 1024)
+            with patch.object(cjwstate.rendercache.io, "_local_cache", local_cache):
+                with arrow_table_context(make_column("A", ["x"])) as (path, table):
+                    result = LoadedRenderResult(
+                        path=path,
+                        table=table,
+                        columns=[Column("A", ColumnType.Text())],
+                        errors=[],
+                        json={},
+                    )
+                    cache_render_result(self.workflow, self.step, 1, result)
+                crr = self.step.cached_render_result
+                # Another process re-renders the same delta. Our local copy is
+                # now stale.
+                with tempfile_context() as parquet_path:
+                    parquet_path.write_bytes(b"PAR1-rerendered")
+                    s3.fput_file(BUCKET, crr_parquet_key(crr), parquet_path)
+                with downloaded_parquet_file(crr) as parquet_path:
+                    self.assertEqual(parquet_path.read_bytes(), b"PAR1-rerendered")
+        self.assertEqual(local_cache.stats.n_hits, 0)
+
+    def _test_load_from_arrow_file(self, arrow_format):
+        with override_settings(RENDERCACHE_ARROW_FORMAT=arrow_format):
+            with arrow_table_context(
+                make_column("A", [1], format="{:d}"), make_column("B", ["x"])
+            ) as (path, table):
+                result = LoadedRenderResult(
+                    path=path,
+                    table=table,
+                    columns=[
+                        Column("A", ColumnType.Number(format="{:d}")),
+                        Column("B", ColumnType.Text()),
+                    ],
+                    errors=[],
+                    json={},
+                )
+                cache_render_result(self.workflow, self.step, 1, result)
+            crr = self.step.cached_render_result
+            # Delete Parquet, to prove we read the Arrow file
+            s3.remove(BUCKET, crr_parquet_key(crr))
+            with tempfile_context() as arrow_path:
+                loaded = load_cached_render_result(crr, arrow_path)
+                assert_arrow_table_equals(
+                    loaded.table,
+                    make_table(
+                        make_column("A", [1], format="{:d}"), make_column("B", ["x"])
+                    ),
+                )
+
+    def test_load_from_arrow_file_uncompressed(self):
+        self._test_load_from_arrow_file("uncompressed")
+
+    def test_load_from_arrow_file_lz4(self):
+        self._test_load_from_arrow_file("lz4")
+
+    @override_settings(RENDERCACHE_ARROW_FORMAT="lz4")
+    def test_cache_and_load_many_record_batches(self):
+        table = pa.table(
+            [
+                pa.chunked_array([pa.array([1, 2]), pa.array([3])]),
+                pa.chunked_array([pa.array(["x", "y"]), pa.array([None])]),
+            ],
+            pa.schema(
+                [
+                    pa.field("A", pa.int64(), metadata={"format": "{:d}"}),
+                    pa.field("B", pa.string()),
+                ]
+            ),
+        )
+        with arrow_table_context(table) as (path, table):
+            result = LoadedRenderResult(
+                path=path,
+                table=table,
+                columns=[
+                    Column("A", ColumnType.Number(format="{:d}")),
+                    Column("B", ColumnType.Text()),
+                ],
+                errors=[],
+                json={},
+            )
+            cache_render_result(self.workflow, self.step, 1, result)
+        crr = self.step.cached_render_result
+        self.assertEqual(crr.table_metadata.n_rows, 3)
+        with tempfile_context() as arrow_path:
+            loaded = load_cached_render_result(crr, arrow_path)
+            self.assertEqual(loaded.table.column(0).num_chunks, 2)
+            assert_arrow_table_equals(
+                loaded.table,
+                make_table(
+                    make_column("A", [1, 2, 3], format="{:d}"),
+                    make_column("B", ["x", "y", None]),
+                ),
+            )
+
+    def test_load_without_arrow_file_falls_back_to_parquet(self):
+        with arrow_table_context(make_column("A", ["x"])) as (path, table):
+            result = LoadedRenderResult(
+                path=path,
+                table=table,
+                columns=[Column("A", ColumnType.Text())],
+                errors=[],
+                json={},
+            )
+            cache_render_result(self.workflow, self.step, 1, result)
+        crr = self.step.cached_render_result
+        with override_settings(RENDERCACHE_ARROW_FORMAT="lz4"):
+            with tempfile_context() as arrow_path:
+                loaded = load_cached_render_result(crr, arrow_path)
+                assert_arrow_table_equals(
+                    loaded.table, make_table(make_column("A", ["x"]))
+                )
+
+    @patch.object(cjwstate.rendercache.io, "PARQUET_ROW_GROUP_SIZE", 2)
+    def test_read_cached_render_result_slice(self):
+        with arrow_table_context(
+            make_column("A", [1, 2, 3, 4, 5]), make_column("B", list("abcde"))
+        ) as (path, table):
+            result = LoadedRenderResult(
+                path=path,
+                table=table,
+                columns=[
+                    Column("A", ColumnType.Number(format="{:,}")),
+                    Column("B", ColumnType.Text()),
+                ],
+                errors=[],
+                json={},
+            )
+            cache_render_result(self.workflow, self.step, 1, result)
+        crr = self.step.cached_render_result
+        # rows 1-3 span row groups [0, 1] and [2, 3]
+        assert_arrow_table_equals(
+            read_cached_render_result_slice(
+                crr, only_columns=range(1, 2), only_rows=range(1, 4)
+            ),
+            make_table(make_column("B", ["b", "c", "d"])),
+        )
+        # out-of-range rows give an empty table
+        self.assertEqual(
+            read_cached_render_result_slice(
+                crr, only_columns=range(0, 2), only_rows=range(10, 20)
+            ).num_rows,
+            0,
+        )
+
+    def test_read_cached_render_result_slice_missing_is_corrupt_cache_error(self):
+        with arrow_table_context(make_column("A", ["x"])) as (path, table):
+            result = LoadedRenderResult(
+                path=path,
+                table=table,
+                columns=[Column("A", ColumnType.Text())],
+                errors=[],
+                json={},
+            )
+            cache_render_result(self.workflow, self.step, 1, result)
+        crr = self.step.cached_render_result
+        s3.remove(BUCKET, crr_parquet_key(crr))
+        with self.assertRaises(CorruptCacheError):
+            read_cached_render_result_slice(
+                crr, only_columns=range(0, 1), only_rows=range(0, 1)
+            )
+
     def test_invalid_parquet_is_corrupt_cache_error(self):
         with arrow_table_context(make_column("A", ["x"])) as (path, table):
             result = LoadedRenderResult(
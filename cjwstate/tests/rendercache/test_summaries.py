@@ -0,0 +1,110 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+import pyarrow as pa
+from cjwmodule.arrow.testing import make_column, make_table
+
+from cjwkernel.types import Column, ColumnType
+from cjwstate.rendercache import summaries
+from cjwstate.rendercache.summaries import (
+    ColumnSummary,
+    summaries_from_json_bytes,
+    summaries_to_json_bytes,
+    summarize_table,
+)
+
+
+class SummarizeTableTests(unittest.TestCase):
+    def test_text_value_counts(self):
+        table = make_table(make_column("A", ["a", "b", None, "a"]))
+        self.assertEqual(
+            summarize_table(table, [Column("A", ColumnType.Text())]),
+            [ColumnSummary(n_nulls=1, value_counts={"a": 2, "b": 1})],
+        )
+
+    def test_text_dictionary_value_counts(self):
+        table = make_table(make_column("A", ["a", "b", "a"], dictionary=True))
+        self.assertEqual(
+            summarize_table(table, [Column("A", ColumnType.Text())]),
+            [ColumnSummary(n_nulls=0, value_counts={"a": 2, "b": 1})],
+        )
+
+    def test_text_value_counts_many_chunks(self):
+        table = pa.table(
+            {
+                "A": pa.chunked_array(
+                    [
+                        pa.array(["a", "b"]).dictionary_encode(),
+                        pa.array(["b", None, "c"]).dictionary_encode(),
+                    ]
+                )
+            }
+        )
+        self.assertEqual(
+            summarize_table(table, [Column("A", ColumnType.Text())]),
+            [ColumnSummary(n_nulls=1, value_counts={"a": 1, "b": 2, "c": 1})],
+        )
+
+    @patch.object(summaries, "MAX_VALUE_COUNTS", 2)
+    def test_text_too_many_values(self):
+        table = make_table(make_column("A", ["a", "b", "c"]))
+        self.assertEqual(
+            summarize_table(table, [Column("A", ColumnType.Text())]),
+            [ColumnSummary(n_nulls=0, value_counts=None)],
+        )
+
+    def test_number_min_max(self):
+        table = make_table(make_column("A", [3.5, None, -1.0]))
+        self.assertEqual(
+            summarize_table(table, [Column("A", ColumnType.Number())]),
+            [ColumnSummary(n_nulls=1, min=-1.0, max=3.5)],
+        )
+
+    def test_number_all_null(self):
+        table = pa.table({"A": pa.array([None], pa.int32())})
+        self.assertEqual(
+            summarize_table(table, [Column("A", ColumnType.Number())]),
+            [ColumnSummary(n_nulls=1)],
+        )
+
+    def test_date_and_timestamp_min_max(self):
+        table = make_table(
+            make_column(
+                "A",
+                [datetime.date(2021, 4, 1), datetime.date(2021, 1, 1)],
+                unit="month",
+            ),
+        ).append_column(
+            "B",
+            pa.array(
+                [datetime.datetime(2021, 4, 13, 1, 2, 3), None], pa.timestamp("ns")
+            ),
+        )
+        self.assertEqual(
+            summarize_table(
+                table,
+                [
+                    Column("A", ColumnType.Date("month")),
+                    Column("B", ColumnType.Timestamp()),
+                ],
+            ),
+            [
+                ColumnSummary(n_nulls=0, min="2021-01-01", max="2021-04-01"),
+                ColumnSummary(
+                    n_nulls=1, min="2021-04-13T01:02:03Z", max="2021-04-13T01:02:03Z"
+                ),
+            ],
+        )
+
+    def test_json_round_trip(self):
+        value = [
+            ColumnSummary(n_nulls=1, value_counts={"a": 2}),
+            ColumnSummary(n_nulls=0, min=1, max=2),
+        ]
+        self.assertEqual(
+            summaries_from_json_bytes(summaries_to_json_bytes(value)), value
+        )
+
+    def test_json_unknown_version(self):
+        self.assertIsNone(summaries_from_json_bytes(b'{"version":999,"columns":[]}'))
@@ -1,12 +1,69 @@
+import hashlib
+
 from django.test.utils import override_settings
 
 from cjwkernel.tests.util import tempfile_context
+from cjwstate import s3
 from cjwstate.models import Workflow
 from cjwstate.storedobjects.io import (
+    compute_hash,
     create_stored_object,
     delete_old_files_to_enforce_storage_limits,
+    downloaded_file,
 )
-from cjwstate.tests.utils import DbTestCase
+from cjwstate.tests.utils import DbTestCase, get_s3_object_with_data
+
+
+class CreateStoredObjectTests(DbTestCase):
+    def test_hash_and_content_addressed_key(self):
+        workflow = Workflow.create_and_init()
+        step = workflow.tabs.first().steps.create(order=1, module_id_name="x")
+
+        with tempfile_context() as path:
+            path.write_bytes(b"abc123")
+            self.assertEqual(compute_hash(path), hashlib.sha256(b"abc123").hexdigest())
+            so = create_stored_object(workflow.id, step.id, path)
+
+        self.assertEqual(so.hash, hashlib.sha256(b"abc123").hexdigest())
+        self.assertEqual(so.key, f"sha256/{so.hash}.dat")
+        self.assertEqual(so.size, 6)
+        self.assertEqual(
+            get_s3_object_with_data(s3.StoredObjectsBucket, so.key)["Body"],
+            b"abc123",
+        )
+        with downloaded_file(so) as path:
+            self.assertEqual(path.read_bytes(), b"abc123")
+
+    def test_share_file_across_workflows(self):
+        workflow1 = Workflow.create_and_init()
+        step1 = workflow1.tabs.first().steps.create(order=1, module_id_name="x")
+        workflow2 = Workflow.create_and_init()
+        step2 = workflow2.tabs.first().steps.create(order=1, module_id_name="x")
+
+        with tempfile_context() as path:
+            path.write_bytes(b"abc123")
+            so1 = create_stored_object(workflow1.id, step1.id, path)
+            so2 = create_stored_object(workflow2.id, step2.id, path)
+
+        self.assertEqual(so2.key, so1.key)
+        workflow1.delete()
+        # workflow2 still references the file
+        self.assertTrue(s3.exists(s3.StoredObjectsBucket, so1.key))
+        workflow2.delete()
+        self.assertFalse(s3.exists(s3.StoredObjectsBucket, so1.key))
+
+    def test_delete_many_sharing_a_file(self):
+        workflow = Workflow.create_and_init()
+        step = workflow.tabs.first().steps.create(order=1, module_id_name="x")
+
+        with tempfile_context() as path:
+            path.write_bytes(b"abc123")
+            so1 = create_stored_object(workflow.id, step.id, path)
+            create_stored_object(workflow.id, step.id, path)
+
+        # One QuerySet.delete() deletes both references
+        step.stored_objects.all().delete()
+        self.assertFalse(s3.exists(s3.StoredObjectsBucket, so1.key))
 
 
 class EnforceStorageLimitsTests(DbTestCase):
@@ -0,0 +1,75 @@
+import os
+import time
+import unittest
+
+from cjwkernel.util import tempdir_context, tempfile_context
+from cjwstate.diskcache import DiskCache
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self._tempdir_context = tempdir_context(prefix="test-diskcache-")
+        self.root = self._tempdir_context.__enter__()
+
+    def tearDown(self):
+        self._tempdir_context.__exit__(None, None, None)
+        super().tearDown()
+
+    def _put(self, cache: DiskCache, key: str, data: bytes) -> None:
+        with tempfile_context() as path:
+            path.write_bytes(data)
+            cache.put(key, path)
+
+    def _listdir(self):
+        return sorted(os.listdir(self.root / "cache"))
+
+    def test_miss(self):
+        cache = DiskCache("test", self.root / "cache", 100)
+        with cache.open("wf-1/wfm-2/delta-3.dat") as path:
+            self.assertIsNone(path)
+        self.assertEqual(cache.stats.n_misses, 1)
+
+    def test_hit(self):
+        cache = DiskCache("test", self.root / "cache", 100)
+        self._put(cache, "wf-1/wfm-2/delta-3.dat", b"12345")
+        with cache.open("wf-1/wfm-2/delta-3.dat") as path:
+            self.assertEqual(path.read_bytes(), b"12345")
+        self.assertEqual(cache.stats.n_hits, 1)
+        self.assertEqual(cache.stats.n_bytes_saved, 5)
+
+    def test_disabled(self):
+        cache = DiskCache("test", self.root / "cache", 0)
+        self._put(cache, "a", b"12345")
+        with cache.open("a") as path:
+            self.assertIsNone(path)
+
+    def test_ignore_file_larger_than_max_bytes(self):
+        cache = DiskCache("test", self.root / "cache", 4)
+        self._put(cache, "a", b"12345")
+        with cache.open("a") as path:
+            self.assertIsNone(path)
+
+    def test_evict_least_recently_used(self):
+        cache = DiskCache("test", self.root / "cache", 10)
+        self._put(cache, "a", b"12345")
+        time.sleep(0.01)  # mtime resolution
+        self._put(cache, "b", b"12345")
+        time.sleep(0.01)
+        with cache.open("a"):
+            pass  # "a" is now more recently used than "b"
+        time.sleep(0.01)
+        self._put(cache, "c", b"12345")
+        with cache.open("b") as path:
+            self.assertIsNone(path)
+        with cache.open("a") as path:
+            self.assertEqual(path.read_bytes(), b"12345")
+        self.assertEqual(cache.stats.n_evictions, 1)
+
+    def test_open_file_survives_eviction(self):
+        cache = DiskCache("test", self.root / "cache", 5)
+        self._put(cache, "a", b"12345")
+        with cache.open("a") as path:
+            self._put(cache, "b", b"67890")  # evicts "a"
+            self.assertEqual(path.read_bytes(), b"12345")
+        self.assertEqual(len(self._listdir()), 1)  # the "reading-" link is gone
@@ -1,7 +1,8 @@
 import logging
 from cjwkernel.errors import ModuleError
 from cjwstate.models import Workflow
-from cjwstate.params import get_migrated_params
+from cjwstate.models.module_registry import MODULE_REGISTRY
+from cjwstate.params import get_migrated_params, premigrate_params
 from cjwstate.tests.utils import (
     DbTestCaseWithModuleRegistryAndMockKernel,
     create_module_zipfile,
@@ -165,3 +166,77 @@ class GetMigratedParamsTest(DbTestCaseWithModuleRegistryAndMockKernel):
             step.cached_migrated_params_module_version, module_zipfile.version
         )
         # ... even though the Step does not exist in the database
+
+    def test_premigrate_batches_steps_of_each_module(self):
+        workflow = Workflow.create_and_init()
+        create_module_zipfile(
+            module_id="yay",
+            spec_kwargs={"parameters": [{"id_name": "foo", "type": "string"}]},
+        )
+        tab = workflow.tabs.first()
+        step1 = tab.steps.create(order=0, module_id_name="yay", params={"foo": "a"})
+        step2 = tab.steps.create(order=1, module_id_name="yay", params={"foo": "b"})
+
+        self.kernel.migrate_params.side_effect = lambda m, p: {"foo": p["foo"] * 2}
+        with self.assertLogs(level=logging.INFO):
+            premigrated = premigrate_params(
+                [step1, step2], MODULE_REGISTRY.all_latest()
+            )
+        self.kernel.migrate_params_batch.assert_called_once()
+
+        # get_migrated_params() uses the premigrated params: no kernel call
+        self.kernel.reset_mock()
+        self.assertEqual(
+            get_migrated_params(step1, premigrated=premigrated), {"foo": "aa"}
+        )
+        self.kernel.migrate_params.assert_not_called()
+        step1.refresh_from_db()
+        self.assertEqual(step1.cached_migrated_params, {"foo": "aa"})
+
+    def test_premigrate_ignored_if_params_changed(self):
+        workflow = Workflow.create_and_init()
+        create_module_zipfile(
+            module_id="yay",
+            spec_kwargs={"parameters": [{"id_name": "foo", "type": "string"}]},
+        )
+        step = workflow.tabs.first().steps.create(
+            order=0, module_id_name="yay", params={"foo": "a"}
+        )
+
+        self.kernel.migrate_params.side_effect = lambda m, p: {"foo": p["foo"] * 2}
+        with self.assertLogs(level=logging.INFO):
+            premigrated = premigrate_params([step], MODULE_REGISTRY.all_latest())
+
+        step.params = {"foo": "b"}  # another request edited the Step
+        with self.assertLogs(level=logging.INFO):
+            self.assertEqual(
+                get_migrated_params(step, premigrated=premigrated), {"foo": "bb"}
+            )
+
+    def test_premigrate_module_error(self):
+        workflow = Workflow.create_and_init()
+        create_module_zipfile(
+            module_id="yay",
+            spec_kwargs={"parameters": [{"id_name": "foo", "type": "string"}]},
+        )
+        tab = workflow.tabs.first()
+        step1 = tab.steps.create(order=0, module_id_name="yay", params={"foo": "a"})
+        step2 = tab.steps.create(order=1, module_id_name="yay", params={"foo": "b"})
+
+        def migrate_params(module, params):
+            if params["foo"] == "a":
+                raise ModuleError
+            return params
+
+        self.kernel.migrate_params.side_effect = migrate_params
+        with self.assertLogs(level=logging.INFO):
+            premigrated = premigrate_params(
+                [step1, step2], MODULE_REGISTRY.all_latest()
+            )
+
+        # The batch failed; premigrate_params() retried each Step on its own
+        with self.assertRaises(ModuleError):
+            get_migrated_params(step1, premigrated=premigrated)
+        self.assertEqual(
+            get_migrated_params(step2, premigrated=premigrated), {"foo": "b"}
+        )
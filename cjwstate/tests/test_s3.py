@@ -1,5 +1,10 @@
+import time
 import unittest
+from unittest.mock import patch
 
+from django.test import override_settings
+
+from cjwkernel.util import tempfile_context
 from cjwstate import s3
 
 Bucket = s3.CachedRenderResultsBucket
@@ -32,3 +37,104 @@ class TemporarilyDownloadTest(unittest.TestCase):
         with self.assertRaises(FileNotFoundError):
             with s3.temporarily_download(Bucket, Key) as _:
                 pass
+
+
+class RemoveManyTest(unittest.TestCase):
+    Keys = ["many/1", "many/2", "many/3"]
+
+    def setUp(self):
+        super().setUp()
+        for key in self.Keys:
+            s3.put_bytes(Bucket, key, b"x")
+
+    def tearDown(self):
+        for key in self.Keys:
+            s3.remove(Bucket, key)
+        super().tearDown()
+
+    def _assert_removed(self):
+        for key in self.Keys:
+            self.assertFalse(s3.exists(Bucket, key))
+
+    @override_settings(S3_MULTI_DELETE=False)
+    def test_one_request_per_key(self):
+        s3.remove_many(Bucket, self.Keys + ["many/does-not-exist"])
+        self._assert_removed()
+
+    @override_settings(S3_MULTI_DELETE=True)
+    def test_multi_delete(self):
+        s3.remove_many(Bucket, self.Keys + ["many/does-not-exist"])
+        self._assert_removed()
+
+    @override_settings(S3_MULTI_DELETE=False)
+    def test_error_waits_for_other_requests(self):
+        real_remove = s3.remove
+
+        def remove(bucket, key):
+            if key == "many/1":
+                raise RuntimeError("boom")
+            time.sleep(0.05)  # finish after "many/1" fails
+            real_remove(bucket, key)
+
+        with patch.object(s3, "remove", remove):
+            with self.assertRaisesRegex(RuntimeError, "boom"):
+                s3.remove_many(Bucket, self.Keys)
+        self.assertTrue(s3.exists(Bucket, "many/1"))
+        self.assertFalse(s3.exists(Bucket, "many/2"))
+        self.assertFalse(s3.exists(Bucket, "many/3"))
+
+    def test_no_keys(self):
+        s3.remove_many(Bucket, [])  # no error
+
+    def test_in_background(self):
+        s3.remove_many_in_background(Bucket, self.Keys).result(timeout=10)
+        self._assert_removed()
+
+    def test_remove_recursive(self):
+        s3.remove_recursive(Bucket, "many/")
+        self._assert_removed()
+
+
+class ReadRangeTest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        _put(b"0123456789")
+
+    def tearDown(self):
+        _clear()
+        super().tearDown()
+
+    def test_read_range(self):
+        self.assertEqual(s3.read_range(Bucket, Key, 2, 5), b"234")
+
+    def test_range_file(self):
+        with s3.RangeFile(Bucket, Key, block_size=4) as f:
+            f.seek(3)
+            self.assertEqual(f.read(4), b"3456")
+            self.assertEqual(f.read(), b"789")
+
+    def test_measure(self):
+        n_operations = s3.layer.stats["read_range"].n_operations
+        n_bytes = s3.layer.stats["read_range"].n_bytes
+        s3.read_range(Bucket, Key, 2, 5)
+        self.assertEqual(s3.layer.stats["read_range"].n_operations, n_operations + 1)
+        self.assertEqual(s3.layer.stats["read_range"].n_bytes, n_bytes + 3)
+
+
+class MultipartUploadTest(unittest.TestCase):
+    def tearDown(self):
+        _clear()
+        super().tearDown()
+
+    @override_settings(
+        S3_MULTIPART_UPLOAD=True, S3_MULTIPART_CHUNK_SIZE=5 * 1024 * 1024
+    )
+    def test_multipart_upload(self):
+        data = bytes(range(256)) * (11 * 1024 * 1024 // 256)  # 3 parts
+        with patch.object(s3, "layer", s3.Layer()):  # new uploader config
+            with tempfile_context() as path:
+                path.write_bytes(data)
+                s3.fput_file(Bucket, Key, path)
+            with s3.temporarily_download(Bucket, Key) as path:
+                self.assertEqual(path.read_bytes(), data)
+            self.assertEqual(s3.layer.stats["upload"].n_bytes, len(data))
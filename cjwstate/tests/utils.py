@@ -59,6 +59,11 @@ class DbTestCaseWithModuleRegistryAndMockKernel(DbTestCase):
         # `self.kernel.migrate_params.side_effect = lambda m, p: p`, then
         # callers couldn't use `self.kernel.migrate_params.return_value = ...`
         self.kernel.migrate_params.return_value = {}
+        # migrate_params_batch() calls the mock migrate_params(), so tests that
+        # configure migrate_params() need not care which one is invoked.
+        self.kernel.migrate_params_batch.side_effect = lambda m, params_list: [
+            self.kernel.migrate_params(m, params) for params in params_list
+        ]
         # No default implementation of self.kernel.fetch
         # No default implementation of self.kernel.render
 
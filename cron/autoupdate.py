@@ -1,71 +1,105 @@
+import asyncio
 import datetime
 import logging
-from typing import List, Tuple
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
-from cjworkbench.pg_render_locker import PgRenderLocker, WorkflowAlreadyLocked
+from django.db import connection
+
+from cjworkbench.pg_render_locker import RenderLockKey
 from cjworkbench.sync import database_sync_to_async
 from cjwstate import clientside, rabbitmq
-from cjwstate.models import Step
 
 
 logger = logging.getLogger(__name__)
 
 
-@database_sync_to_async
-def load_pending_steps() -> List[Tuple[int, Step]]:
-    """Return list of (workflow_id, step_id) with pending fetches."""
-    now = datetime.datetime.now()
-    # Step.workflow_id is a database operation
-    return list(
-        Step.objects.filter(
-            is_deleted=False,
-            tab__is_deleted=False,
-            is_busy=False,  # not already scheduled
-            auto_update_data=True,  # user wants auto-update
-            next_update__isnull=False,  # DB isn't inconsistent
-            next_update__lte=now,  # enough time has passed
-        ).values_list("tab__workflow_id", "id")
-    )
+DueJitter = 60  # seconds
+"""Delay each Step's due time by `step.id % DueJitter` seconds.
+
+Users tend to pick round update times, so at the top of each minute thousands
+of Steps fall due at once. With this jitter, cron picks each Step up on a
+different tick (cron ticks several times per `DueJitter`). A Step's jitter
+never changes, so neither does its update interval.
+"""
 
 
 @database_sync_to_async
-def set_step_busy(step_id):
-    # Database writes can't be on the event-loop thread
-    Step.objects.filter(id=step_id).update(is_busy=True)
+def mark_pending_steps_busy(now: datetime.datetime) -> List[Tuple[int, int]]:
+    """Set is_busy=True on Steps that need a fetch; return their IDs.
+
+    Return list of (workflow_id, step_id).
+
+    This is a single UPDATE, so two concurrent callers can't both claim a
+    Step. Skip workflows that are rendering right now. (That's a heuristic:
+    it gives renderers a chance to tackle some backlog before we queue more
+    work. It doesn't solve any races.)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE step
+            SET is_busy = TRUE
+            FROM tab
+            WHERE step.tab_id = tab.id
+              AND NOT tab.is_deleted
+              AND NOT step.is_deleted
+              AND NOT step.is_busy -- not already scheduled
+              AND step.auto_update_data -- user wants auto-update
+              AND step.next_update IS NOT NULL -- DB isn't inconsistent
+              AND step.next_update <= %(now)s -- lets us use pending_update_queue index
+              AND step.next_update + (step.id %% %(due_jitter)s) * INTERVAL '1 second'
+                  <= %(now)s -- enough time has passed, with jitter
+              AND NOT EXISTS (
+                -- PgRenderLocker's render lock: pg_advisory_lock(key, workflow_id)
+                SELECT 1
+                FROM pg_locks
+                WHERE locktype = 'advisory'
+                  AND classid = %(render_lock_key)s
+                  AND objid::BIGINT = tab.workflow_id
+                  AND objsubid = 2
+                  AND granted
+              )
+            RETURNING tab.workflow_id, step.id
+            """,
+            dict(due_jitter=DueJitter, now=now, render_lock_key=RenderLockKey),
+        )
+        return cursor.fetchall()
 
 
-async def queue_fetches(pg_render_locker: PgRenderLocker):
+async def queue_fetches() -> None:
     """Queue all pending fetches in RabbitMQ.
 
-    We'll set is_busy=True as we queue them, so we don't send double-fetches.
+    We set is_busy=True on all of them at once, so we don't send
+    double-fetches. Then we publish all messages at once, without waiting for
+    each to be confirmed before sending the next.
     """
-    pending_ids = await load_pending_steps()
+    pending_ids = await mark_pending_steps_busy(datetime.datetime.now())
+    if not pending_ids:
+        return
 
+    step_ids_by_workflow: Dict[int, List[int]] = defaultdict(list)
     for workflow_id, step_id in pending_ids:
-        # Don't schedule a fetch if we're currently rendering.
-        #
-        # This still lets us schedule a fetch if a render is _queued_, so it
-        # doesn't solve any races. But it should lower the number of fetches of
-        # resource-intensive workflows.
-        #
-        # Using pg_render_locker means we can only queue a fetch _between_
-        # renders. The fetch/render queues may be non-empty (we aren't
-        # checking); but we're giving the renderers a chance to tackle some
-        # backlog.
-        try:
-            async with pg_render_locker.render_lock(workflow_id) as lock:
-                # At this moment, the workflow isn't rendering. Let's pass
-                # through and queue the fetch.
-                await lock.stall_others()  # required by the PgRenderLocker API
-
-            logger.info("Queue fetch of step(%d, %d)", workflow_id, step_id)
-            await set_step_busy(step_id)
-            await rabbitmq.send_update_to_workflow_clients(
+        logger.info("Queue fetch of step(%d, %d)", workflow_id, step_id)
+        step_ids_by_workflow[workflow_id].append(step_id)
+
+    await asyncio.gather(
+        *(
+            rabbitmq.send_update_to_workflow_clients(
                 workflow_id,
-                clientside.Update(steps={step_id: clientside.StepUpdate(is_busy=True)}),
+                clientside.Update(
+                    steps={
+                        step_id: clientside.StepUpdate(is_busy=True)
+                        for step_id in step_ids
+                    }
+                ),
             )
-            await rabbitmq.queue_fetch(workflow_id, step_id)
-        except WorkflowAlreadyLocked:
-            # Don't queue a fetch. We'll revisit this Step next time we
-            # query for pending fetches.
-            pass
+            for workflow_id, step_ids in step_ids_by_workflow.items()
+        )
+    )
+    await asyncio.gather(
+        *(
+            rabbitmq.queue_fetch(workflow_id, step_id)
+            for workflow_id, step_id in pending_ids
+        )
+    )
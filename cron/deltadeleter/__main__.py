@@ -1,7 +1,7 @@
 import datetime
 import logging
 import time
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import django
 import django.db
@@ -12,7 +12,9 @@ from cjworkbench.util import benchmark_sync
 
 logger = logging.getLogger(__name__)
 
-MaxNWorkflowsPerCycle = 5000  # SQL LIMIT to avoid too-big query results
+MaxNWorkflowsPerCycle = 5000  # Workflows to clean per cycle, at most
+MaxNWorkflowsScannedPerCycle = 200000  # Workflows to look at per cycle, at most
+ScanBatchSize = 10000  # Workflows to look at per query
 Interval = 300  # seconds
 MaxAge = datetime.timedelta(days=30)
 
@@ -57,17 +59,13 @@ def delete_workflow_stale_deltas(
                 # Set the first delta's prev_delta_id to NULL. (The foreign-key
                 # constraint is DEFERRABLE INITIALLY DEFERRED.)
                 cursor.execute(
-                    # Hack around Work around Postgres picking the wrong index.
-                    # [2021-02-02] on production the inner SELECT chose the
-                    # delta.id index (id IS NOT NULL) instead of the
-                    # delta.workflow_id index (workflow_id = X). Maybe VACUUM
-                    # would fix this? Meh. "+ 0" disqualifies the delta.id
-                    # index, forcing a better choice.
+                    # delta_workflow_id_id (workflow_id, id) answers MIN(id)
+                    # with a single index lookup.
                     """
                     UPDATE delta
                     SET prev_delta_id = NULL
                     WHERE id = (
-                        SELECT MIN(id + 0) FROM delta WHERE workflow_id = %(workflow_id)s
+                        SELECT MIN(id) FROM delta WHERE workflow_id = %(workflow_id)s
                     )
                     """,
                     dict(workflow_id=workflow_id),
@@ -77,10 +75,44 @@ def delete_workflow_stale_deltas(
         pass  # Race: I guess there aren't any deltas after all.
 
 
+def find_scan_end(after_workflow_id: int, n_workflows: int) -> Optional[int]:
+    """Return the ID of the `n_workflows`-th Workflow after `after_workflow_id`.
+
+    If there are fewer than `n_workflows` Workflows left, return the last ID.
+    If there are none, return `None`.
+    """
+    with django.db.connections["default"].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT MAX(id)
+            FROM (
+                SELECT id
+                FROM workflow
+                WHERE id > %(after_workflow_id)s
+                ORDER BY id
+                LIMIT %(n_workflows)s
+            ) t
+            """,
+            dict(after_workflow_id=after_workflow_id, n_workflows=n_workflows),
+        )
+        return cursor.fetchone()[0]
+
+
 def find_workflows_with_stale_deltas(
     now: datetime.datetime,
+    *,
+    after_workflow_id: int = 0,
+    last_workflow_id: Optional[int] = None,
 ) -> List[Tuple[int, datetime.datetime]]:
-    """Query for (workflow_id, min_last_applied_at) pairs."""
+    """Query for (workflow_id, min_last_applied_at) pairs, ordered by ID.
+
+    Only consider Workflows with `after_workflow_id < id <= last_workflow_id`
+    (or, if `last_workflow_id` is `None`, with `id > after_workflow_id`).
+
+    This reads the `workflow` table in ID order and probes each Workflow's
+    Deltas through `index_delta_for_stale_scan`. Its cost depends on the
+    number of Workflows in the range, not the number of Deltas.
+    """
     # import _after_ django.setup() initializes apps
     from cjworkbench.models.userlimits import UserLimits
 
@@ -97,63 +129,93 @@ def find_workflows_with_stale_deltas(
                 INNER JOIN product ON product.id = price.product_id
                 GROUP BY subscription.user_id
             ),
-            workflow_ids AS (
-                -- Reify as a CTE so when we join with the `workflow` table we
-                -- only join one row per ID (instead of one row per delta)
-                SELECT workflow_id, MIN(last_applied_at) AS min_last_applied_at
+            workflow_limits AS (
+                SELECT
+                    workflow.id AS workflow_id,
+                    %(now)s - MAKE_INTERVAL(days => GREATEST(
+                        user_limits.max_delta_age_in_days,
+                        %(default_max_delta_age_in_days)s
+                    )) AS min_last_applied_at
+                FROM workflow
+                LEFT JOIN user_limits ON user_limits.user_id = workflow.owner_id
+                WHERE workflow.id > %(after_workflow_id)s
+                  AND (%(last_workflow_id)s IS NULL OR workflow.id <= %(last_workflow_id)s)
+            )
+            SELECT workflow_id, min_last_applied_at
+            FROM workflow_limits
+            WHERE EXISTS (
+                SELECT 1
                 FROM delta
-                GROUP BY workflow_id
+                WHERE delta.workflow_id = workflow_limits.workflow_id
+                  AND delta.last_applied_at < workflow_limits.min_last_applied_at
             )
-            SELECT
-                workflow_ids.workflow_id,
-                %(now)s - MAKE_INTERVAL(days => GREATEST(
-                    user_limits.max_delta_age_in_days, %(default_max_delta_age_in_days)s
-                )) AS min_last_applied_at
-            FROM workflow_ids
-            INNER JOIN workflow ON workflow.id = workflow_ids.workflow_id
-            LEFT JOIN user_limits ON user_limits.user_id = workflow.owner_id
-            WHERE workflow_ids.min_last_applied_at < %(now)s - MAKE_INTERVAL(days => GREATEST(
-                user_limits.max_delta_age_in_days, %(default_max_delta_age_in_days)s
-            ))
-            LIMIT %(limit)s
+            ORDER BY workflow_id
             """,
             dict(
                 now=now,
                 default_max_delta_age_in_days=UserLimits.free_user_limits().max_delta_age_in_days,
-                limit=MaxNWorkflowsPerCycle,
+                after_workflow_id=after_workflow_id,
+                last_workflow_id=last_workflow_id,
             ),
         )
         return [
             (workflow_id, min_last_applied_at.replace(tzinfo=None))
-            for workflow_id, min_last_applied_at in cursor.fetchmany(
-                MaxNWorkflowsPerCycle
-            )
+            for workflow_id, min_last_applied_at in cursor.fetchall()
         ]
 
 
-def delete_stale_deltas(now: datetime.datetime) -> None:
-    """Delete old Deltas.
+def delete_stale_deltas(now: datetime.datetime, after_workflow_id: int = 0) -> int:
+    """Delete old Deltas, resuming the scan after `after_workflow_id`.
 
     Rationale: we want a way to deprecate and then delete bad Commands; and we
     want to speed up database queries by nixing unused data.
+
+    Each call scans at most MaxNWorkflowsScannedPerCycle Workflows and cleans
+    at most MaxNWorkflowsPerCycle of them. Return the ID to pass as
+    `after_workflow_id` next time: `0` once we've scanned every Workflow.
     """
-    with benchmark_sync(logger, "Finding workflows with old deltas"):
-        todo = find_workflows_with_stale_deltas(now)
+    n_scanned = 0
+    n_cleaned = 0
+    while n_scanned < MaxNWorkflowsScannedPerCycle:
+        last_workflow_id = find_scan_end(after_workflow_id, ScanBatchSize)
+        if last_workflow_id is None:
+            logger.info("Finished scanning all workflows for old deltas")
+            return 0  # start over next cycle
+
+        with benchmark_sync(
+            logger,
+            "Finding workflows with old deltas in (%d, %d]",
+            after_workflow_id,
+            last_workflow_id,
+        ):
+            todo = find_workflows_with_stale_deltas(
+                now,
+                after_workflow_id=after_workflow_id,
+                last_workflow_id=last_workflow_id,
+            )
 
-    with benchmark_sync(logger, "Deleting old deltas"):
         for workflow_id, min_last_applied_at in todo:
+            if n_cleaned >= MaxNWorkflowsPerCycle:
+                return workflow_id - 1  # resume here next cycle
             with benchmark_sync(
                 logger, "Deleting old deltas on Workflow %d", workflow_id
             ):
-                delete_workflow_stale_deltas(
-                    workflow_id, min_last_applied_at.replace(tzinfo=None)
-                )
+                delete_workflow_stale_deltas(workflow_id, min_last_applied_at)
+            n_cleaned += 1
+
+        n_scanned += ScanBatchSize
+        after_workflow_id = last_workflow_id
+    return after_workflow_id
 
 
 if __name__ == "__main__":
     django.setup()
 
+    after_workflow_id = 0
     while True:
         django.db.close_old_connections()
-        delete_stale_deltas(datetime.datetime.now())
+        with benchmark_sync(logger, "Deleting old deltas"):
+            after_workflow_id = delete_stale_deltas(
+                datetime.datetime.now(), after_workflow_id
+            )
         time.sleep(Interval)
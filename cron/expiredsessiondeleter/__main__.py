@@ -3,9 +3,9 @@ import time
 
 import django
 import django.db
-from django.conf import settings
 
 from cjworkbench.util import benchmark_sync
+from cron.workflowdeleter import delete_workflows
 
 
 logger = logging.getLogger(__name__)
@@ -30,23 +30,24 @@ def delete_expired_sessions_and_workflows() -> None:
     # import _after_ django.setup() initializes apps
     from django.contrib.sessions.backends.db import SessionStore
     from django.contrib.sessions.models import Session
+    from django.db.models import Exists, OuterRef
     from cjwstate.models import Workflow
 
     SessionStore.clear_expired()
 
-    active_session_keys = Session.objects.all().values_list("session_key", flat=True)
     # TODO fix race here: new workflows created right now will be deleted
     # immediately. (DB Transactions don't prevent this race.)
-    workflows = list(
-        Workflow.objects.filter(owner__isnull=True).exclude(
-            anonymous_owner_session_key__in=active_session_keys
+    def find_workflows():
+        # Anti-join: let the database compare against the (huge) session table
+        return Workflow.objects.filter(owner__isnull=True).exclude(
+            Exists(
+                Session.objects.filter(
+                    session_key=OuterRef("anonymous_owner_session_key")
+                )
+            )
         )
-    )
 
-    for workflow in workflows:
-        with workflow.cooperative_lock():
-            logger.info("Deleting workflow %d", workflow.id)
-            workflow.delete()
+    delete_workflows(find_workflows, logger)
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ import django
 import django.db
 
 from cjworkbench.util import benchmark_sync
+from cron.workflowdeleter import delete_workflows
 
 
 LessonFreshDuration = 30 * 86400  # seconds
@@ -21,23 +22,13 @@ def delete_stale_lesson_workflows() -> None:
 
     now = datetime.datetime.now()
     expire_date = now - timedelta(seconds=LessonFreshDuration)
-    to_delete = list(
-        Workflow.objects.filter(
+    delete_workflows(
+        lambda: Workflow.objects.filter(
             lesson_slug__isnull=False, last_viewed_at__lt=expire_date
-        ).values_list("id", flat=True)
+        ),
+        logger,
     )
 
-    for workflow_id in to_delete:
-        try:
-            with Workflow.lookup_and_cooperative_lock(id=workflow_id) as workflow:
-                logger.info("Deleting workflow %d", workflow_id)
-                workflow.delete()
-        except Workflow.DoesNotExist:
-            logger.info(
-                "Tried to delete workflow %d, but it was deleted before we could",
-                workflow_id,
-            )
-
 
 if __name__ == "__main__":
     django.setup()
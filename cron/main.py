@@ -3,14 +3,13 @@ import logging
 import math
 import time
 
-from cjworkbench.pg_render_locker import PgRenderLocker
 from cjworkbench.util import benchmark
 
 
 logger = logging.getLogger(__name__)
 
 
-FetchInterval = 60  # seconds
+FetchInterval = 10  # seconds -- several ticks per autoupdate.DueJitter
 
 
 async def main():
@@ -22,18 +21,18 @@ async def main():
     from cjwstate import rabbitmq
     from cjwstate.rabbitmq.connection import open_global_connection
 
-    async with PgRenderLocker() as pg_render_locker, open_global_connection() as rabbitmq_connection:
+    async with open_global_connection() as rabbitmq_connection:
         await rabbitmq_connection.exchange_declare(rabbitmq.GroupsExchange)
         await rabbitmq_connection.queue_declare(rabbitmq.Fetch, durable=True)
 
         while not rabbitmq_connection.closed.done():
             t1 = time.time()
 
-            await benchmark(logger, queue_fetches(pg_render_locker), "queue_fetches()")
+            await benchmark(logger, queue_fetches(), "queue_fetches()")
 
-            # Try to fetch at the beginning of each interval. Canonical example
-            # is FetchInterval=60: queue all our fetches as soon as the minute
-            # hand of the clock moves.
+            # Try to fetch at the beginning of each interval. (queue_fetches()
+            # jitters Steps' due times, so each tick queues a fraction of the
+            # Steps that users scheduled "on the minute".)
 
             next_t = (math.floor(t1 / FetchInterval) + 1) * FetchInterval
             delay = max(0, next_t - time.time())
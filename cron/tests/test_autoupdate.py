@@ -1,10 +1,10 @@
-import asyncio
 import logging
-from contextlib import asynccontextmanager
+from datetime import timedelta
 from unittest.mock import patch
 
-from freezegun import freeze_time
 from dateutil import parser
+from django.db import connection
+from freezegun import freeze_time
 
 from cjwstate import rabbitmq
 from cjwstate.models import Workflow
@@ -12,33 +12,13 @@ from cjwstate.tests.utils import DbTestCase
 from cron import autoupdate
 
 
-future_none = asyncio.Future()
-future_none.set_result(None)
-
-
-class _RenderLock:
-    def __init__(self):
-        self.stalled = False
-
-    async def stall_others(self):
-        self.stalled = True
-
-
-class SuccessfulRenderLock:
-    @asynccontextmanager
-    async def render_lock(self, workflow_id: int):
-        lock = _RenderLock()
-        try:
-            yield lock
-        finally:
-            assert lock.stalled
+async def async_noop(*args, **kwargs):
+    pass
 
 
 class UpdatesTests(DbTestCase):
     @patch.object(rabbitmq, "queue_fetch")
-    @patch.object(
-        rabbitmq, "send_update_to_workflow_clients", lambda _1, _2: future_none
-    )
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", async_noop)
     def test_queue_fetches(self, mock_queue_fetch):
         workflow = Workflow.objects.create()
         tab = workflow.tabs.create(position=0)
@@ -66,12 +46,12 @@ class UpdatesTests(DbTestCase):
             update_interval=1200,
         )
 
-        mock_queue_fetch.return_value = future_none
+        mock_queue_fetch.side_effect = async_noop
 
         with freeze_time("1999-08-28T14:35"):
             # eat log messages
             with self.assertLogs(autoupdate.__name__, logging.INFO):
-                self.run_with_async_db(autoupdate.queue_fetches(SuccessfulRenderLock()))
+                self.run_with_async_db(autoupdate.queue_fetches())
 
         self.assertEqual(mock_queue_fetch.call_count, 1)
         mock_queue_fetch.assert_called_with(workflow.id, step2.id)
@@ -81,6 +61,109 @@ class UpdatesTests(DbTestCase):
 
         # Second call shouldn't fetch again, because it's busy
         with freeze_time("1999-08-28T14:36"):
-            self.run_with_async_db(autoupdate.queue_fetches(SuccessfulRenderLock()))
+            self.run_with_async_db(autoupdate.queue_fetches())
 
         self.assertEqual(mock_queue_fetch.call_count, 1)
+
+    @patch.object(rabbitmq, "queue_fetch")
+    @patch.object(rabbitmq, "send_update_to_workflow_clients")
+    def test_queue_fetches_batch_updates_per_workflow(
+        self, mock_send_update, mock_queue_fetch
+    ):
+        mock_send_update.side_effect = async_noop
+        mock_queue_fetch.side_effect = async_noop
+        workflow = Workflow.objects.create()
+        tab = workflow.tabs.create(position=0)
+        step1, step2 = [
+            tab.steps.create(
+                order=i,
+                slug="step-%d" % i,
+                auto_update_data=True,
+                next_update=parser.parse("1999-08-28T14:30"),
+                update_interval=600,
+            )
+            for i in range(2)
+        ]
+
+        with freeze_time("1999-08-28T14:35"):
+            with self.assertLogs(autoupdate.__name__, logging.INFO):
+                self.run_with_async_db(autoupdate.queue_fetches())
+
+        self.assertEqual(mock_queue_fetch.call_count, 2)
+        mock_send_update.assert_called_once()
+        self.assertEqual(
+            set(mock_send_update.call_args[0][1].steps.keys()), {step1.id, step2.id}
+        )
+
+    @patch.object(rabbitmq, "queue_fetch")
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", async_noop)
+    def test_queue_fetches_jitter(self, mock_queue_fetch):
+        mock_queue_fetch.side_effect = async_noop
+        workflow = Workflow.objects.create()
+        tab = workflow.tabs.create(position=0)
+        step = tab.steps.create(
+            order=0,
+            slug="step-1",
+            auto_update_data=True,
+            next_update=parser.parse("1999-08-28T14:35"),
+            update_interval=600,
+        )
+        jitter = step.id % autoupdate.DueJitter
+
+        with freeze_time(
+            parser.parse("1999-08-28T14:35") + timedelta(seconds=jitter - 1)
+        ):
+            self.run_with_async_db(autoupdate.queue_fetches())
+        mock_queue_fetch.assert_not_called()
+
+        with freeze_time(parser.parse("1999-08-28T14:35") + timedelta(seconds=jitter)):
+            with self.assertLogs(autoupdate.__name__, logging.INFO):
+                self.run_with_async_db(autoupdate.queue_fetches())
+        mock_queue_fetch.assert_called_with(workflow.id, step.id)
+
+    @patch.object(rabbitmq, "queue_fetch")
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", async_noop)
+    def test_queue_fetches_skip_not_yet_due(self, mock_queue_fetch):
+        mock_queue_fetch.side_effect = async_noop
+        workflow = Workflow.objects.create()
+        tab = workflow.tabs.create(position=0)
+        step = tab.steps.create(
+            order=0,
+            slug="step-1",
+            auto_update_data=True,
+            next_update=parser.parse("1999-08-28T14:35:01"),
+            update_interval=600,
+        )
+
+        with freeze_time("1999-08-28T14:35"):
+            self.run_with_async_db(autoupdate.queue_fetches())
+
+        mock_queue_fetch.assert_not_called()
+        step.refresh_from_db()
+        self.assertFalse(step.is_busy)
+
+    @patch.object(rabbitmq, "queue_fetch")
+    def test_queue_fetches_skip_rendering_workflow(self, mock_queue_fetch):
+        workflow = Workflow.objects.create()
+        tab = workflow.tabs.create(position=0)
+        step = tab.steps.create(
+            order=0,
+            slug="step-1",
+            auto_update_data=True,
+            next_update=parser.parse("1999-08-28T14:30"),
+            update_interval=600,
+        )
+
+        # Mimic PgRenderLocker.render_lock()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(2, %s)", [workflow.id])
+        try:
+            with freeze_time("1999-08-28T14:35"):
+                self.run_with_async_db(autoupdate.queue_fetches())
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(2, %s)", [workflow.id])
+
+        mock_queue_fetch.assert_not_called()
+        step.refresh_from_db()
+        self.assertFalse(step.is_busy)
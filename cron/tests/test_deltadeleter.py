@@ -1,5 +1,7 @@
 import datetime
+import logging
 from typing import Optional
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from freezegun import freeze_time
@@ -22,8 +24,10 @@ from cjwstate.tests.utils import (
 )
 from cjworkbench.tests.utils import DbTestCase
 
+import cron.deltadeleter.__main__ as deltadeleter
 from cron.deltadeleter.__main__ import (
     delete_workflow_stale_deltas,
+    find_scan_end,
     find_workflows_with_stale_deltas,
 )
 
@@ -349,3 +353,56 @@ class FindWorkflowsWithStaleDeltasTest(DbTestCase):
     def test_find_empty_list(self):
         now = datetime.datetime(2021, 2, 3)
         self.assertEqual(find_workflows_with_stale_deltas(now), [])
+
+    def test_find_within_workflow_id_range(self):
+        with freeze_time("1970-01-01"):
+            workflow1 = Workflow.create_and_init()
+            do(SetWorkflowTitle, workflow1.id, new_value="1")
+            workflow2 = Workflow.create_and_init()
+            do(SetWorkflowTitle, workflow2.id, new_value="1")
+            workflow3 = Workflow.create_and_init()
+            do(SetWorkflowTitle, workflow3.id, new_value="1")
+
+        now = datetime.datetime(2021, 2, 3)
+        result = find_workflows_with_stale_deltas(
+            now, after_workflow_id=workflow1.id, last_workflow_id=workflow2.id
+        )
+        self.assertEqual([workflow_id for workflow_id, _ in result], [workflow2.id])
+
+    def test_find_scan_end(self):
+        workflow1 = Workflow.create_and_init()
+        workflow2 = Workflow.create_and_init()
+        self.assertEqual(find_scan_end(0, 1), workflow1.id)
+        self.assertEqual(find_scan_end(workflow1.id, 5), workflow2.id)
+        self.assertIsNone(find_scan_end(workflow2.id, 5))
+
+
+class DeleteStaleDeltasTest(DbTestCase):
+    def _create_workflow_with_stale_delta(self) -> Workflow:
+        workflow = Workflow.create_and_init()
+        with freeze_time("1970-01-01"):
+            do(SetWorkflowTitle, workflow.id, new_value="1")
+        return workflow
+
+    def test_delete_and_wrap_around(self):
+        workflow = self._create_workflow_with_stale_delta()
+        with self.assertLogs(deltadeleter.__name__, logging.INFO):
+            after_workflow_id = deltadeleter.delete_stale_deltas(
+                datetime.datetime(2021, 2, 3)
+            )
+        self.assertEqual(after_workflow_id, 0)  # scanned everything
+        self.assertEqual(workflow.deltas.count(), 0)
+
+    @patch.object(deltadeleter, "MaxNWorkflowsPerCycle", 1)
+    def test_resume_after_max_n_workflows_per_cycle(self):
+        workflow1 = self._create_workflow_with_stale_delta()
+        workflow2 = self._create_workflow_with_stale_delta()
+        now = datetime.datetime(2021, 2, 3)
+        with self.assertLogs(deltadeleter.__name__, logging.INFO):
+            after_workflow_id = deltadeleter.delete_stale_deltas(now)
+        self.assertEqual(workflow1.deltas.count(), 0)
+        self.assertEqual(workflow2.deltas.count(), 1)
+
+        with self.assertLogs(deltadeleter.__name__, logging.INFO):
+            deltadeleter.delete_stale_deltas(now, after_workflow_id)
+        self.assertEqual(workflow2.deltas.count(), 0)
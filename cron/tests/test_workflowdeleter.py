@@ -0,0 +1,71 @@
+import logging
+
+from cjwkernel.util import tempfile_context
+from cjwstate import s3
+from cjwstate.models import Workflow
+from cjwstate.storedobjects import compute_hash, create_stored_object
+from cjwstate.tests.utils import DbTestCase
+from cron.workflowdeleter import delete_workflows
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteWorkflowsTest(DbTestCase):
+    def _find_doomed(self):
+        return Workflow.objects.filter(name="doomed")
+
+    def test_delete_in_batches(self):
+        for _ in range(5):
+            Workflow.create_and_init(name="doomed")
+        survivor = Workflow.create_and_init(name="survivor")
+
+        with self.assertLogs(__name__, logging.INFO):
+            n_deleted = delete_workflows(self._find_doomed, logger, batch_size=2)
+
+        self.assertEqual(n_deleted, 5)
+        self.assertEqual(
+            list(Workflow.objects.values_list("id", flat=True)), [survivor.id]
+        )
+
+    def test_no_workflows(self):
+        self.assertEqual(delete_workflows(self._find_doomed, logger), 0)
+
+    def test_delete_s3_prefixes(self):
+        workflow = Workflow.create_and_init(name="doomed")
+        step = workflow.tabs.first().steps.create(order=0, slug="step-1")
+        s3.put_bytes(s3.UserFilesBucket, f"wf-{workflow.id}/wfm-{step.id}/x", b"x")
+        s3.put_bytes(
+            s3.CachedRenderResultsBucket, f"wf-{workflow.id}/wfm-{step.id}/x", b"x"
+        )
+
+        with self.assertLogs(__name__, logging.INFO):
+            delete_workflows(self._find_doomed, logger)
+
+        # delete_workflows() waits for background deletes before returning
+        self.assertFalse(
+            s3.exists(s3.UserFilesBucket, f"wf-{workflow.id}/wfm-{step.id}/x")
+        )
+        self.assertFalse(
+            s3.exists(s3.CachedRenderResultsBucket, f"wf-{workflow.id}/wfm-{step.id}/x")
+        )
+
+    def test_keep_stored_object_file_shared_with_survivor(self):
+        doomed = Workflow.create_and_init(name="doomed")
+        doomed_step = doomed.tabs.first().steps.create(order=0, slug="step-1")
+        survivor = Workflow.create_and_init(name="survivor")
+        survivor_step = survivor.tabs.first().steps.create(order=0, slug="step-1")
+        with tempfile_context() as path:
+            path.write_bytes(b"shared")
+            content_hash = compute_hash(path)
+            create_stored_object(
+                doomed.id, doomed_step.id, path, content_hash=content_hash
+            )
+            stored_object = create_stored_object(
+                survivor.id, survivor_step.id, path, content_hash=content_hash
+            )
+
+        with self.assertLogs(__name__, logging.INFO):
+            delete_workflows(self._find_doomed, logger)
+
+        self.assertTrue(s3.exists(s3.StoredObjectsBucket, stored_object.key))
@@ -0,0 +1,92 @@
+import concurrent.futures
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+
+BatchSize = 100  # workflows per transaction
+
+
+def _s3_prefixes(workflow_id: int) -> List[Tuple[str, str]]:
+    from cjwstate import s3
+
+    return [
+        (s3.StoredObjectsBucket, f"{workflow_id}/"),
+        (s3.UserFilesBucket, f"wf-{workflow_id}/"),
+        (s3.CachedRenderResultsBucket, f"wf-{workflow_id}/"),
+    ]
+
+
+def _delete_batch(find_workflows: Callable[[], QuerySet], batch_size: int) -> List[int]:
+    """Delete up to `batch_size` Workflows from the database, in one transaction.
+
+    Skip Workflows that another process has locked: somebody is using them,
+    so we'll look again next time.
+    """
+    from cjwstate.models import Block, Delta, Workflow
+
+    with transaction.atomic():
+        workflow_ids = list(
+            find_workflows()
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if workflow_ids:
+            # Delete what Step and Tab PROTECT first -- like Workflow.delete()
+            Delta.objects.filter(workflow_id__in=workflow_ids).delete()
+            Block.objects.filter(workflow_id__in=workflow_ids).delete()
+            # StoredObject and UploadedFile signals delete their own S3 files.
+            # (StoredObjects may share files with other workflows' StoredObjects.)
+            Workflow.objects.filter(id__in=workflow_ids).delete()
+        return workflow_ids
+
+
+def delete_workflows(
+    find_workflows: Callable[[], QuerySet],
+    logger: logging.Logger,
+    *,
+    batch_size: int = BatchSize,
+) -> int:
+    """Delete all Workflows `find_workflows()` selects; return how many.
+
+    `find_workflows()` must return a fresh `Workflow` QuerySet each time: we
+    call it once per batch, within the batch's transaction, so a Workflow that
+    stops qualifying (e.g., its session is renewed) between batches survives.
+
+    We delete each Workflow's S3 "directories" in the background, while we
+    delete the next batch from the database. Workflow IDs are never reused, so
+    nobody will write to those directories. We wait for all S3 deletes before
+    returning.
+    """
+    from cjwstate import s3
+
+    n_deleted = 0
+    futures = []
+    start = time.monotonic()
+    while True:
+        workflow_ids = _delete_batch(find_workflows, batch_size)
+        for workflow_id in workflow_ids:
+            logger.info("Deleted workflow %d", workflow_id)
+            for bucket, prefix in _s3_prefixes(workflow_id):
+                futures.append(s3.remove_recursive_in_background(bucket, prefix))
+        n_deleted += len(workflow_ids)
+        if workflow_ids:
+            logger.info(
+                "Deleted %d workflows in %.1fs; %d of %d S3 prefix deletes pending",
+                n_deleted,
+                time.monotonic() - start,
+                sum(1 for future in futures if not future.done()),
+                len(futures),
+            )
+        if len(workflow_ids) < batch_size:
+            break
+
+    concurrent.futures.wait(futures)
+    n_failed = sum(1 for future in futures if future.exception() is not None)
+    if n_failed:
+        logger.warning("Failed to delete %d S3 prefixes; see errors above", n_failed)
+    return n_deleted
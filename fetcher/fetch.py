@@ -1,6 +1,7 @@
 import asyncio
 import contextlib
 import datetime
+import functools
 import logging
 import time
 from pathlib import Path
@@ -10,7 +11,7 @@ from django.conf import settings
 
 import cjwstate.params
 import fetcher.secrets
-from cjwkernel.chroot import EDITABLE_CHROOT, ChrootContext
+from cjwkernel.chroot import EDITABLE_CHROOT_POOL, ChrootContext
 from cjwkernel.errors import ModuleError, format_for_user_debugging
 from cjwkernel.i18n import trans
 from cjwkernel.types import FetchError, FetchResult, TableMetadata
@@ -21,11 +22,22 @@ from cjwstate.modules.types import ModuleZipfile
 from cjwstate import rendercache, storedobjects
 
 from . import fetchprep, save, versions
+from .hostlimits import HostLimiter, fetch_host
 
 
 logger = logging.getLogger(__name__)
 
 
+_host_limiter: Optional[HostLimiter] = None
+
+
+def _get_host_limiter() -> HostLimiter:
+    global _host_limiter
+    if _host_limiter is None:
+        _host_limiter = HostLimiter(settings.MAX_CONCURRENT_FETCHES_PER_HOST)
+    return _host_limiter
+
+
 def invoke_fetch(
     module_zipfile: ModuleZipfile,
     *,
@@ -382,39 +394,59 @@ async def fetch(
     if now is None:
         now = datetime.datetime.now()
 
-    with contextlib.ExitStack() as exit_stack:
-        chroot_context = exit_stack.enter_context(EDITABLE_CHROOT.acquire_context())
-        basedir = exit_stack.enter_context(
-            chroot_context.tempdir_context(prefix="fetch-")
-        )
-        output_path = exit_stack.enter_context(
-            chroot_context.tempfile_context(prefix="fetch-result-", dir=basedir)
-        )
-        # get last_fetch_result (This can't error.)
-        last_fetch_result = _stored_object_to_fetch_result(
-            exit_stack, stored_object, step.fetch_errors, dir=basedir
-        )
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            fetch_or_wrap_error,
-            exit_stack,
-            chroot_context,
-            basedir,
-            step.module_id_name,
-            module_zipfile,
-            migrated_params,
-            secrets,
-            last_fetch_result,
-            input_crr,
-            output_path,
-        )
+    # Wait for the host _before_ acquiring a chroot: a fetch waiting on a busy
+    # host shouldn't keep other fetches from running.
+    async with _get_host_limiter().acquire(
+        fetch_host(step.module_id_name, migrated_params)
+    ), EDITABLE_CHROOT_POOL.acquire_context() as chroot_context:
+        with contextlib.ExitStack() as exit_stack:
+            basedir = exit_stack.enter_context(
+                chroot_context.tempdir_context(prefix="fetch-")
+            )
+            output_path = exit_stack.enter_context(
+                chroot_context.tempfile_context(prefix="fetch-result-", dir=basedir)
+            )
+            # get last_fetch_result (This can't error.)
+            last_fetch_result = _stored_object_to_fetch_result(
+                exit_stack, stored_object, step.fetch_errors, dir=basedir
+            )
+            result = await asyncio.get_event_loop().run_in_executor(
+                None,
+                fetch_or_wrap_error,
+                exit_stack,
+                chroot_context,
+                basedir,
+                step.module_id_name,
+                module_zipfile,
+                migrated_params,
+                secrets,
+                last_fetch_result,
+                input_crr,
+                output_path,
+            )
 
-        if last_fetch_result is not None and versions.are_fetch_results_equal(
-            last_fetch_result, result
-        ):
-            await save.mark_result_unchanged(workflow_id, step, now)
-        else:
-            await save.create_result(workflow_id, step, result, now)
+            # Read the result once: to hash it (for comparing and storing) and,
+            # if the old result has no hash, to compare bytes
+            comparison = await asyncio.get_event_loop().run_in_executor(
+                None,
+                functools.partial(
+                    versions.hash_and_compare_fetch_results,
+                    result,
+                    last_fetch_result,
+                    old_hash=(
+                        stored_object.hash
+                        if last_fetch_result is not None
+                        and stored_object.is_content_addressed
+                        else None
+                    ),
+                ),
+            )
+            if comparison.is_equal:
+                await save.mark_result_unchanged(workflow_id, step, now)
+            else:
+                await save.create_result(
+                    workflow_id, step, result, now, content_hash=comparison.new_hash
+                )
 
     await update_next_update_time(workflow_id, step, now)
 
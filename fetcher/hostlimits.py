@@ -0,0 +1,60 @@
+"""Limit how many concurrent fetches request the same host.
+
+One fetcher process runs several fetches at once. At the top of each minute,
+cron may queue dozens of auto-update fetches of the same origin (say, a
+government open-data portal); we don't want to hammer it -- or to fill all our
+fetch slots waiting on one slow server.
+"""
+import asyncio
+import contextlib
+import urllib.parse
+from typing import Any, AsyncContextManager, Dict
+
+
+def fetch_host(module_id_name: str, params: Any) -> str:
+    """Guess which host a fetch will request.
+
+    If `params` has a "url", return its hostname. Otherwise, assume the module
+    talks to a single API (e.g., "twitter" or "googlesheets"), and return the
+    module ID.
+    """
+    if isinstance(params, dict):
+        url = params.get("url")
+        if isinstance(url, str):
+            try:
+                hostname = urllib.parse.urlsplit(url.strip()).hostname
+            except ValueError:
+                hostname = None
+            if hostname:
+                return hostname
+    return module_id_name
+
+
+class HostLimiter:
+    """Let at most `limit` callers hold each host at a time.
+
+    Not thread-safe: use it from a single asyncio event loop.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._n_callers: Dict[str, int] = {}
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, host: str) -> AsyncContextManager[None]:
+        """Wait until fewer than `limit` callers hold `host`; then hold it."""
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.limit)
+            self._n_callers[host] = 0
+        semaphore = self._semaphores[host]
+        self._n_callers[host] += 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            # Forget idle hosts, so we don't leak memory
+            self._n_callers[host] -= 1
+            if self._n_callers[host] == 0:
+                del self._n_callers[host]
+                del self._semaphores[host]
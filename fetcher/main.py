@@ -1,6 +1,7 @@
 import asyncio
 
 import msgpack
+from django.conf import settings
 
 
 async def main():
@@ -8,7 +9,10 @@ async def main():
     # import AFTER django.setup()
     import cjwstate.modules
     from cjwstate import rabbitmq
-    from cjwstate.rabbitmq.connection import open_global_connection
+    from cjwstate.rabbitmq.connection import (
+        consume_concurrently,
+        open_global_connection,
+    )
     from .fetch import handle_fetch
 
     cjwstate.modules.init_module_system()
@@ -17,11 +21,20 @@ async def main():
         await rabbitmq_connection.queue_declare(rabbitmq.Fetch, durable=True)
         await rabbitmq_connection.queue_declare(rabbitmq.Render, durable=True)
         await rabbitmq_connection.exchange_declare(rabbitmq.GroupsExchange)
-        # Fetch; ack; fetch; ack ... forever.
-        async with rabbitmq_connection.acking_consumer(rabbitmq.Fetch) as consumer:
-            async for message_bytes in consumer:
-                message = msgpack.unpackb(message_bytes)
-                await handle_fetch(message)
+
+        async def handle_fetch_message(message_bytes: bytes) -> None:
+            message = msgpack.unpackb(message_bytes)
+            # Crash on error, and don't ack.
+            await handle_fetch(message)
+
+        # Fetch; ack; fetch; ack ... forever -- N_CONCURRENT_FETCHES at a
+        # time. Concurrent fetches share our kernel and EDITABLE_CHROOT_POOL.
+        await consume_concurrently(
+            rabbitmq_connection,
+            rabbitmq.Fetch,
+            handle_fetch_message,
+            concurrency=settings.N_CONCURRENT_FETCHES,
+        )
 
 
 if __name__ == "__main__":
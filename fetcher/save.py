@@ -1,5 +1,6 @@
 import contextlib
 import datetime
+from typing import Optional
 
 from cjwkernel.types import FetchResult
 from cjworkbench.sync import database_sync_to_async
@@ -40,7 +41,11 @@ async def _notify_websockets(workflow_id: int, step: Step) -> None:
 
 @database_sync_to_async
 def _do_create_result(
-    workflow_id: int, step: Step, result: FetchResult, now: datetime.datetime
+    workflow_id: int,
+    step: Step,
+    result: FetchResult,
+    now: datetime.datetime,
+    content_hash: Optional[str],
 ) -> None:
     """Do database manipulations for create_result().
 
@@ -53,7 +58,7 @@ def _do_create_result(
     """
     with _locked_step(workflow_id, step):
         storedobjects.create_stored_object(
-            workflow_id, step.id, result.path, stored_at=now
+            workflow_id, step.id, result.path, stored_at=now, content_hash=content_hash
         )
         storedobjects.delete_old_files_to_enforce_storage_limits(step=step)
         # Assume caller sends new list to clients via SetStepDataVersion
@@ -65,7 +70,12 @@ def _do_create_result(
 
 
 async def create_result(
-    workflow_id: int, step: Step, result: FetchResult, now: datetime.datetime
+    workflow_id: int,
+    step: Step,
+    result: FetchResult,
+    now: datetime.datetime,
+    *,
+    content_hash: Optional[str] = None,
 ) -> None:
     """Store fetched table as storedobject.
 
@@ -78,10 +88,13 @@ async def create_result(
 
     Notify the user over Websockets.
 
+    Pass `content_hash` (from `storedobjects.compute_hash()`) if you already
+    have it, so we needn't read the result file again.
+
     No-op if `workflow` or `step` has been deleted.
     """
     try:
-        await _do_create_result(workflow_id, step, result, now)
+        await _do_create_result(workflow_id, step, result, now, content_hash)
     except (Step.DoesNotExist, Workflow.DoesNotExist):
         return  # there's nothing more to do
 
@@ -1,3 +1,5 @@
+from cjworkbench.settings.caches import *
+from cjworkbench.settings.concurrency import *
 from cjworkbench.settings.database import *
 from cjworkbench.settings.hardlimits import *
 from cjworkbench.settings.logging import *
@@ -6,9 +8,10 @@ from cjworkbench.settings.rabbitmq import *
 from cjworkbench.settings.s3 import *
 from cjworkbench.settings.userlimits import FREE_TIER_USER_LIMITS
 
-# Fetcher uses asyncio because it uses RabbitMQ. But when it comes to the
-# database, for all intents and purposes it's single-threaded.
-N_SYNC_DATABASE_CONNECTIONS = 1
+# Fetcher uses asyncio because it uses RabbitMQ. When it comes to the
+# database, each concurrent fetch is single-threaded: give each its own
+# connection.
+N_SYNC_DATABASE_CONNECTIONS = N_CONCURRENT_FETCHES
 
 INSTALLED_APPS = [
     "django.contrib.auth",  # cjwstate.models.workflow imports User
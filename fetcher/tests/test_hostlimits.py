@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from fetcher.hostlimits import HostLimiter, fetch_host
+
+
+class FetchHostTest(unittest.TestCase):
+    def test_url_hostname(self):
+        self.assertEqual(
+            fetch_host("loadurl", {"url": " https://Data.Example.com/x.csv"}),
+            "data.example.com",
+        )
+
+    def test_no_url_gives_module_id(self):
+        self.assertEqual(fetch_host("twitter", {"query": "x"}), "twitter")
+
+    def test_invalid_url_gives_module_id(self):
+        self.assertEqual(fetch_host("loadurl", {"url": "not a url"}), "loadurl")
+
+    def test_module_error_gives_module_id(self):
+        self.assertEqual(fetch_host("loadurl", RuntimeError()), "loadurl")
+
+
+class HostLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_limit_per_host(self):
+        limiter = HostLimiter(2)
+        running = {"a": 0, "b": 0}
+        max_running = {"a": 0, "b": 0}
+
+        async def work(host):
+            async with limiter.acquire(host):
+                running[host] += 1
+                max_running[host] = max(max_running[host], running[host])
+                await asyncio.sleep(0.01)
+                running[host] -= 1
+
+        await asyncio.gather(*[work("a") for _ in range(5)], work("b"))
+        self.assertEqual(max_running, {"a": 2, "b": 1})
+
+    async def test_forget_idle_hosts(self):
+        limiter = HostLimiter(1)
+        async with limiter.acquire("a"):
+            pass
+        self.assertEqual(limiter._semaphores, {})
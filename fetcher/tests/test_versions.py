@@ -1,4 +1,5 @@
 import contextlib
+import hashlib
 import unittest
 
 from cjwmodule.arrow.testing import make_column, make_table
@@ -6,7 +7,7 @@ import cjwparquet
 
 from cjwkernel.types import FetchError, FetchResult, I18nMessage
 from cjwkernel.util import tempfile_context
-from fetcher.versions import are_fetch_results_equal
+from fetcher.versions import are_fetch_results_equal, hash_and_compare_fetch_results
 
 
 class DiffTest(unittest.TestCase):
@@ -88,3 +89,104 @@ class DiffTest(unittest.TestCase):
                 FetchResult(self.old_path), FetchResult(self.new_path)
             )
         )
+
+    def test_same_hashes_skip_reading(self):
+        # Equal hashes mean equal files: we needn't read them
+        self.assertTrue(
+            are_fetch_results_equal(
+                FetchResult(self.old_path.parent / "nonexistent-1"),
+                FetchResult(self.new_path.parent / "nonexistent-2"),
+                new_hash="a" * 64,
+                old_hash="a" * 64,
+            )
+        )
+
+    def test_different_hashes_bytes(self):
+        self.old_path.write_bytes(b"12304987kljnmfe092394hkljdfs")
+        self.new_path.write_bytes(b"12304987kljnmfe092394hkljdfs")
+        self.assertFalse(
+            are_fetch_results_equal(
+                FetchResult(self.old_path),
+                FetchResult(self.new_path),
+                new_hash="a" * 64,
+                old_hash="b" * 64,
+            )
+        )
+
+    def test_different_hashes_parquet_same_data(self):
+        cjwparquet.write(self.old_path, make_table(make_column("A", [1])))
+        cjwparquet.write(self.new_path, make_table(make_column("A", [1])))
+        self.assertTrue(
+            are_fetch_results_equal(
+                FetchResult(self.old_path),
+                FetchResult(self.new_path),
+                new_hash="a" * 64,
+                old_hash="b" * 64,
+            )
+        )
+
+
+class HashAndCompareTest(unittest.TestCase):
+    def setUp(self):
+        self.ctx = contextlib.ExitStack()
+        self.old_path = self.ctx.enter_context(tempfile_context("diff-path1-"))
+        self.new_path = self.ctx.enter_context(tempfile_context("diff-path2-"))
+
+    def tearDown(self):
+        self.ctx.close()
+
+    def test_no_old_result(self):
+        self.new_path.write_bytes(b"abc")
+        self.assertEqual(
+            hash_and_compare_fetch_results(FetchResult(self.new_path), None),
+            (hashlib.sha256(b"abc").hexdigest(), False),
+        )
+
+    def test_same_hash(self):
+        self.new_path.write_bytes(b"abc")
+        self.assertEqual(
+            hash_and_compare_fetch_results(
+                FetchResult(self.new_path),
+                FetchResult(self.old_path.parent / "nonexistent"),
+                old_hash=hashlib.sha256(b"abc").hexdigest(),
+            ),
+            (hashlib.sha256(b"abc").hexdigest(), True),
+        )
+
+    def test_unhashed_old_result_bytes_same(self):
+        self.old_path.write_bytes(b"abc" * 1000000)
+        self.new_path.write_bytes(b"abc" * 1000000)
+        self.assertEqual(
+            hash_and_compare_fetch_results(
+                FetchResult(self.new_path), FetchResult(self.old_path)
+            ),
+            (hashlib.sha256(b"abc" * 1000000).hexdigest(), True),
+        )
+
+    def test_unhashed_old_result_bytes_different_keeps_hashing(self):
+        self.old_path.write_bytes(b"xbc" + b"abc" * 1000000)
+        self.new_path.write_bytes(b"abc" + b"abc" * 1000000)
+        self.assertEqual(
+            hash_and_compare_fetch_results(
+                FetchResult(self.new_path), FetchResult(self.old_path)
+            ),
+            (hashlib.sha256(b"abc" + b"abc" * 1000000).hexdigest(), False),
+        )
+
+    def test_unhashed_old_result_is_prefix(self):
+        self.old_path.write_bytes(b"abc")
+        self.new_path.write_bytes(b"abcd")
+        self.assertFalse(
+            hash_and_compare_fetch_results(
+                FetchResult(self.new_path), FetchResult(self.old_path)
+            ).is_equal
+        )
+
+    def test_unhashed_old_result_parquet_same_data(self):
+        cjwparquet.write(self.old_path, make_table(make_column("A", [1])))
+        cjwparquet.write(self.new_path, make_table(make_column("A", [1])))
+        self.assertTrue(
+            hash_and_compare_fetch_results(
+                FetchResult(self.new_path), FetchResult(self.old_path)
+            ).is_equal
+        )
@@ -1,4 +1,8 @@
+import contextlib
+import hashlib
 from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
 import cjwparquet
 from cjwkernel.types import FetchResult
 
@@ -30,7 +34,86 @@ def _are_file_contents_equal(path1: Path, path2: Path) -> bool:
                     return True
 
 
-def are_fetch_results_equal(new_result: FetchResult, old_result: FetchResult) -> bool:
+def _hash_file_contents(path: Path, compare_path: Optional[Path]) -> Tuple[str, bool]:
+    """
+    Return the SHA-256 hex digest of `path` and whether it equals `compare_path`.
+
+    Read `path` once. Stop comparing at the first difference, but keep hashing.
+    If `compare_path` is None, the second return value is False.
+
+    Raise OSError if file read fails
+    """
+    sha = hashlib.sha256()
+    buffer1 = bytearray(_BUFFER_SIZE)
+    buffer2 = bytearray(_BUFFER_SIZE)
+    with contextlib.ExitStack() as ctx:
+        f1 = ctx.enter_context(path.open("rb", buffering=_BUFFER_SIZE))
+        if compare_path is None:
+            f2 = None
+        else:
+            f2 = ctx.enter_context(compare_path.open("rb", buffering=_BUFFER_SIZE))
+        is_equal = f2 is not None
+        while True:
+            n1 = f1.readinto(buffer1)
+            sha.update(memoryview(buffer1)[:n1])
+            if is_equal:
+                n2 = f2.readinto(buffer2)
+                is_equal = n1 == n2 and buffer1[:n1] == buffer2[:n2]
+            if not n1:
+                return sha.hexdigest(), is_equal
+
+
+class FetchComparison(NamedTuple):
+    new_hash: str
+    """SHA-256 hex digest of the new result's file, for StoredObject.hash."""
+
+    is_equal: bool
+    """True if the new result isn't worth saving (see `are_fetch_results_equal()`)."""
+
+
+def hash_and_compare_fetch_results(
+    new_result: FetchResult,
+    old_result: Optional[FetchResult],
+    *,
+    old_hash: Optional[str] = None,
+) -> FetchComparison:
+    """
+    Hash `new_result`'s file and compare `new_result` with `old_result`.
+
+    The module writes `new_result.path` inside its sandbox, so this is our
+    first look at it. Read it only once: if `old_hash` is unknown (a legacy
+    StoredObject) and we must compare bytes, compare as we hash.
+    """
+    if old_result is None:
+        new_hash, _ = _hash_file_contents(new_result.path, None)
+        return FetchComparison(new_hash, False)
+
+    if (
+        old_hash is None
+        and new_result.errors == old_result.errors
+        and not (
+            _is_parquet_path(old_result.path) and _is_parquet_path(new_result.path)
+        )
+    ):
+        # are_fetch_results_equal() would compare bytes. Do it now.
+        return FetchComparison(*_hash_file_contents(new_result.path, old_result.path))
+
+    new_hash, _ = _hash_file_contents(new_result.path, None)
+    return FetchComparison(
+        new_hash,
+        are_fetch_results_equal(
+            new_result, old_result, new_hash=new_hash, old_hash=old_hash
+        ),
+    )
+
+
+def are_fetch_results_equal(
+    new_result: FetchResult,
+    old_result: FetchResult,
+    *,
+    new_hash: Optional[str] = None,
+    old_hash: Optional[str] = None,
+) -> bool:
     """
     Determine whether `new_result` is worth saving in the database.
 
@@ -62,16 +145,26 @@ def are_fetch_results_equal(new_result: FetchResult, old_result: FetchResult) ->
     Heuristics:
 
         1. If errors are different, the results are different.
-        2. If the render result is a Parquet file (legacy fetch retval),
+        2. If we know both files' SHA-256 hashes and they're equal, the
+           results are the same.
+        3. If the render result is a Parquet file (legacy fetch retval),
            compare schemas and values in the two Parquet files; return the
            result.
-        3. Otherwise, compare file contents of the two files on disk; return
+        4. If we know both files' hashes (and they differ), the results are
+           different.
+        5. Otherwise, compare file contents of the two files on disk; return
            the result.
     """
     if new_result.errors != old_result.errors:
         return False
 
+    know_hashes = new_hash is not None and old_hash is not None
+    if know_hashes and new_hash == old_hash:
+        return True
+
     if _is_parquet_path(old_result.path) and _is_parquet_path(new_result.path):
         return cjwparquet.are_files_equal(old_result.path, new_result.path)
+    elif know_hashes:
+        return False
     else:
         return _are_file_contents_equal(old_result.path, new_result.path)
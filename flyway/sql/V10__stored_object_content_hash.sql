@@ -0,0 +1,2 @@
+ALTER TABLE stored_object ALTER COLUMN hash TYPE VARCHAR(64);
+CREATE INDEX stored_object_key ON stored_object (key);
@@ -0,0 +1,6 @@
+-- delta_workflow_id_id (workflow_id, id), from V11, answers every query
+-- this index answered.
+--
+-- CONCURRENTLY, so we don't block writes to `delta`. Like V11, Flyway runs
+-- this outside a transaction.
+DROP INDEX CONCURRENTLY server_delta_workflow_id_166b01d4;
@@ -0,0 +1,9 @@
+-- CONCURRENTLY: a plain CREATE INDEX would hold a SHARE lock on `delta` --
+-- blocking every INSERT (every user edit) -- for the whole build, minutes
+-- on a big table. CONCURRENTLY lets writes continue; the build takes longer
+-- and only waits for transactions already in progress.
+--
+-- It cannot run in a transaction. Flyway detects that and runs this
+-- migration (which must contain only this statement) outside one. If the
+-- build fails, it leaves an INVALID index: DROP INDEX it and migrate again.
+CREATE INDEX CONCURRENTLY delta_workflow_id_id ON delta (workflow_id, id);
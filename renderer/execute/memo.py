@@ -0,0 +1,202 @@
+"""Reuse render() outputs whose inputs we have seen before.
+
+The render cache (`cjwstate.rendercache`) stores one result per Step, keyed by
+delta ID. When the user undoes, redoes, toggles a param back and forth or
+duplicates a workflow, the delta ID changes and the render cache misses --
+even though render() would produce exactly the output it produced before.
+
+This memo keys each render() output by everything render() reads: the module
+version, the migrated params, the tab name and the contents of the input,
+fetch-result and tab-output files. Entries live in a `DiskCache` on the
+renderer's local disk.
+"""
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pyarrow as pa
+import thrift.protocol.TBinaryProtocol
+import thrift.transport.TTransport
+from django.conf import settings
+
+from cjwkernel.thrift import ttypes
+from cjwkernel.types import (
+    FetchResult,
+    LoadedRenderResult,
+    RenderResult,
+    TabOutput,
+    UploadedFile,
+    arrow_render_result_to_thrift,
+    thrift_render_result_to_arrow,
+)
+from cjwkernel.util import tempfile_context
+from cjwkernel.validate import load_trusted_arrow_file_with_columns
+from cjwstate.diskcache import DiskCache
+from cjwstate.modules.types import ModuleZipfile
+
+
+MEMO_FORMAT_VERSION = "1"
+"""Change this to invalidate all memo entries (e.g., after changing the format)."""
+
+NONDETERMINISTIC_MODULE_IDS = frozenset({"pythoncode", "ACS2016"})
+"""Modules whose render() may read the network (or anything else)."""
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+_memo_cache: Optional[DiskCache] = None
+
+
+def _get_memo_cache() -> DiskCache:
+    global _memo_cache
+    if _memo_cache is None:
+        _memo_cache = DiskCache(
+            "render-memo",
+            Path(settings.RENDER_MEMO_DIR),
+            settings.RENDER_MEMO_MAX_BYTES,
+        )
+    return _memo_cache
+
+
+def _hash_file(sha: "hashlib._Hash", path: Path) -> None:
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+
+
+def _hash_str(sha: "hashlib._Hash", value: str) -> None:
+    # Length-prefix, so ("ab", "c") and ("a", "bc") hash differently
+    encoded = value.encode("utf-8")
+    sha.update(b"%d:" % len(encoded))
+    sha.update(encoded)
+
+
+def is_render_deterministic(module_zipfile: ModuleZipfile) -> bool:
+    """Return True if `module_zipfile`'s render() output depends only on its inputs."""
+    if module_zipfile.version == "develop":
+        return False  # code may change without a version change
+    if module_zipfile.module_id in NONDETERMINISTIC_MODULE_IDS:
+        return False
+    return True
+
+
+def build_memo_key(
+    module_zipfile: ModuleZipfile,
+    *,
+    basedir: Path,
+    input_filename: Optional[str],
+    raw_params: Dict[str, Any],
+    tab_name: str,
+    fetch_result: Optional[FetchResult],
+    tab_outputs: Dict[str, TabOutput],
+    uploaded_files: Dict[str, UploadedFile],
+) -> Optional[str]:
+    """Hash everything render() reads; return `None` if we must not memoize.
+
+    `raw_params` are the migrated params, before renderprep. (renderprep's
+    output includes tempfile names, which change on every render.) Everything
+    renderprep adds comes from the input columns, tab outputs and uploaded
+    files -- which we hash, too. Uploaded files are immutable, so we hash their
+    IDs (in `raw_params`) and names rather than their contents.
+    """
+    if not _get_memo_cache().enabled:
+        return None
+    if not is_render_deterministic(module_zipfile):
+        return None
+
+    sha = hashlib.sha256()
+    _hash_str(sha, MEMO_FORMAT_VERSION)
+    _hash_str(sha, module_zipfile.module_id)
+    _hash_str(sha, module_zipfile.version)
+    _hash_str(sha, json.dumps(raw_params, sort_keys=True, ensure_ascii=False))
+    _hash_str(sha, tab_name)
+    if input_filename is None:
+        _hash_str(sha, "no-input")
+    else:
+        _hash_file(sha, basedir / input_filename)
+    if fetch_result is None:
+        _hash_str(sha, "no-fetch-result")
+    else:
+        _hash_str(sha, repr(fetch_result.errors))
+        _hash_file(sha, fetch_result.path)
+    for slug, tab_output in sorted(tab_outputs.items()):
+        _hash_str(sha, slug)
+        _hash_str(sha, tab_output.tab_name)
+        _hash_file(sha, basedir / tab_output.table_filename)
+    for param_id, uploaded_file in sorted(uploaded_files.items()):
+        _hash_str(sha, param_id)
+        _hash_str(sha, uploaded_file.name)
+    return sha.hexdigest()
+
+
+def _encode_render_result(result: RenderResult) -> bytes:
+    transport = thrift.transport.TTransport.TMemoryBuffer()
+    protocol = thrift.protocol.TBinaryProtocol.TBinaryProtocol(transport)
+    arrow_render_result_to_thrift(result).write(protocol)
+    return transport.getvalue()
+
+
+def _decode_render_result(value: bytes) -> RenderResult:
+    transport = thrift.transport.TTransport.TMemoryBuffer(value)
+    protocol = thrift.protocol.TBinaryProtocol.TBinaryProtocol(transport)
+    result = ttypes.RenderResult()
+    result.read(protocol)
+    return thrift_render_result_to_arrow(result)
+
+
+def load_memoized_render_result(
+    key: str, output_path: Path
+) -> Optional[LoadedRenderResult]:
+    """Write the memoized table to `output_path` and return its result.
+
+    Return `None` on cache miss.
+    """
+    with _get_memo_cache().open(key) as memo_path:
+        if memo_path is None:
+            return None
+
+        with memo_path.open("rb") as f:
+            result_size = int.from_bytes(f.read(4), "big")
+            result = _decode_render_result(f.read(result_size))
+            with output_path.open("wb") as output:
+                shutil.copyfileobj(f, output)
+
+    if output_path.stat().st_size == 0:
+        table = pa.table({})
+        columns = []
+    else:
+        # We validated this file before we memoized it
+        table, columns = load_trusted_arrow_file_with_columns(output_path)
+    return LoadedRenderResult(
+        path=output_path,
+        table=table,
+        columns=columns,
+        errors=result.errors,
+        json=result.json,
+    )
+
+
+def memoize_render_result(key: str, result: LoadedRenderResult) -> None:
+    """Store `result`, from render(), for `load_memoized_render_result()`.
+
+    `result.path` must have been validated.
+
+    The memo entry is a single file: a 4-byte big-endian length, a
+    Thrift-encoded RenderResult (errors and JSON) of that length, then the
+    Arrow file.
+    """
+    encoded_result = _encode_render_result(
+        RenderResult(errors=result.errors, json=result.json)
+    )
+    with tempfile_context(prefix="render-memo-") as memo_path:
+        with memo_path.open("wb") as f:
+            f.write(len(encoded_result).to_bytes(4, "big"))
+            f.write(encoded_result)
+            with result.path.open("rb") as table:
+                shutil.copyfileobj(table, f)
+        _get_memo_cache().put(key, memo_path)
@@ -39,6 +39,27 @@ class PrepParamsResult(NamedTuple):
     uploaded_files: Dict[str, UploadedFile]
 
 
+class _PendingUploadedFile(NamedTuple):
+    """A `file` param value whose file we have not yet downloaded to `path`."""
+
+    uuid: str
+    key: str
+    path: Path
+    uploaded_file: UploadedFile
+
+
+class PlannedParams(NamedTuple):
+    """Output of `plan_params()`: prepped params, minus the s3 downloads.
+
+    `params` hold `_PendingUploadedFile` values where `file` params go. Pass
+    this to `download_uploaded_files()` to replace them.
+    """
+
+    params: Dict[str, Any]
+    tab_outputs: List[TabOutput]
+    pending_uploaded_files: Dict[str, _PendingUploadedFile]
+
+
 def _validate_iso8601_string(s):
     try:
         iso8601.parse_date(s)
@@ -86,7 +107,7 @@ class _Cleaner:
         # "output" params
         self.exit_stack = exit_stack
         self.used_tab_slugs = set()
-        self.uploaded_files = dict()
+        self.pending_uploaded_files = dict()
         self.result = None
 
     def clean(self):
@@ -99,7 +120,9 @@ class _Cleaner:
             for td in self.tabs.values()
             if td.slug in self.used_tab_slugs
         }
-        self.result = PrepParamsResult(cleaned_params, tab_outputs, self.uploaded_files)
+        self.result = PlannedParams(
+            cleaned_params, tab_outputs, self.pending_uploaded_files
+        )
         return self.result
 
     def output_columns_for_tab_parameter(self, tab_parameter):
@@ -165,19 +188,22 @@ class _Cleaner:
         return condition
 
     @clean_value.register(ParamSchema.File)
-    def _(self, schema: ParamSchema.File, value: Optional[str]) -> Optional[Path]:
-        """Convert a `file` String-encoded UUID to a tempfile `pathlib.Path`.
+    def _(
+        self, schema: ParamSchema.File, value: Optional[str]
+    ) -> Optional[_PendingUploadedFile]:
+        """Plan to download a `file` String-encoded UUID to a tempfile.
 
-        The return value:
+        The tempfile path:
 
-        * Points to a temporary file containing all bytes
         * Has the same suffix as the originally-uploaded file
         * Will have its file deleted when it goes out of scope
 
-        If the file is in the database but does not exist on s3, return `None`.
+        Read only the database: `download_uploaded_files()` downloads.
         """
         if value is None:
             return None
+        if value in self.pending_uploaded_files:
+            return self.pending_uploaded_files[value]
         try:
             uploaded_file = UploadedFileModel.objects.get(
                 uuid=value, step_id=self.step_id
@@ -192,19 +218,18 @@ class _Cleaner:
         safe_name = FilesystemUnsafeChars.sub("-", uploaded_file.name)
         path = self.basedir / (value + "_" + safe_name)
         self.exit_stack.enter_context(deferred_delete(path))
-        try:
-            # Overwrite the file
-            s3.download(s3.UserFilesBucket, uploaded_file.key, path)
-        except FileNotFoundError:
-            # tempfile will be deleted by self.exit_stack
-            return None
-
-        self.uploaded_files[value] = UploadedFile(
-            name=uploaded_file.name,
-            filename=path.name,
-            uploaded_at=uploaded_file.created_at,
+        pending = _PendingUploadedFile(
+            uuid=value,
+            key=uploaded_file.key,
+            path=path,
+            uploaded_file=UploadedFile(
+                name=uploaded_file.name,
+                filename=path.name,
+                uploaded_at=uploaded_file.created_at,
+            ),
         )
-        return value
+        self.pending_uploaded_files[value] = pending
+        return pending
 
     @clean_value.register(ParamSchema.Tab)
     def _(self, schema: ParamSchema.Tab, value: str) -> str:
@@ -356,6 +381,70 @@ class _Cleaner:
         return {k: self.clean_value(schema.value_schema, v) for k, v in value.items()}
 
 
+def plan_params(
+    *,
+    step_id: int,
+    input_table_columns: List[Column],
+    tab_results: Dict[Tab, Optional[StepResult]],
+    basedir: Path,
+    exit_stack: ExitStack,
+    schema: ParamSchema.Dict,
+    params: Dict[str, Any],
+) -> PlannedParams:
+    """Do the database part of `prep_params()`.
+
+    This uses a database connection! (It needs to load uploaded-file
+    metadata.) Be sure the Workflow is locked while you call it. It does not
+    read s3, so it's quick: call `download_uploaded_files()` after unlocking.
+    """
+    cleaner = _Cleaner(
+        step_id=step_id,
+        input_table_columns=input_table_columns,
+        tab_results=tab_results,
+        basedir=basedir,
+        exit_stack=exit_stack,
+        params=params,
+        schema=schema,
+    )
+    return cleaner.clean()
+
+
+def _resolve_pending_uploaded_files(
+    value: Any, uploaded_files: Dict[str, UploadedFile]
+) -> Any:
+    if isinstance(value, _PendingUploadedFile):
+        return value.uuid if value.uuid in uploaded_files else None
+    elif isinstance(value, dict):
+        return {
+            k: _resolve_pending_uploaded_files(v, uploaded_files)
+            for k, v in value.items()
+        }
+    elif isinstance(value, list):
+        return [_resolve_pending_uploaded_files(v, uploaded_files) for v in value]
+    else:
+        return value
+
+
+def download_uploaded_files(planned: PlannedParams) -> PrepParamsResult:
+    """Download the files `plan_params()` chose; return the final params.
+
+    This reads s3 and not the database. If a file is in the database but does
+    not exist on s3, its param value becomes `None`.
+    """
+    uploaded_files = {}
+    for pending in planned.pending_uploaded_files.values():
+        try:
+            # Overwrite the file
+            s3.download(s3.UserFilesBucket, pending.key, pending.path)
+        except FileNotFoundError:
+            # tempfile will be deleted by the plan's exit_stack
+            continue
+        uploaded_files[pending.uuid] = pending.uploaded_file
+
+    params = _resolve_pending_uploaded_files(planned.params, uploaded_files)
+    return PrepParamsResult(params, planned.tab_outputs, uploaded_files)
+
+
 def prep_params(
     *,
     step_id: int,
@@ -368,8 +457,9 @@ def prep_params(
 ) -> PrepParamsResult:
     """Convert `params` to a dict we'll pass to a module `render()` function.
 
-    This uses a database connection! (It needs to load input file data.) Be sure
-    the Workflow is locked while you call it.
+    This uses a database connection and downloads from s3. Callers that lock
+    the Workflow should call `plan_params()` within the lock and
+    `download_uploaded_files()` outside it, instead.
 
     Concretely:
 
@@ -381,17 +471,19 @@ def prep_params(
           input columns
         * Raise `PromptingError` if a chosen column is of the wrong type
           (so the caller can build errors and quickfixes)
+        * `file` params point to files in `basedir` (or become `None`)
     """
-    cleaner = _Cleaner(
-        step_id=step_id,
-        input_table_columns=input_table_columns,
-        tab_results=tab_results,
-        basedir=basedir,
-        exit_stack=exit_stack,
-        params=params,
-        schema=schema,
+    return download_uploaded_files(
+        plan_params(
+            step_id=step_id,
+            input_table_columns=input_table_columns,
+            tab_results=tab_results,
+            basedir=basedir,
+            exit_stack=exit_stack,
+            schema=schema,
+            params=params,
+        )
     )
-    return cleaner.clean()
 
 
 _InverseOperations = {
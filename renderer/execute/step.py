@@ -6,9 +6,8 @@ import time
 from collections import namedtuple
 from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, NamedTuple, Optional
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
 
-import cjwparquet
 import pyarrow as pa
 from django.db import connection
 
@@ -18,6 +17,7 @@ from cjwkernel.errors import ModuleError, ModuleExitedError, format_for_user_deb
 from cjwkernel.i18n import trans
 from cjwkernel.types import (
     Column,
+    FetchError,
     FetchResult,
     LoadedRenderResult,
     RenderError,
@@ -28,7 +28,7 @@ from cjwkernel.validate import ValidateError, load_untrusted_arrow_file_with_col
 from cjwkernel.util import tempfile_context
 from cjwstate import clientside, s3, rabbitmq, rendercache
 from cjwstate.errors import PromptingError
-from cjwstate.models import StoredObject, Step, Workflow
+from cjwstate.models import Delta, StoredObject, Step, Workflow
 import cjwstate.modules
 from cjwstate.modules.types import ModuleZipfile
 from renderer import notifications
@@ -39,14 +39,24 @@ from .types import (
     TabOutputUnreachableError,
     UnneededExecution,
 )
-from . import renderprep
+from . import memo, renderprep
 from .types import StepResult
 
 
 logger = logging.getLogger(__name__)
 
 
-SaveResult = namedtuple("SaveResult", ["cached_render_result", "maybe_delta"])
+REUSABLE_OUTPUT_COMMAND_NAMES = frozenset({"SetStepParams", "SetStepDataVersion"})
+"""Commands that change a Step's output only by changing the Step's params or data.
+
+When such a Command changes an _upstream_ Step, a downstream Step's output
+changes only if its input changes.
+"""
+
+
+SaveResult = namedtuple(
+    "SaveResult", ["cached_render_result", "maybe_delta", "unchanged_since_delta_id"]
+)
 
 
 @contextlib.contextmanager
@@ -81,11 +91,27 @@ def locked_step(workflow, step):
     return retval
 
 
+def _find_stored_object(step: Step) -> Optional[StoredObject]:
+    """Return the user-selected StoredObject, if it points to a file on s3."""
+    try:
+        stored_object = step.stored_objects.get(stored_at=step.stored_data_version)
+    except StoredObject.DoesNotExist:
+        return None
+    if not stored_object.key:
+        return None
+    return stored_object
+
+
 def _load_fetch_result(
-    step: Step, basedir: Path, exit_stack: contextlib.ExitStack
+    stored_object: Optional[StoredObject],
+    fetch_errors: List[FetchError],
+    basedir: Path,
+    exit_stack: contextlib.ExitStack,
 ) -> Optional[FetchResult]:
     """Download user-selected StoredObject to `basedir`, so render() can read it.
 
+    This reads s3 and not the database: call it outside of `locked_step()`.
+
     Edge cases:
 
     Create no file (and return `None`) if the user did not select a
@@ -95,11 +121,7 @@ def _load_fetch_result(
     The caller should ensure "leave `path` alone" means "return an empty
     FetchResult". The FetchResult may still have an error.
     """
-    try:
-        stored_object = step.stored_objects.get(stored_at=step.stored_data_version)
-    except StoredObject.DoesNotExist:
-        return None
-    if not stored_object.key:
+    if stored_object is None:
         return None
 
     with contextlib.ExitStack() as inner_stack:
@@ -128,7 +150,7 @@ def _load_fetch_result(
             # return `None`.
             return None
 
-    return FetchResult(path, step.fetch_errors)
+    return FetchResult(path, fetch_errors)
 
 
 def invoke_render(
@@ -221,7 +243,66 @@ def invoke_render(
         )
 
 
+def invoke_render_memoized(
+    module_zipfile: ModuleZipfile,
+    *,
+    raw_params: Dict[str, Any],
+    chroot_context: ChrootContext,
+    basedir: Path,
+    input_filename: Optional[str],
+    params: Dict[str, Any],
+    tab_name: str,
+    fetch_result: Optional[FetchResult],
+    tab_outputs: Dict[str, TabOutput],
+    uploaded_files: Dict[str, UploadedFile],
+    output_filename: str,
+) -> LoadedRenderResult:
+    """Like `invoke_render()`, but reuse a memoized output if inputs match.
+
+    `raw_params` are the migrated params (before renderprep), for the memo key.
+    """
+    memo_key = memo.build_memo_key(
+        module_zipfile,
+        basedir=basedir,
+        input_filename=input_filename,
+        raw_params=raw_params,
+        tab_name=tab_name,
+        fetch_result=fetch_result,
+        tab_outputs=tab_outputs,
+        uploaded_files=uploaded_files,
+    )
+    if memo_key is not None:
+        result = memo.load_memoized_render_result(memo_key, basedir / output_filename)
+        if result is not None:
+            logger.info(
+                "%s:render() => reused memoized output", module_zipfile.path.name
+            )
+            return result
+
+    result = invoke_render(
+        module_zipfile,
+        chroot_context=chroot_context,
+        basedir=basedir,
+        input_filename=input_filename,
+        params=params,
+        tab_name=tab_name,
+        fetch_result=fetch_result,
+        tab_outputs=tab_outputs,
+        uploaded_files=uploaded_files,
+        output_filename=output_filename,
+    )
+    if memo_key is not None:
+        memo.memoize_render_result(memo_key, result)
+    return result
+
+
 class ExecuteStepPreResult(NamedTuple):
+    stored_object: Optional[StoredObject]
+    fetch_errors: List[FetchError]
+    planned_params: renderprep.PlannedParams
+
+
+class ExecuteStepDownloadResult(NamedTuple):
     fetch_result: Optional[FetchResult]
     params: Dict[str, Any]
     tab_outputs: List[TabOutput]
@@ -257,20 +338,22 @@ def _execute_step_pre(
 
     All this runs synchronously within a database lock. (It's a separate
     function so that when we're done awaiting it, we can continue executing in
-    a context that doesn't use a database thread.)
+    a context that doesn't use a database thread.) It only reads the database:
+    `_execute_step_download()` reads s3 after we release the lock, so the
+    lock is held for the same time no matter how large the files are.
 
     `tab_results.keys()` must be ordered as the Workflow's tabs are.
     """
     # raises UnneededExecution
     with locked_step(workflow, step) as safe_step:
-        fetch_result = _load_fetch_result(safe_step, basedir, exit_stack)
+        stored_object = _find_stored_object(safe_step)
 
         module_spec = module_zipfile.get_spec()
         if not module_spec.loads_data and not input_table_columns:
             raise NoLoadedDataError
 
         # raise TabCycleError, TabOutputUnreachableError, PromptingError
-        params, tab_outputs, uploaded_files = renderprep.prep_params(
+        planned_params = renderprep.plan_params(
             params=raw_params,
             schema=module_spec.param_schema,
             step_id=step.id,
@@ -280,77 +363,137 @@ def _execute_step_pre(
             exit_stack=exit_stack,
         )
 
-        return ExecuteStepPreResult(fetch_result, params, tab_outputs, uploaded_files)
+        return ExecuteStepPreResult(
+            stored_object, safe_step.fetch_errors, planned_params
+        )
+
+
+def _execute_step_download(
+    pre_result: ExecuteStepPreResult, basedir: Path, exit_stack: contextlib.ExitStack
+) -> ExecuteStepDownloadResult:
+    """Second step of execute_step(): download files, without a database lock.
+
+    Meanwhile, the user may change the Step. The caller should call
+    `_check_step_is_fresh()` afterwards.
+    """
+    fetch_result = _load_fetch_result(
+        pre_result.stored_object, pre_result.fetch_errors, basedir, exit_stack
+    )
+    params, tab_outputs, uploaded_files = renderprep.download_uploaded_files(
+        pre_result.planned_params
+    )
+    return ExecuteStepDownloadResult(fetch_result, params, tab_outputs, uploaded_files)
 
 
 @database_sync_to_async
-def _execute_step_save(
+def _check_step_is_fresh(step: Step) -> None:
+    """Raise UnneededExecution if `step` changed since we started rendering it.
+
+    `_execute_step_save()` checks again, under lock. This check is a quick
+    read that spares us from rendering stale data.
+    """
+    if not Step.objects.filter(
+        pk=step.pk, is_deleted=False, last_relevant_delta_id=step.last_relevant_delta_id
+    ).exists():
+        raise UnneededExecution
+
+
+class StaleComparison(NamedTuple):
+    """How a fresh render result compares to the Step's stale cached result."""
+
+    stale_crr: rendercache.CachedRenderResult
+    is_changed: bool
+
+
+def _compare_with_stale_result(
     workflow: Workflow, step: Step, result: LoadedRenderResult
+) -> Optional[StaleComparison]:
+    """Compare `result` with `step`'s stale cached result, without a lock.
+
+    Reading the stale table can be slow: it may mean an S3 download and an
+    O(table) comparison. So we do it before `_execute_step_save()` locks the
+    workflow. We compare against our local `result.table`: we never download
+    the file we are about to upload.
+
+    Return `None` if there is no stale result to compare with.
+    """
+    stale_crr = step.get_stale_cached_render_result()
+    if stale_crr is None:
+        return None
+
+    if (
+        stale_crr.errors != result.errors
+        or stale_crr.json != result.json
+        or stale_crr.table_metadata.n_rows != result.table.num_rows
+        or stale_crr.table_metadata.columns != result.columns
+    ):
+        # Output other than table data has changed (e.g., nRows). Status
+        # follows from errors and columns.
+        return StaleComparison(stale_crr, True)
+
+    if not result.columns:
+        return StaleComparison(stale_crr, False)  # no table data to compare
+
+    try:
+        with rendercache.open_cached_render_result(stale_crr) as stale_result:
+            is_changed = not stale_result.table.equals(result.table)
+    except rendercache.CorruptCacheError:
+        # No, let's not send an email. Corrupt cache probably means
+        # we've been messing with our codebase.
+        logger.exception(
+            "Ignoring CorruptCacheError on workflow %d, step %d because we are about to overwrite it",
+            workflow.id,
+            step.id,
+        )
+        return None
+    return StaleComparison(stale_crr, is_changed)
+
+
+@database_sync_to_async
+def _execute_step_save(
+    workflow: Workflow,
+    step: Step,
+    result: LoadedRenderResult,
+    stale_comparison: Optional[StaleComparison],
 ) -> SaveResult:
     """Call rendercache.cache_render_result() and build notifications.OutputDelta.
 
+    `stale_comparison` comes from `_compare_with_stale_result()`. If `result`
+    is identical to the Step's stale cached result, return that stale
+    result's delta ID as `unchanged_since_delta_id`: it lets the caller skip
+    rendering subsequent Steps.
+
     All this runs synchronously within a database lock. (It's a separate
     function so that when we're done awaiting it, we can continue executing in
-    a context that doesn't use a database thread.)
+    a context that doesn't use a database thread.) It only writes: we compared
+    with the stale result before taking the lock.
 
     Raise UnneededExecution if the Step has changed in the interim.
     """
     # raises UnneededExecution
-    with contextlib.ExitStack() as exit_stack:
-        safe_step = exit_stack.enter_context(locked_step(workflow, step))
-        if safe_step.notifications and workflow.owner_id is not None:
-            stale_crr = safe_step.get_stale_cached_render_result()
-            if stale_crr is None:
-                stale_parquet_file = None
-            elif stale_crr.status == "ok":
-                try:
-                    stale_parquet_file = exit_stack.enter_context(
-                        rendercache.downloaded_parquet_file(stale_crr)
-                    )
-                except rendercache.CorruptCacheError:
-                    # No, let's not send an email. Corrupt cache probably means
-                    # we've been messing with our codebase.
-                    logger.exception(
-                        "Ignoring CorruptCacheError on workflow %d, step %d because we are about to overwrite it",
-                        workflow.id,
-                        step.id,
-                    )
-                    stale_crr = None
-                    stale_parquet_file = None
-            else:
-                # status is 'error'/'unreachable'. There's no Parquet file.
-                stale_parquet_file = None
+    with locked_step(workflow, step) as safe_step:
+        if (
+            stale_comparison is not None
+            and safe_step.get_stale_cached_render_result() == stale_comparison.stale_crr
+        ):
+            stale_crr = stale_comparison.stale_crr
+            is_changed = stale_comparison.is_changed
         else:
+            # Nothing to compare; or another render replaced the stale result
+            # while we compared. Don't email about it.
             stale_crr = None
-            stale_parquet_file = None
+            is_changed = False
 
         rendercache.cache_render_result(
             workflow, safe_step, step.last_relevant_delta_id, result
         )
 
-        is_changed = False  # nothing to email, usually
-        if stale_crr is not None:
-            fresh_crr = safe_step.cached_render_result
-
-            if (
-                fresh_crr.status != stale_crr.status
-                or fresh_crr.errors != stale_crr.errors
-                or fresh_crr.json != stale_crr.json
-                or fresh_crr.table_metadata != stale_crr.table_metadata
-            ):
-                # Output other than table data has changed (e.g., nRows)
-                is_changed = True
-
-            if not is_changed and fresh_crr.status == "ok":
-                # Download the new parquet file and compare to the old one
-                fresh_parquet_file = exit_stack.enter_context(
-                    rendercache.downloaded_parquet_file(fresh_crr)
-                )
-                is_changed = not cjwparquet.are_files_equal(
-                    stale_parquet_file, fresh_parquet_file
-                )
+        if stale_crr is not None and not is_changed:
+            unchanged_since_delta_id = stale_crr.delta_id
+        else:
+            unchanged_since_delta_id = None
 
-        if is_changed:
+        if is_changed and safe_step.notifications and workflow.owner_id is not None:
             with connection.cursor() as cursor:
                 # Don't import cjworkbench.models.userprofile: it relies on
                 # settings.FREE_TIER_USAGE_LIMITS, buy renderer doesn't set it.
@@ -374,7 +517,9 @@ def _execute_step_save(
         else:
             maybe_delta = None
 
-        return SaveResult(safe_step.cached_render_result, maybe_delta)
+        return SaveResult(
+            safe_step.cached_render_result, maybe_delta, unchanged_since_delta_id
+        )
 
 
 async def _render_step(
@@ -417,7 +562,7 @@ async def _render_step(
         try:
             # raise UnneededExecution, TabCycleError, TabOutputUnreachableError,
             # NoLoadedDataError, PromptingError
-            fetch_result, params, tab_outputs, uploaded_files = await _execute_step_pre(
+            pre_result = await _execute_step_pre(
                 basedir=basedir,
                 exit_stack=exit_stack,
                 workflow=workflow,
@@ -469,16 +614,25 @@ async def _render_step(
                 output_path, errors=err.as_render_errors()
             )
 
+        loop = asyncio.get_event_loop()
+
+        # Downloads may take a while, too. We aren't holding a lock, so the
+        # user may edit the Step in the meantime.
+        fetch_result, params, tab_outputs, uploaded_files = await loop.run_in_executor(
+            None, _execute_step_download, pre_result, basedir, exit_stack
+        )
+        await _check_step_is_fresh(step)  # raise UnneededExecution
+
         # Render may take a while. run_in_executor to push that slowdown to a
         # thread and keep our event loop responsive.
-        loop = asyncio.get_event_loop()
 
         try:
             return await loop.run_in_executor(
                 None,
                 partial(
-                    invoke_render,
+                    invoke_render_memoized,
                     module_zipfile,
+                    raw_params=raw_params,
                     chroot_context=chroot_context,
                     basedir=basedir,
                     input_filename=input_path.name,
@@ -507,6 +661,141 @@ async def _render_step(
             )
 
 
+def _only_upstream_deltas_since(
+    step: Step, delta_id: int, upstream_step_ids: FrozenSet[int]
+) -> bool:
+    """Return True if Deltas since `delta_id` only changed `step`'s input.
+
+    That is: every Delta after `delta_id`, up to `step.last_relevant_delta_id`,
+    that affects `step` is in `REUSABLE_OUTPUT_COMMAND_NAMES` and changes one of
+    `upstream_step_ids`.
+
+    Return False if we cannot prove it -- for instance, if Deltas were undone or
+    deleted.
+    """
+    if delta_id >= step.last_relevant_delta_id:
+        return False  # e.g., the user undid a Delta
+
+    deltas = list(
+        Delta.objects.filter(
+            workflow_id=step.workflow_id,
+            id__gte=delta_id,
+            id__lte=step.last_relevant_delta_id,
+        )
+        .order_by("id")
+        .values_list("id", "prev_delta_id", "command_name", "step_id", "step_delta_ids")
+    )
+    if (
+        not deltas
+        or deltas[0][0] != delta_id
+        or deltas[-1][0] != step.last_relevant_delta_id
+    ):
+        return False  # Deltas were deleted
+    for prev, delta in zip(deltas, deltas[1:]):
+        _, prev_delta_id, command_name, delta_step_id, step_delta_ids = delta
+        if prev_delta_id != prev[0]:
+            return False  # Deltas aren't a contiguous chain
+        if not any(step_id == step.id for step_id, _ in step_delta_ids):
+            continue  # this Delta didn't affect `step`
+        if (
+            command_name not in REUSABLE_OUTPUT_COMMAND_NAMES
+            or delta_step_id not in upstream_step_ids
+        ):
+            return False
+    return True
+
+
+@database_sync_to_async
+def _reuse_stale_cached_render_result(
+    workflow: Workflow,
+    step: Step,
+    input_unchanged_since_delta_id: int,
+    upstream_step_ids: FrozenSet[int],
+    output_path: Path,
+) -> Optional[rendercache.CachedRenderResult]:
+    """Write `step`'s stale cached output to `output_path` and mark it fresh.
+
+    Return `None` (and leave the cache alone) if we can't prove the stale
+    output is the output `step` would render now.
+
+    Raise UnneededExecution if `step` has changed.
+    """
+    # raises UnneededExecution
+    with locked_step(workflow, step) as safe_step:
+        stale_crr = safe_step.get_stale_cached_render_result()
+        # Its input must be identical: it must have been rendered from the
+        # same upstream output our caller just found to be unchanged.
+        if stale_crr is None or stale_crr.delta_id != input_unchanged_since_delta_id:
+            return None
+        # Its params and data must be identical, too.
+        if not _only_upstream_deltas_since(
+            safe_step, stale_crr.delta_id, upstream_step_ids
+        ):
+            return None
+
+        try:
+            rendercache.load_cached_render_result(stale_crr, output_path)
+            rendercache.reuse_cached_render_result(
+                workflow, safe_step, safe_step.last_relevant_delta_id
+            )
+        except rendercache.CorruptCacheError:
+            logger.exception(
+                "Rendering instead of reusing corrupt cache in wf-%d/wfm-%d",
+                workflow.id,
+                step.id,
+            )
+            return None
+
+        return safe_step.cached_render_result
+
+
+async def reuse_step_output(
+    *,
+    workflow: Workflow,
+    step: Step,
+    module_zipfile: Optional[ModuleZipfile],
+    input_unchanged_since_delta_id: int,
+    upstream_step_ids: FrozenSet[int],
+    output_path: Path,
+) -> Optional[StepResult]:
+    """Skip rendering `step` if its input, params and data are unchanged.
+
+    Call this when the previous step's output is identical to its stale output
+    from delta `input_unchanged_since_delta_id`. (`execute_step_and_compare()`
+    returns that delta ID.) `upstream_step_ids` are the IDs of all steps before
+    `step` in its tab.
+
+    If `step`'s stale output was rendered from that same input, and the only
+    Deltas since then changed upstream steps' params or data, then rendering
+    would produce the stale output again. In that case, copy the stale output
+    to `output_path`, mark it fresh, broadcast and return it.
+
+    Return `None` if `step` must be rendered.
+
+    Raises `UnneededExecution` when the input Step should not be rendered.
+    """
+    if module_zipfile is None or not memo.is_render_deterministic(module_zipfile):
+        return None
+
+    # may raise UnneededExecution
+    crr = await _reuse_stale_cached_render_result(
+        workflow, step, input_unchanged_since_delta_id, upstream_step_ids, output_path
+    )
+    if crr is None:
+        return None
+
+    update = clientside.Update(
+        steps={
+            step.id: clientside.StepUpdate(
+                render_result=crr, module_slug=step.module_id_name
+            )
+        }
+    )
+    await rabbitmq.send_update_to_workflow_clients(workflow.id, update)
+
+    return StepResult(path=output_path, columns=crr.table_metadata.columns)
+
+
 async def execute_step(
     *,
     chroot_context: ChrootContext,
@@ -547,6 +836,40 @@ async def execute_step(
 
     Raises `UnneededExecution` when the input Step should not be rendered.
     """
+    result, _ = await execute_step_and_compare(
+        chroot_context=chroot_context,
+        workflow=workflow,
+        step=step,
+        module_zipfile=module_zipfile,
+        params=params,
+        tab_name=tab_name,
+        input_path=input_path,
+        input_table_columns=input_table_columns,
+        tab_results=tab_results,
+        output_path=output_path,
+    )
+    return result
+
+
+async def execute_step_and_compare(
+    *,
+    chroot_context: ChrootContext,
+    workflow: Workflow,
+    step: Step,
+    module_zipfile: Optional[ModuleZipfile],
+    params: Dict[str, Any],
+    tab_name: str,
+    input_path: Path,
+    input_table_columns: List[Column],
+    tab_results: Dict[Tab, Optional[StepResult]],
+    output_path: Path,
+) -> Tuple[StepResult, Optional[int]]:
+    """Like `execute_step()`, but also compare the output to the stale one.
+
+    Return `(result, unchanged_since_delta_id)`. If the output is identical to
+    `step`'s stale cached output, `unchanged_since_delta_id` is the delta ID of
+    that stale output. Otherwise, it is `None`.
+    """
     # may raise UnneededExecution
     loaded_render_result = await _render_step(
         chroot_context=chroot_context,
@@ -561,8 +884,16 @@ async def execute_step(
         output_path=output_path,
     )
 
+    # Compare before _execute_step_save() locks the workflow: it may be slow
+    loop = asyncio.get_event_loop()
+    stale_comparison = await loop.run_in_executor(
+        None, _compare_with_stale_result, workflow, step, loaded_render_result
+    )
+
     # may raise UnneededExecution
-    crr, output_delta = await _execute_step_save(workflow, step, loaded_render_result)
+    crr, output_delta, unchanged_since_delta_id = await _execute_step_save(
+        workflow, step, loaded_render_result, stale_comparison
+    )
 
     update = clientside.Update(
         steps={
@@ -577,7 +908,6 @@ async def execute_step(
     # lock, because SMTP can be slow, and Django's email backend is
     # synchronous.
     if output_delta and workflow.owner_id is not None:
-        loop = asyncio.get_event_loop()
         await loop.run_in_executor(
             None,
             notifications.email_output_delta,
@@ -585,9 +915,11 @@ async def execute_step(
             datetime.datetime.now(),
         )
 
-    # TODO if there's no change, is it possible for us to skip the render
-    # of future modules, setting their cached_render_result_delta_id =
-    # last_relevant_delta_id?  Investigate whether this is worthwhile.
-    return StepResult(
-        path=loaded_render_result.path, columns=loaded_render_result.columns
+    # If there's no change, our caller may skip the render of subsequent
+    # steps. See `reuse_step_output()`.
+    return (
+        StepResult(
+            path=loaded_render_result.path, columns=loaded_render_result.columns
+        ),
+        unchanged_since_delta_id,
     )
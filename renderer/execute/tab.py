@@ -13,7 +13,7 @@ from cjwstate.models import Step, Workflow
 from cjwstate.modules.types import ModuleZipfile
 from cjwstate.modules.util import gather_param_tab_slugs
 from cjwstate.rendercache import load_cached_render_result, CorruptCacheError
-from .step import execute_step, locked_step
+from .step import execute_step_and_compare, locked_step, reuse_step_output
 from .types import StepResult, Tab
 
 
@@ -233,9 +233,31 @@ async def execute_tab_flow(
             last_result = StepResult(path=input_path, columns=[])
             step_index = 0  # needed when there are no steps at all
 
-        for step, output_path in zip(flow.steps[step_index:], step_output_paths):
+        # When a step's output is identical to its stale output, subsequent
+        # steps may not need rendering. (This is common with auto-updated
+        # fetches that return the same data.) `unchanged_since_delta_id` is
+        # the delta ID of the identical stale output.
+        unchanged_since_delta_id = None
+        for index, output_path in zip(
+            range(step_index, len(flow.steps)), step_output_paths
+        ):
+            step = flow.steps[index]
             output_path.write_bytes(b"")  # don't leak data from two steps ago
-            output: StepResult = await execute_step(
+            if unchanged_since_delta_id is not None:
+                output = await reuse_step_output(
+                    workflow=workflow,
+                    step=step.step,
+                    module_zipfile=step.module_zipfile,
+                    input_unchanged_since_delta_id=unchanged_since_delta_id,
+                    upstream_step_ids=frozenset(s.step.id for s in flow.steps[:index]),
+                    output_path=output_path,
+                )
+                if output is not None:
+                    # Its output is its stale output, so it's unchanged, too
+                    last_result = output
+                    continue
+
+            output, unchanged_since_delta_id = await execute_step_and_compare(
                 chroot_context=chroot_context,
                 workflow=workflow,
                 step=step.step,
@@ -1,13 +1,19 @@
+import asyncio
 import logging
+import shutil
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+from django.conf import settings
+
 from cjworkbench.sync import database_sync_to_async
-from cjwkernel.chroot import EDITABLE_CHROOT
+from cjwkernel.chroot import EDITABLE_CHROOT_POOL
 from cjwkernel.errors import ModuleError
+from cjwkernel.util import tempdir_context
 from cjwstate.models import Step, Workflow
 from cjwstate.models.module_registry import MODULE_REGISTRY
 from cjwstate.modules.types import ModuleZipfile
-from cjwstate.params import get_migrated_params
+from cjwstate.params import PremigratedParams, get_migrated_params, premigrate_params
 from .tab import ExecuteStep, TabFlow, execute_tab_flow
 from .types import StepResult, Tab, UnneededExecution
 
@@ -15,7 +21,11 @@ from .types import StepResult, Tab, UnneededExecution
 logger = logging.getLogger(__name__)
 
 
-def _get_migrated_params(step: Step, module_zipfile: ModuleZipfile) -> Dict[str, Any]:
+def _get_migrated_params(
+    step: Step,
+    module_zipfile: ModuleZipfile,
+    premigrated: Dict[int, PremigratedParams],
+) -> Dict[str, Any]:
     """Build the Params dict which will be passed to render().
 
     Call LoadedModule.migrate_params() to ensure the params are up-to-date.
@@ -37,7 +47,9 @@ def _get_migrated_params(step: Step, module_zipfile: ModuleZipfile) -> Dict[str,
     module_spec = module_zipfile.get_spec()
 
     try:
-        result = get_migrated_params(step, module_zipfile=module_zipfile)
+        result = get_migrated_params(
+            step, module_zipfile=module_zipfile, premigrated=premigrated
+        )
     except ModuleError:
         # LoadedModule logged this error; no need to log it again.
         return module_spec.param_schema.default
@@ -57,7 +69,10 @@ def _get_migrated_params(step: Step, module_zipfile: ModuleZipfile) -> Dict[str,
 
 
 def _build_execute_step(
-    step: Step, *, module_zipfiles: Dict[str, ModuleZipfile]
+    step: Step,
+    *,
+    module_zipfiles: Dict[str, ModuleZipfile],
+    premigrated: Dict[int, PremigratedParams],
 ) -> ExecuteStep:
     try:
         module_zipfile = module_zipfiles[step.module_id_name]
@@ -71,7 +86,9 @@ def _build_execute_step(
         # params (Step.get_params), because we can only check
         # for tab cycles after migrating (and before calling any
         # render()).
-        _get_migrated_params(step, module_zipfile=module_zipfile),
+        _get_migrated_params(
+            step, module_zipfile=module_zipfile, premigrated=premigrated
+        ),
     )
 
 
@@ -82,16 +99,25 @@ def _load_tab_flows(workflow: Workflow, delta_id: int) -> List[TabFlow]:
     Raise `ModuleError` or `ValueError` if migrate_params() fails. Failed
     migration means the whole execute can't happen.
     """
+    module_zipfiles = MODULE_REGISTRY.all_latest()
+
+    # Call migrate_params() _before_ locking: it may spawn kernel children.
+    # Within the lock, get_migrated_params() ignores premigrated params of
+    # Steps that changed in the meantime.
+    premigrated = premigrate_params(
+        list(Step.live_in_workflow(workflow.id)), module_zipfiles
+    )
+
     ret = []
     with workflow.cooperative_lock():  # reloads workflow
         if workflow.last_delta_id != delta_id:
             raise UnneededExecution
 
-        module_zipfiles = MODULE_REGISTRY.all_latest()
-
         for tab_model in workflow.live_tabs.all():
             steps = [
-                _build_execute_step(step, module_zipfiles=module_zipfiles)
+                _build_execute_step(
+                    step, module_zipfiles=module_zipfiles, premigrated=premigrated
+                )
                 for step in tab_model.live_steps.all()
             ]
             ret.append(TabFlow(Tab(tab_model.slug, tab_model.name), steps))
@@ -125,6 +151,43 @@ def partition_ready_and_dependent(
     return (ready, dependent)
 
 
+def _tab_output_filename(tab_slug: str) -> str:
+    return "tab-output-%s.arrow" % tab_slug.replace("/", "-")
+
+
+async def _execute_tab_flow_in_new_chroot(
+    workflow: Workflow,
+    tab_flow: TabFlow,
+    tab_results: Dict[Tab, Optional[StepResult]],
+    outputs_dir: Optional[Path],
+) -> StepResult:
+    """Acquire a chroot from the pool and execute `tab_flow` within it.
+
+    Copy the outputs of the tabs `tab_flow` reads into the chroot first. If
+    `outputs_dir` is set, copy `tab_flow`'s output there, so other tabs can
+    read it after this chroot is released. Otherwise, return a StepResult
+    whose `path` no longer exists -- only its `columns` are useful.
+    """
+    async with EDITABLE_CHROOT_POOL.acquire_context() as chroot_context:
+        with chroot_context.tempdir_context("render-") as basedir:
+            for tab, tab_result in tab_results.items():
+                if tab.slug in tab_flow.input_tab_slugs and tab_result is not None:
+                    # renderprep gives modules `path.name`, relative to basedir
+                    shutil.copyfile(tab_result.path, basedir / tab_result.path.name)
+
+            output_path = basedir / _tab_output_filename(tab_flow.tab_slug)
+            result = await execute_tab_flow(
+                chroot_context, workflow, tab_flow, tab_results, output_path
+            )
+
+            if outputs_dir is None:
+                return result
+            else:
+                saved_path = outputs_dir / output_path.name
+                shutil.copyfile(result.path, saved_path)
+                return StepResult(saved_path, result.columns)
+
+
 async def execute_workflow(workflow: Workflow, delta_id: int) -> None:
     """Ensure all `workflow.tabs[*].live_steps` cache fresh render results.
 
@@ -148,44 +211,62 @@ async def execute_workflow(workflow: Workflow, delta_id: int) -> None:
     tab_results: Dict[Tab, Optional[StepResult]] = {
         flow.tab: None for flow in pending_tab_flows
     }
-    output_paths = []
 
-    # Execute one tab_flow at a time.
+    # Tabs whose outputs other tabs read. Each tab renders in its own chroot,
+    # so we copy these outputs out of their chroots (into `outputs_dir`) and
+    # into the chroots of the tabs that read them.
+    input_tab_slugs = frozenset().union(
+        *(flow.input_tab_slugs for flow in pending_tab_flows)
+    )
+    tab_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_TABS_PER_RENDER)
+
+    # Execute ready tab_flows concurrently, each in its own chroot.
     #
     # We don't hold a DB lock throughout the loop: the loop can take a long
     # time; it might be run multiple times simultaneously (even on different
     # computers); and `await` doesn't work with locks.
-
-    with EDITABLE_CHROOT.acquire_context() as chroot_context:
-        with chroot_context.tempdir_context("render-") as basedir:
-
-            async def execute_tab_flow_into_new_file(tab_flow: TabFlow) -> StepResult:
-                nonlocal workflow, tab_results, output_paths
-                output_path = basedir / (
-                    "tab-output-%s.arrow" % tab_flow.tab_slug.replace("/", "-")
+    with tempdir_context(prefix="render-outputs-") as outputs_dir:
+
+        async def execute_tab_flow_into_new_file(tab_flow: TabFlow) -> StepResult:
+            async with tab_semaphore:
+                return await _execute_tab_flow_in_new_chroot(
+                    workflow,
+                    tab_flow,
+                    tab_results,
+                    outputs_dir if tab_flow.tab_slug in input_tab_slugs else None,
                 )
-                return await execute_tab_flow(
-                    chroot_context, workflow, tab_flow, tab_results, output_path
-                )
-
-            while pending_tab_flows:
-                ready_flows, dependent_flows = partition_ready_and_dependent(
-                    pending_tab_flows
-                )
-
-                if not ready_flows:
-                    # All flows are dependent -- meaning they all have cycles. Execute
-                    # them last; they can detect their cycles through `tab_results`.
-                    break
-
-                for tab_flow in ready_flows:
-                    tab_result = await execute_tab_flow_into_new_file(tab_flow)
-                    tab_results[tab_flow.tab] = tab_result
-
-                pending_tab_flows = dependent_flows  # iterate
 
-            # Now, `pending_tab_flows` only contains flows with cycles. Execute
-            # them. No need to update `tab_results`: If tab1 and tab 2 depend on
-            # each other, they should have the same error ("Cycle").
-            for tab_flow in pending_tab_flows:
-                await execute_tab_flow_into_new_file(tab_flow)
+        async def execute_tab_flows_concurrently(
+            tab_flows: List[TabFlow],
+        ) -> List[StepResult]:
+            # Let every task finish, even if one fails: we must not leave
+            # `outputs_dir` (or a chroot) while a module is still running.
+            results = await asyncio.gather(
+                *(execute_tab_flow_into_new_file(flow) for flow in tab_flows),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            return results
+
+        while pending_tab_flows:
+            ready_flows, dependent_flows = partition_ready_and_dependent(
+                pending_tab_flows
+            )
+
+            if not ready_flows:
+                # All flows are dependent -- meaning they all have cycles. Execute
+                # them last; they can detect their cycles through `tab_results`.
+                break
+
+            ready_results = await execute_tab_flows_concurrently(ready_flows)
+            for tab_flow, tab_result in zip(ready_flows, ready_results):
+                tab_results[tab_flow.tab] = tab_result
+
+            pending_tab_flows = dependent_flows  # iterate
+
+        # Now, `pending_tab_flows` only contains flows with cycles. Execute
+        # them. No need to update `tab_results`: If tab1 and tab 2 depend on
+        # each other, they should have the same error ("Cycle").
+        await execute_tab_flows_concurrently(pending_tab_flows)
@@ -1,6 +1,7 @@
 import asyncio
 
 import msgpack
+from django.conf import settings
 
 
 async def main():
@@ -9,7 +10,10 @@ async def main():
     import cjwstate.modules
     from cjworkbench.pg_render_locker import PgRenderLocker
     from cjwstate import rabbitmq
-    from cjwstate.rabbitmq.connection import open_global_connection
+    from cjwstate.rabbitmq.connection import (
+        consume_concurrently,
+        open_global_connection,
+    )
     from .render import handle_render
 
     cjwstate.modules.init_module_system()
@@ -17,12 +21,21 @@ async def main():
     async with PgRenderLocker() as pg_render_locker, open_global_connection() as rabbitmq_connection:
         await rabbitmq_connection.queue_declare(rabbitmq.Render, durable=True)
         await rabbitmq_connection.exchange_declare(rabbitmq.GroupsExchange)
-        # Render; ack; render; ack ... forever.
-        async with rabbitmq_connection.acking_consumer(rabbitmq.Render) as consumer:
-            async for message_bytes in consumer:
-                message = msgpack.unpackb(message_bytes)
-                # Crash on error, and don't ack.
-                await handle_render(message, pg_render_locker)
+
+        async def handle_render_message(message_bytes: bytes) -> None:
+            message = msgpack.unpackb(message_bytes)
+            # Crash on error, and don't ack.
+            await handle_render(message, pg_render_locker)
+
+        # Render; ack; render; ack ... forever -- N_CONCURRENT_RENDERS at a
+        # time. Concurrent renders share our kernel, PgRenderLocker and
+        # EDITABLE_CHROOT_POOL.
+        await consume_concurrently(
+            rabbitmq_connection,
+            rabbitmq.Render,
+            handle_render_message,
+            concurrency=settings.N_CONCURRENT_RENDERS,
+        )
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+from cjworkbench.settings.caches import *
+from cjworkbench.settings.concurrency import *
 from cjworkbench.settings.database import *
 from cjworkbench.settings.logging import *
 from cjworkbench.settings.rabbitmq import *
@@ -6,9 +8,10 @@ from cjworkbench.settings.s3 import *
 
 SITE_ID = 1  # for finding domain name when sending emails
 
-# Renderer uses asyncio because it uses RabbitMQ. But when it comes to the
-# database, for all intents and purposes it's single-threaded.
-N_SYNC_DATABASE_CONNECTIONS = 1
+# Renderer uses asyncio because it uses RabbitMQ. When it comes to the
+# database, each concurrent render is single-threaded: give each its own
+# connection, so one render's long transaction doesn't stall the others.
+N_SYNC_DATABASE_CONNECTIONS = N_CONCURRENT_RENDERS
 
 INSTALLED_APPS = [
     "django.contrib.auth",  # cjwstate.models.workflow imports User
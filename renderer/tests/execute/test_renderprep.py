@@ -12,7 +12,12 @@ from cjwstate.errors import PromptingError
 from cjwstate.models.workflow import Workflow
 from cjwstate.models.uploaded_file import UploadedFile as UploadedFileModel
 from cjwstate.tests.utils import DbTestCase
-from renderer.execute.renderprep import PrepParamsResult, prep_params
+from renderer.execute.renderprep import (
+    PrepParamsResult,
+    download_uploaded_files,
+    plan_params,
+    prep_params,
+)
 from renderer.execute.types import (
     StepResult,
     Tab,
@@ -134,6 +139,57 @@ class CleanValueTests(DbTestCase):
             (self.basedir / "6e00511a-8ac4-4b72-9acc-9d069992b5cf_x.csv.gz").exists()
         )
 
+    def test_plan_params_does_not_read_s3(self):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        step = tab.steps.create(module_id_name="uploadfile", order=0, slug="step-1")
+        id = str(uuid.uuid4())
+        key = f"wf-${workflow.id}/wfm-${step.id}/${id}"
+        UploadedFileModel.objects.create(
+            step=step, name="x.csv", size=4, uuid=id, key=key
+        )
+        planned = plan_params(
+            step_id=step.id,
+            input_table_columns=[],
+            tab_results={},
+            basedir=self.basedir,
+            exit_stack=self.exit_stack,
+            schema=ParamSchema.Dict({"file": ParamSchema.File()}),
+            params={"file": id},
+        )
+        # The file appears on s3 after planning -- and we download it
+        s3.put_bytes(s3.UserFilesBucket, key, b"1234")
+        result = download_uploaded_files(planned)
+        self.assertEqual(result.params, {"file": id})
+        self.assertEqual(
+            (self.basedir / result.uploaded_files[id].filename).read_bytes(),
+            b"1234",
+        )
+
+    def test_download_uploaded_files_deleted_after_plan(self):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        step = tab.steps.create(module_id_name="uploadfile", order=0, slug="step-1")
+        id = str(uuid.uuid4())
+        key = f"wf-${workflow.id}/wfm-${step.id}/${id}"
+        s3.put_bytes(s3.UserFilesBucket, key, b"1234")
+        UploadedFileModel.objects.create(
+            step=step, name="x.csv", size=4, uuid=id, key=key
+        )
+        planned = plan_params(
+            step_id=step.id,
+            input_table_columns=[],
+            tab_results={},
+            basedir=self.basedir,
+            exit_stack=self.exit_stack,
+            schema=ParamSchema.Dict({"file": ParamSchema.File()}),
+            params={"file": id},
+        )
+        s3.remove(s3.UserFilesBucket, key)
+        result = download_uploaded_files(planned)
+        self.assertEqual(result.params, {"file": None})
+        self.assertEqual(result.uploaded_files, {})
+
     def test_clean_file_safe_filename(self):
         workflow = Workflow.create_and_init()
         tab = workflow.tabs.first()
@@ -5,20 +5,27 @@ import textwrap
 from unittest.mock import patch
 
 import pyarrow as pa
-from cjwmodule.arrow.testing import make_column, make_table
+from cjwmodule.arrow.testing import assert_arrow_table_equals, make_column, make_table
 from django.contrib.auth.models import User
 
 from cjwkernel.chroot import EDITABLE_CHROOT
+from cjwkernel.kernel import Kernel
 from cjwkernel.types import I18nMessage, RenderError
 from cjwkernel.tests.util import parquet_file
+from cjwkernel.util import tempdir_context
 from cjwstate import s3, rabbitmq, rendercache
+from cjwstate.diskcache import DiskCache
 from cjwstate.rendercache.testing import write_to_rendercache
 from cjwstate.storedobjects import create_stored_object
+from cjwstate.models.step import Step
 from cjwstate.models.workflow import Workflow
 from cjwstate.tests.utils import DbTestCaseWithModuleRegistry, create_module_zipfile
 from cjworkbench.models.userprofile import UserProfile
 from renderer import notifications
+from renderer.execute import memo
 from renderer.execute.step import execute_step
+from renderer.execute.types import UnneededExecution
+import renderer.execute.step
 
 
 def create_test_user(
@@ -178,7 +185,7 @@ class StepTests(DbTestCaseWithModuleRegistry):
         email_delta.assert_not_called()
 
     @patch.object(rabbitmq, "send_update_to_workflow_clients", noop)
-    @patch.object(rendercache, "downloaded_parquet_file")
+    @patch.object(rendercache, "open_cached_render_result")
     @patch.object(notifications, "email_output_delta")
     def test_email_delta_ignore_corrupt_cache_error(self, email_delta, read_cache):
         user = create_test_user()
@@ -227,6 +234,61 @@ class StepTests(DbTestCaseWithModuleRegistry):
 
         email_delta.assert_not_called()
 
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", noop)
+    @patch.object(notifications, "email_output_delta")
+    def test_compare_unchanged_output_without_reading_fresh_result(self, email_delta):
+        user = create_test_user()
+        workflow = Workflow.create_and_init(owner_id=user.id)
+        tab = workflow.tabs.first()
+        step = tab.steps.create(
+            order=0,
+            slug="step-1",
+            module_id_name="x",
+            last_relevant_delta_id=workflow.last_delta_id,
+            notifications=True,
+        )
+        write_to_rendercache(
+            workflow,
+            step,
+            workflow.last_delta_id - 1,  # stale
+            make_table(make_column("A", [2])),
+        )
+
+        module_zipfile = create_module_zipfile(
+            "x",
+            spec_kwargs={"loads_data": True},
+            # returns the same data
+            python_code='import pandas as pd\ndef render(table, params): return pd.DataFrame({"A": [2]})',
+        )
+
+        with patch.object(
+            rendercache,
+            "open_cached_render_result",
+            wraps=rendercache.open_cached_render_result,
+        ) as read_cache:
+            with self.assertLogs(level=logging.INFO):
+                self.run_with_async_db(
+                    execute_step(
+                        chroot_context=self.chroot_context,
+                        workflow=workflow,
+                        step=step,
+                        module_zipfile=module_zipfile,
+                        params={},
+                        tab_name=tab.name,
+                        input_path=self.empty_table_path,
+                        input_table_columns=[],
+                        tab_results={},
+                        output_path=self.output_path,
+                    )
+                )
+
+        # We read the stale result only; we compared with our local table
+        read_cache.assert_called_once()
+        self.assertEqual(
+            read_cache.call_args[0][0].delta_id, workflow.last_delta_id - 1
+        )
+        email_delta.assert_not_called()  # no change
+
     @patch.object(rabbitmq, "send_update_to_workflow_clients", noop)
     @patch.object(notifications, "email_output_delta")
     def test_email_delta_when_errors_change(self, email_delta):
@@ -322,7 +384,7 @@ class StepTests(DbTestCaseWithModuleRegistry):
         email_delta.assert_not_called()  # error is the same error
 
     @patch.object(rabbitmq, "send_update_to_workflow_clients", noop)
-    @patch.object(rendercache, "downloaded_parquet_file")
+    @patch.object(rendercache, "open_cached_render_result")
     @patch.object(notifications, "email_output_delta")
     def test_email_delta_when_stale_crr_is_unreachable(self, email_delta, read_cache):
         user = create_test_user()
@@ -732,3 +794,108 @@ class StepTests(DbTestCaseWithModuleRegistry):
                 )
             ],
         )
+
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", noop)
+    def test_step_changed_during_download_raises_unneeded_execution(self):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        step = tab.steps.create(
+            order=0,
+            slug="step-1",
+            module_id_name="x",
+            last_relevant_delta_id=workflow.last_delta_id,
+        )
+        module_zipfile = create_module_zipfile(
+            "x",
+            spec_kwargs={"loads_data": True},
+            python_code='import pandas as pd\ndef render(table, params): return pd.DataFrame({"A": [2]})',
+        )
+
+        download = renderer.execute.step._execute_step_download
+
+        def download_while_user_edits(*args, **kwargs):
+            result = download(*args, **kwargs)
+            # The user edits the Step while we download (without a lock)
+            Step.objects.filter(id=step.id).update(
+                last_relevant_delta_id=workflow.last_delta_id + 1
+            )
+            return result
+
+        with patch.object(
+            renderer.execute.step,
+            "_execute_step_download",
+            download_while_user_edits,
+        ), patch.object(Kernel, "render") as render:
+            with self.assertRaises(UnneededExecution):
+                self.run_with_async_db(
+                    execute_step(
+                        chroot_context=self.chroot_context,
+                        workflow=workflow,
+                        step=step,
+                        module_zipfile=module_zipfile,
+                        params={},
+                        tab_name=tab.name,
+                        input_path=self.empty_table_path,
+                        input_table_columns=[],
+                        tab_results={},
+                        output_path=self.output_path,
+                    )
+                )
+            render.assert_not_called()
+
+        step.refresh_from_db()
+        self.assertIsNone(step.cached_render_result)
+
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", noop)
+    def test_reuse_memoized_render_result(self):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        step1 = tab.steps.create(
+            order=0,
+            slug="step-1",
+            module_id_name="x",
+            last_relevant_delta_id=workflow.last_delta_id,
+        )
+        step2 = tab.steps.create(
+            order=1,
+            slug="step-2",
+            module_id_name="x",
+            last_relevant_delta_id=workflow.last_delta_id,
+        )
+        module_zipfile = create_module_zipfile(
+            "x",
+            spec_kwargs={"loads_data": True},
+            python_code='import pandas as pd\ndef render(table, params): return pd.DataFrame({"A": [2]})',
+        )
+
+        def execute(step):
+            return self.run_with_async_db(
+                execute_step(
+                    chroot_context=self.chroot_context,
+                    workflow=workflow,
+                    step=step,
+                    module_zipfile=module_zipfile,
+                    params={},
+                    tab_name=tab.name,
+                    input_path=self.empty_table_path,
+                    input_table_columns=[],
+                    tab_results={},
+                    output_path=self.output_path,
+                )
+            )
+
+        with tempdir_context() as memo_dir, patch.object(
+            memo, "_memo_cache", DiskCache("test", memo_dir, 1024 * 1024)
+        ):
+            with self.assertLogs(level=logging.INFO):
+                execute(step1)
+            with patch.object(Kernel, "render") as render:
+                with self.assertLogs(level=logging.INFO):
+                    result = execute(step2)
+                render.assert_not_called()
+            self.assertEqual(memo._memo_cache.stats.n_hits, 1)
+
+        self.assertEqual([column.name for column in result.columns], ["A"])
+        step2.refresh_from_db()
+        with rendercache.open_cached_render_result(step2.cached_render_result) as r:
+            assert_arrow_table_equals(r.table, make_table(make_column("A", [2])))
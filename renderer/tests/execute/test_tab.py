@@ -253,3 +253,56 @@ class TabTests(DbTestCaseWithModuleRegistry):
                 Kernel.render.call_args[1]["output_filename"],
                 r"execute-tab-output.*\.arrow",
             )
+
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", fake_send)
+    def test_execute_skip_render_after_unchanged_output(self):
+        module_zipfile = create_module_zipfile("mod", spec_kwargs={"loads_data": True})
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        delta1_id = workflow.last_delta_id
+        step1 = tab.steps.create(
+            order=0, slug="step-1", module_id_name="mod", last_relevant_delta_id=0
+        )
+        step2 = tab.steps.create(
+            order=1, slug="step-2", module_id_name="mod", last_relevant_delta_id=0
+        )
+        table1 = make_table(make_column("A", ["a"]))
+        table2 = make_table(make_column("B", ["b"]))
+        write_to_rendercache(workflow, step1, delta1_id, table1)
+        write_to_rendercache(workflow, step2, delta1_id, table2)
+        # A fetch on step1 makes both steps stale
+        delta2 = workflow.deltas.create(
+            command_name="SetStepDataVersion",
+            prev_delta_id=delta1_id,
+            step=step1,
+            step_delta_ids=[[step1.id, delta1_id], [step2.id, delta1_id]],
+        )
+        step1.last_relevant_delta_id = delta2.id
+        step1.save(update_fields=["last_relevant_delta_id"])
+        step2.last_relevant_delta_id = delta2.id
+        step2.save(update_fields=["last_relevant_delta_id"])
+
+        tab_flow = TabFlow(
+            Tab(tab.slug, tab.name),
+            [
+                ExecuteStep(step1, module_zipfile, {}),
+                ExecuteStep(step2, module_zipfile, {}),
+            ],
+        )
+
+        # step1 renders the same output it did before
+        with patch.object(Kernel, "render", side_effect=mock_render(table1)):
+            with self._execute(workflow, tab_flow, {}) as (result, path):
+                self.assertEqual(
+                    result, StepResult(path, [Column("B", ColumnType.Text())])
+                )
+                assert_arrow_table_equals(load_trusted_arrow_file(path), table2)
+
+            Kernel.render.assert_called_once()  # step1, not step2
+
+        step2.refresh_from_db()
+        self.assertEqual(step2.cached_render_result.delta_id, delta2.id)
+        with rendercache.open_cached_render_result(
+            step2.cached_render_result
+        ) as loaded:
+            assert_arrow_table_equals(loaded.table, table2)
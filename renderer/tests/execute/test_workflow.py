@@ -255,6 +255,48 @@ class WorkflowTests(DbTestCaseWithModuleRegistry):
             self._execute(workflow)
             Kernel.render.assert_not_called()
 
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", fake_send)
+    def test_execute_tab_output_copied_into_dependent_tab_chroot(self):
+        workflow = Workflow.objects.create()
+        create_module_zipfile("mod", spec_kwargs={"loads_data": True})
+        create_module_zipfile(
+            "tabmod",
+            spec_kwargs={
+                "loads_data": True,
+                "parameters": [{"id_name": "tab", "type": "tab", "name": "Tab"}],
+            },
+        )
+        tab1 = workflow.tabs.create(position=0, slug="tab-1")
+        tab2 = workflow.tabs.create(position=1, slug="tab-2")
+        tab1.steps.create(order=0, slug="step-1", module_id_name="mod")
+        step2 = tab2.steps.create(
+            order=0, slug="step-2", module_id_name="tabmod", params={"tab": "tab-1"}
+        )
+
+        def render(*args, basedir, tab_outputs, output_filename, **kwargs):
+            if tab_outputs:
+                # Output the input tab's table -- which must be in our basedir
+                tab_output = tab_outputs["tab-1"]
+                shutil.copy(
+                    basedir / tab_output.table_filename, basedir / output_filename
+                )
+                return RenderResult(errors=[])
+            else:
+                return mock_render(make_table(make_column("A", [1])))(
+                    *args,
+                    basedir=basedir,
+                    tab_outputs=tab_outputs,
+                    output_filename=output_filename,
+                    **kwargs,
+                )
+
+        with patch.object(Kernel, "render", side_effect=render):
+            self._execute(workflow)
+
+        step2.refresh_from_db()
+        with open_cached_render_result(step2.cached_render_result) as actual:
+            assert_arrow_table_equals(actual.table, make_table(make_column("A", [1])))
+
     @patch.object(rabbitmq, "send_update_to_workflow_clients", fake_send)
     def test_resume_without_rerunning_unneeded_renders(self):
         workflow = Workflow.create_and_init()
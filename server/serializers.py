@@ -98,7 +98,7 @@ def _maybe_yield(value: Optional[Union[clientside._Null, Any]]) -> Iterable[Any]
     """
     if value is not None:
         # We check with "==" instead of "is". That's because we
-        # pickle+unpickle, and the unpickled object won't be the original.
+        # encode+decode, and the decoded object won't be the original.
         if value == clientside.Null:
             value = None
         yield value
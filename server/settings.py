@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 
 from cjworkbench.i18n import default_locale, supported_locales
 
+from cjworkbench.settings.caches import *
+from cjworkbench.settings.concurrency import *
 from cjworkbench.settings.database import *
 from cjworkbench.settings.debug import DEBUG, I_AM_TESTING
 from cjworkbench.settings.hardlimits import *
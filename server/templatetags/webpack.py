@@ -36,7 +36,6 @@ if settings.DEBUG:
                 time.sleep(0.1)
         return _load_manifest()
 
-
 else:
     _load_manifest = functools.lru_cache(maxsize=None)(_load_manifest_inner)
 
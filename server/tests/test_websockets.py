@@ -3,6 +3,7 @@ import contextlib
 import functools
 import json
 import logging
+import unittest
 from unittest.mock import patch
 
 from channels.layers import channel_layers, get_channel_layer
@@ -20,8 +21,9 @@ from cjwstate.rabbitmq import (
     send_update_to_workflow_clients,
     send_user_update_to_user_clients,
 )
+from cjwstate.rabbitmq.updatecodec import encode_update
 from cjwstate.tests.utils import DbTestCase
-from server import handlers
+from server import handlers, websockets
 
 
 def async_test(f):
@@ -447,3 +449,42 @@ class ChannelTests(DbTestCase):
         await comm.receive_from()  # ignore initial workflow delta
         args = await asyncio.wait_for(future_args, 0.005)
         self.assertEqual(args, (self.workflow.id, self.workflow.last_delta_id))
+
+
+class EncodeUpdateTests(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        websockets._encoded_updates.clear()
+
+    def tearDown(self):
+        websockets._encoded_updates.clear()
+        super().tearDown()
+
+    @patch.object(websockets, "jsonize_clientside_update")
+    @patch.object(websockets, "_load_latest_modules")
+    def test_encode_once_per_locale(self, load_latest_modules, jsonize):
+        modules = {}
+
+        async def return_modules():
+            return modules
+
+        load_latest_modules.side_effect = return_modules
+        jsonize.return_value = {"updateTabs": {}}
+        encoded_update = encode_update(clientside.Update())
+
+        async def go():
+            return [
+                await websockets._jsonize_encoded_update(encoded_update, "en"),
+                await websockets._jsonize_encoded_update(encoded_update, "en"),
+                await websockets._jsonize_encoded_update(encoded_update, "el"),
+            ]
+
+        texts = asyncio.run(go())
+        self.assertEqual(
+            [json.loads(text) for text in texts],
+            [{"type": "apply-delta", "data": {"updateTabs": {}}}] * 3,
+        )
+        self.assertEqual(jsonize.call_count, 2)  # "en" and "el"
+        self.assertEqual(
+            [call[0][1].locale_id for call in jsonize.call_args_list], ["en", "el"]
+        )
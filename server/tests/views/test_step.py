@@ -104,7 +104,7 @@ class EmbedTest(StepViewTestCase):
             response = self._request()
 
         self.assertEqual(response.status_code, status.OK)
-        init_state_match = re.search(br"window.initState =([^\n]*)", response.content)
+        init_state_match = re.search(rb"window.initState =([^\n]*)", response.content)
         init_state = json.loads(init_state_match.group(1))
         self.assertEqual(init_state["workflow"]["id"], self.workflow.id)
         self.assertEqual(init_state["step"]["module"], "chart")
@@ -4,7 +4,7 @@ import json
 import subprocess
 import zipfile
 from http import HTTPStatus as status
-from typing import Awaitable, Literal, Tuple, Union
+from typing import Awaitable, Dict, Literal, Tuple, Union
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
@@ -22,11 +22,14 @@ from cjwstate.models import AclEntry, Step, Workflow
 from cjwstate.models.fields import Role
 from cjwstate.models.module_registry import MODULE_REGISTRY
 from cjwstate.rendercache import (
+    CachedRenderResult,
     CorruptCacheError,
     downloaded_parquet_file,
-    open_cached_render_result,
+    read_cached_render_result_slice,
     read_cached_render_result_slice_as_text,
+    read_cached_render_result_summaries,
 )
+from cjwstate.rendercache.summaries import count_text_values
 
 from ..serializers import (
     JsonizeContext,
@@ -224,6 +227,23 @@ async def result_json(
     return response
 
 
+def _read_column_value_counts(
+    cached_result: CachedRenderResult, column_index: int
+) -> Dict[str, int]:
+    """Count each text value in a column of `cached_result`.
+
+    Raise CorruptCacheError if the cached table is missing.
+    """
+    # raise CorruptCacheError
+    table = read_cached_render_result_slice(
+        cached_result,
+        only_columns=range(column_index, column_index + 1),
+        only_rows=range(cached_result.table_metadata.n_rows),
+    )
+    # Assume type is text. (The caller checked column.type is ColumnType.Text.)
+    return count_text_values(table.column(0))
+
+
 async def result_column_value_counts(
     request: HttpRequest,
     workflow_id: int,
@@ -269,31 +289,21 @@ async def result_column_value_counts(
         # to convert to text before doing anything else, no?)
         return JsonResponse({"values": {}})
 
-    try:
-        # raise CorruptCacheError
-        with open_cached_render_result(cached_result) as result:
-            chunked_array = result.table.column(column_index)
-    except CorruptCacheError:
-        # We _could_ return an empty result set; but our only goal here is
-        # "don't crash" and this 404 seems to be the simplest implementation.
-        # (We assume that if the data is deleted, the user has moved elsewhere
-        # and this response is going to be ignored.)
-        return JsonResponse(
-            {"error": f'column "{colname}" not found'}, status=status.NOT_FOUND
-        )
-
-    if chunked_array.num_chunks == 0:
-        value_counts = {}
+    summaries = read_cached_render_result_summaries(cached_result)
+    if summaries is not None and summaries[column_index].value_counts is not None:
+        # Fast path: we counted values when we cached the result
+        value_counts = summaries[column_index].value_counts
     else:
-        pyarrow_value_counts = chunked_array.value_counts()
-        # Assume type is text. (We checked column.type is ColumnType.Text above.)
-        #
-        # values can be either a StringArray or a DictionaryArray. In either case,
-        # .to_pylist() converts to a Python List[str].
-        values = pyarrow_value_counts.field("values").to_pylist()
-        counts = pyarrow_value_counts.field("counts").to_pylist()
-
-        value_counts = {v: c for v, c in zip(values, counts) if v is not None}
+        try:
+            value_counts = _read_column_value_counts(cached_result, column_index)
+        except CorruptCacheError:
+            # We _could_ return an empty result set; but our only goal here is
+            # "don't crash" and this 404 seems to be the simplest
+            # implementation. (We assume that if the data is deleted, the user
+            # has moved elsewhere and this response is going to be ignored.)
+            return JsonResponse(
+                {"error": f'column "{colname}" not found'}, status=status.NOT_FOUND
+            )
 
     response = JsonResponse({"values": value_counts})
     patch_response_headers(response, cache_timeout=600)
@@ -35,10 +35,11 @@ from cjwstate.models.dbutil import (
     query_clientside_user,
     user_display_name,
 )
-from cjwstate.models import Step, Workflow
+from cjwstate.models import Workflow
 from cjwstate.models.fields import Role
 from cjwstate.models.module_registry import MODULE_REGISTRY
 from cjwstate.models.reports import build_report_for_workflow
+from cjwstate.models.snapshot import load_clientside_snapshot
 from cjwstate.modules.types import ModuleZipfile
 from server.models.course import CourseLookup
 from server.models.lesson import LessonLookup
@@ -195,16 +196,12 @@ def make_init_state(
             workflow.last_viewed_at = datetime.datetime.now()
             workflow.save(update_fields=["last_viewed_at"])
 
+            snapshot = load_clientside_snapshot(workflow, modules, include_blocks=True)
             state = clientside.Init(
                 user=user,
-                workflow=workflow.to_clientside(),
-                tabs={tab.slug: tab.to_clientside() for tab in workflow.live_tabs},
-                steps={
-                    step.id: step.to_clientside(
-                        force_module_zipfile=modules.get(step.module_id_name)
-                    )
-                    for step in Step.live_in_workflow(workflow).prefetch_related("tab")
-                },
+                workflow=snapshot.workflow,
+                tabs=snapshot.tabs,
+                steps=snapshot.steps,
                 modules={
                     module_id: clientside.Module(
                         spec=module.get_spec(),
@@ -212,9 +209,7 @@ def make_init_state(
                     )
                     for module_id, module in modules.items()
                 },
-                blocks={
-                    block.slug: block.to_clientside() for block in workflow.blocks.all()
-                },
+                blocks=snapshot.blocks,
                 settings={
                     "bigTableRowsPerTile": settings.BIG_TABLE_ROWS_PER_TILE,
                     "bigTableColumnsPerTile": settings.BIG_TABLE_COLUMNS_PER_TILE,
@@ -1,7 +1,9 @@
+import json
 import logging
-import pickle
-from collections import namedtuple
-from typing import Any, ContextManager, Dict
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, ContextManager, Dict, Optional, Tuple
 
 import websockets
 from channels.exceptions import DenyConnection
@@ -10,9 +12,11 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from cjworkbench.sync import database_sync_to_async
 from cjwstate import clientside, rabbitmq
 from cjwstate.models.dbutil import lock_user_by_id, query_clientside_user
-from cjwstate.models.step import Step
+from cjwstate.models.snapshot import load_clientside_snapshot
 from cjwstate.models.workflow import Workflow
 from cjwstate.models.module_registry import MODULE_REGISTRY
+from cjwstate.modules.types import ModuleZipfile
+from cjwstate.rabbitmq.updatecodec import decode_update
 from server import handlers
 from server.serializers import JsonizeContext, jsonize_clientside_update
 
@@ -20,9 +24,88 @@ logger = logging.getLogger(__name__)
 WorkflowUpdateData = namedtuple("WorkflowUpdateData", ("update", "delta_id"))
 
 
+LATEST_MODULES_MAX_AGE = 10.0  # seconds
+"""How long we reuse `MODULE_REGISTRY.all_latest()` before querying again.
+
+Every update we send needs the module list. With hundreds of viewers, one
+query per update per viewer would hog our (small) database thread pool.
+"""
+
+N_ENCODED_UPDATES_TO_CACHE = 32
+"""Number of (update, locale) JSON encodings we remember.
+
+When a workflow has many viewers, each viewer's consumer receives the same
+update. They're all in this process, so we only need to encode it once.
+"""
+
+
+_latest_modules_lock = threading.Lock()
+_latest_modules: Tuple[float, Optional[Dict[str, ModuleZipfile]]] = (0.0, None)
+_encoded_updates: Dict[
+    Tuple[bytes, str], Tuple[Dict[str, ModuleZipfile], str]
+] = OrderedDict()
+
+
+def _read_cached_latest_modules() -> Optional[Dict[str, ModuleZipfile]]:
+    loaded_at, modules = _latest_modules
+    if modules is not None and time.monotonic() - loaded_at < LATEST_MODULES_MAX_AGE:
+        return modules
+    return None
+
+
 @database_sync_to_async
-def _load_latest_modules():
-    return dict(MODULE_REGISTRY.all_latest())
+def _query_latest_modules() -> Dict[str, ModuleZipfile]:
+    global _latest_modules
+    with _latest_modules_lock:
+        # Another thread may have queried while we waited for the lock
+        modules = _read_cached_latest_modules()
+        if modules is None:
+            modules = dict(MODULE_REGISTRY.all_latest())
+            _latest_modules = (time.monotonic(), modules)
+        return modules
+
+
+async def _load_latest_modules() -> Dict[str, ModuleZipfile]:
+    """Return `MODULE_REGISTRY.all_latest()`, at most LATEST_MODULES_MAX_AGE old.
+
+    The returned dict is shared: do not modify it.
+    """
+    modules = _read_cached_latest_modules()
+    if modules is None:
+        modules = await _query_latest_modules()
+    return modules
+
+
+def _encode_update(
+    update: clientside.Update,
+    locale_id: str,
+    module_zipfiles: Dict[str, ModuleZipfile],
+) -> str:
+    ctx = JsonizeContext(locale_id=locale_id, module_zipfiles=module_zipfiles)
+    json_dict = jsonize_clientside_update(update, ctx)
+    return json.dumps({"type": "apply-delta", "data": json_dict})
+
+
+async def _jsonize_encoded_update(encoded_update: bytes, locale_id: str) -> str:
+    """Decode `encoded_update` and encode it as an "apply-delta" message.
+
+    Reuse the text we encoded for other consumers with the same locale, as
+    long as the module list hasn't changed since.
+
+    Raise ValueError if `encoded_update` is invalid.
+    """
+    module_zipfiles = await _load_latest_modules()
+    key = (encoded_update, locale_id)
+    cached = _encoded_updates.get(key)
+    if cached is not None and cached[0] is module_zipfiles:
+        _encoded_updates.move_to_end(key)
+        return cached[1]
+
+    text = _encode_update(decode_update(encoded_update), locale_id, module_zipfiles)
+    _encoded_updates[key] = (module_zipfiles, text)
+    while len(_encoded_updates) > N_ENCODED_UPDATES_TO_CACHE:
+        _encoded_updates.popitem(last=False)
+    return text
 
 
 class WorkflowConsumer(AsyncJsonWebsocketConsumer):
@@ -73,18 +156,13 @@ class WorkflowConsumer(AsyncJsonWebsocketConsumer):
                 lock_user_by_id(user_id, for_write=False)
                 user = query_clientside_user(user_id)
 
-            latest_modules = MODULE_REGISTRY.all_latest()
+            snapshot = load_clientside_snapshot(workflow, MODULE_REGISTRY.all_latest())
 
             update = clientside.Update(
                 user=user,
-                workflow=workflow.to_clientside(),
-                tabs={tab.slug: tab.to_clientside() for tab in workflow.live_tabs},
-                steps={
-                    step.id: step.to_clientside(
-                        force_module_zipfile=latest_modules.get(step.module_id_name)
-                    )
-                    for step in Step.live_in_workflow(workflow).prefetch_related("tab")
-                },
+                workflow=snapshot.workflow,
+                tabs=snapshot.tabs,
+                steps=snapshot.steps,
             )
             return WorkflowUpdateData(update, workflow.last_delta_id)
 
@@ -155,40 +233,47 @@ class WorkflowConsumer(AsyncJsonWebsocketConsumer):
             logger.debug("Queue render of Workflow %d v%d", self.workflow_id, delta_id)
             await rabbitmq.queue_render(self.workflow_id, delta_id)
 
-    async def send_pickled_update(self, message: Dict[str, Any]) -> None:
-        # It's a bit ugly that we use pickle (as opposed to protobuf) to send
-        # through RabbitMQ. It's also inefficient and makes races when deploying
-        # new versions. And security-wise, we're vulnerable to "AMQP injection"
-        # attacks (arbitrary code execution if someone controls RabbitMQ). But
-        # it's _so_ much less code! So there we have it.
-        await self.send_update(pickle.loads(message["pickled_update"]))
+    async def send_encoded_update(self, message: Dict[str, Any]) -> None:
+        """Send an update from `cjwstate.rabbitmq.send_update_to_*_clients()`."""
+        logger.debug("Send update to Workflow %d", self.workflow_id)
+        try:
+            text = await _jsonize_encoded_update(
+                message["encoded_update"], self.scope["locale_id"]
+            )
+        except ValueError:
+            # During deploy, a newer or older process may send a format we
+            # can't read. The client will resync when it next reconnects.
+            logger.exception("Dropping update we cannot decode")
+            return
+        await self.send_text_ignoring_connection_closed(text)
 
     async def send_update(self, update: clientside.Update) -> None:
         logger.debug("Send update to Workflow %d", self.workflow_id)
         module_zipfiles = await _load_latest_modules()
-        ctx = JsonizeContext(
-            locale_id=self.scope["locale_id"],
-            module_zipfiles=module_zipfiles,
-        )
-        json_dict = jsonize_clientside_update(update, ctx)
-        await self.send_json_ignoring_connection_closed(
-            {"type": "apply-delta", "data": json_dict}
-        )
+        text = _encode_update(update, self.scope["locale_id"], module_zipfiles)
+        await self.send_text_ignoring_connection_closed(text)
 
     async def send_json_ignoring_connection_closed(self, message) -> None:
         """Call AsyncJsonWebsocketConsumer.send_json(message); ignore an error.
 
+        See `send_text_ignoring_connection_closed()`.
+        """
+        await self.send_text_ignoring_connection_closed(await self.encode_json(message))
+
+    async def send_text_ignoring_connection_closed(self, text: str) -> None:
+        """Send pre-encoded JSON `text`; ignore an error.
+
         The error in question, "websockets.exceptions.ConnectionClosed", happens
         when the user disconnects at just the wrong time: either by closing the
         browser window, or by dropping the TCP connection. (A closed connection
         leads to disconnect; this error error happens during a race. As of
         [2020-12-15], it's ~150 times per week.)
 
-        Call this method instead of `send_json()` when it's okay for the message
+        Call this method instead of `send()` when it's okay for the message
         to be lost. This should be _all_ cases.
         """
         try:
-            await self.send_json(message)
+            await self.send(text_data=text)
         except websockets.exceptions.ConnectionClosed as err:
             if (
                 err.code == 1001  # "going away" - user closed browser tab
@@ -78,7 +78,8 @@ def _finish_upload(data: Dict[str, Any]) -> Dict[str, Any]:
             name=filename, size=size, uuid=file_uuid, key=final_key
         )
         delete_old_files_to_enforce_storage_limits(step=step)
-        s3.remove(bucket, key)
+        # Nobody will read the tusd upload again; don't make tusd wait
+        s3.remove_many_in_background(bucket, [key])
 
     return dict(
         workflow_id=workflow_id, step=step, new_values={param_id_name: file_uuid}